@@ -114,7 +114,11 @@ wss.on('connection', (ws, req) => {
       // directory and expose UPLOAD_DIR in the child's environment so it can
       // restrict filesystem access.
       const childEnv = Object.assign({}, process.env, { UPLOAD_DIR: uploadDir });
-      shell = pty.spawn(pythonBin, ['-u', runnerPath], {
+      // With a fork server running (agent_runner.py --serve), attach to a pre-warmed
+      // session instead of cold-starting the agent and its imports.
+      const forkServerSocket = process.env.BIOHACKER_FORKSERVER_SOCKET;
+      const runnerArgs = forkServerSocket ? ['-u', runnerPath, '--connect', forkServerSocket] : ['-u', runnerPath];
+      shell = pty.spawn(pythonBin, runnerArgs, {
         name: 'xterm-color',
         cols: 80,
         rows: 24,
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Time to fetch a GROMACS-tutorial set of downloads: network vs artifact cache vs offline mirror.
+
+A local HTTP server stands in for the download sites, with a per-request latency and a
+bandwidth cap. The same setup (source tarball, regression tests, a handful of wheels
+and an R package) is fetched through artifact_cache.ArtifactCache:
+
+    cold            empty cache, everything downloaded
+    warm            second session, same cache
+    offline_warm    server stopped, BIOHACKER_OFFLINE behaviour, same cache
+    offline_mirror  server stopped, fresh cache seeded only from a mirror directory
+
+    python benchmarks/bench_artifact_cache.py --mbps 50 --latency-ms 80
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+from artifact_cache import ArtifactCache
+
+# (file name, MB) of a typical GROMACS tutorial setup
+ARTIFACTS = [("gromacs-2024.2.tar.gz", 40), ("regressiontests-2024.2.tar.gz", 20),
+             ("numpy-2.1.0-cp311-manylinux_x86_64.whl", 16), ("pandas-2.2.2-cp311-manylinux_x86_64.whl", 12),
+             ("MDAnalysis-2.7.0-cp311-manylinux_x86_64.whl", 8), ("bio3d_2.4-4.tar.gz", 2)]
+
+
+def serve(root, mbps, latency_ms):
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+        def copyfile(self, source, outputfile):
+            time.sleep(latency_ms / 1000)
+            chunk = 1 << 16
+            for block in iter(lambda: source.read(chunk), b""):
+                outputfile.write(block)
+                time.sleep(len(block) / (mbps * (1 << 20)))
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def setup_session(cache, base_url, checksums, workdir):
+    start = time.perf_counter()
+    sources = [cache.fetch(f"{base_url}/{name}", checksum=checksums[name], dest_dir=workdir)["source"]
+               for name, _ in ARTIFACTS]
+    return {"seconds": round(time.perf_counter() - start, 3), "sources": sorted(set(sources))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mbps", type=float, default=50, help="download bandwidth in MB/s")
+    parser.add_argument("--latency-ms", type=float, default=80, help="time to first byte per request")
+    parser.add_argument("--scale", type=float, default=0.25, help="multiplier on the artifact sizes")
+    args = parser.parse_args()
+
+    results = {"config": vars(args)}
+    with tempfile.TemporaryDirectory() as tmp:
+        site, mirror = os.path.join(tmp, "site"), os.path.join(tmp, "mirror")
+        os.makedirs(site)
+        checksums = {}
+        for name, mb in ARTIFACTS:
+            data = os.urandom(int(mb * args.scale * (1 << 20)))
+            with open(os.path.join(site, name), "wb") as f:
+                f.write(data)
+            checksums[name] = "sha256:" + hashlib.sha256(data).hexdigest()
+        shutil.copytree(site, mirror)
+        results["total_mb"] = round(sum(mb for _, mb in ARTIFACTS) * args.scale, 1)
+
+        server = serve(site, args.mbps, args.latency_ms)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        cache = ArtifactCache(directory=os.path.join(tmp, "cache"))
+        results["cold"] = setup_session(cache, base_url, checksums, os.path.join(tmp, "session1"))
+        results["warm"] = setup_session(cache, base_url, checksums, os.path.join(tmp, "session2"))
+        server.shutdown()
+        server.server_close()
+
+        cache.offline = True
+        results["offline_warm"] = setup_session(cache, base_url, checksums, os.path.join(tmp, "session3"))
+        seeded = ArtifactCache(directory=os.path.join(tmp, "cache2"), mirror=mirror, offline=True)
+        results["offline_mirror"] = setup_session(seeded, base_url, checksums, os.path.join(tmp, "session4"))
+        results["cache_stats"] = cache.stats()
+    results["speedup_warm"] = round(results["cold"]["seconds"] / max(results["warm"]["seconds"], 1e-6), 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Throughput and peak memory of cleaning_engine on synthetic expression matrices.
+
+Writes a genes x samples count matrix with missing values as TSV and Parquet, then
+runs a typical spec (coerce to float32, filter sparse genes, row-median imputation,
+CPM, log2, per-sample z-scores) through:
+
+    engine      cleaning_engine.clean, streamed in --chunk-rows chunks
+    pandas      read the whole file, clean in memory, write (the one-shot baseline)
+
+Every run happens in a fresh subprocess, so peak RSS is the run's own. Running at
+--genes and at 4x --genes shows whether memory stays flat as files grow.
+
+    python benchmarks/bench_cleaning_engine.py --genes 200000 --samples 48
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "biohacker"))
+
+STEPS = [
+    {"op": "coerce", "dtype": "float32"},
+    {"op": "filter_rows", "max_missing_fraction": 0.25, "min_nonzero_fraction": 0.2},
+    {"op": "impute", "method": "row_median"},
+    {"op": "normalize", "method": "cpm"},
+    {"op": "normalize", "method": "log2", "pseudocount": 1},
+    {"op": "normalize", "method": "zscore_columns"},
+]
+
+
+def make_matrix(path_prefix, genes, samples, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    counts = rng.negative_binomial(2, 0.02, size=(genes, samples)).astype("float64")
+    counts[rng.random(counts.shape) < 0.05] = np.nan
+    counts[rng.random(genes) < 0.3] = 0  # silent genes
+    frame = pd.DataFrame(counts, columns=[f"sample_{i}" for i in range(samples)])
+    frame.insert(0, "gene_id", [f"ENSG{i:011d}" for i in range(genes)])
+    frame.to_csv(path_prefix + ".tsv", sep="\t", index=False, float_format="%.0f")
+    frame.to_parquet(path_prefix + ".parquet", index=False)
+    return {fmt: os.path.getsize(path_prefix + "." + fmt) for fmt in ("tsv", "parquet")}
+
+
+def pandas_clean(source, output):
+    # The same steps, one-shot in memory
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.read_parquet(source) if source.endswith(".parquet") else pd.read_csv(source, sep="\t")
+    frame = frame.set_index("gene_id").astype("float32")
+    frame = frame[(frame.isna().mean(axis=1) <= 0.25) & ((frame.fillna(0) != 0).mean(axis=1) >= 0.2)]
+    matrix = frame.to_numpy(dtype=np.float64, copy=True)
+    medians = np.nanmedian(matrix, axis=1)
+    missing = np.isnan(matrix)
+    matrix[missing] = np.broadcast_to(medians[:, None], matrix.shape)[missing]
+    matrix = np.log2(matrix / matrix.sum(axis=0) * 1e6 + 1)
+    matrix = (matrix - matrix.mean(axis=0)) / matrix.std(axis=0, ddof=1)
+    pd.DataFrame(matrix.astype("float32"), index=frame.index, columns=frame.columns).to_parquet(output)
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork+exec on Linux (it would report the parent's peak); VmHWM doesn't
+    try:
+        with open("/proc/self/status") as f:
+            return round(next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024, 1)
+    except OSError:
+        import resource
+
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def child(args):
+    import time
+
+    output = os.path.join(os.path.dirname(args.child_input), "out.parquet")
+    start = time.perf_counter()
+    if args.child_mode == "engine":
+        from cleaning_engine import clean
+
+        report = clean({"input": args.child_input, "output": output, "index_col": "gene_id", "steps": STEPS},
+                       chunk_rows=args.chunk_rows)
+        rows = report["rows_in"]
+    else:
+        pandas_clean(args.child_input, output)
+        rows = None
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": round(seconds, 3), "rows": rows, "peak_rss_mb": peak_rss_mb()}))
+
+
+def run(mode, path, chunk_rows):
+    out = subprocess.run([sys.executable, __file__, "--child-mode", mode, "--child-input", path,
+                          "--chunk-rows", str(chunk_rows)], check=True, capture_output=True, text=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["mb_per_second"] = round(os.path.getsize(path) / (1 << 20) / result["seconds"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--genes", type=int, default=50000)
+    parser.add_argument("--samples", type=int, default=48)
+    parser.add_argument("--chunk-rows", type=int, default=20000)
+    parser.add_argument("--child-mode", help=argparse.SUPPRESS)
+    parser.add_argument("--child-input", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_mode:
+        return child(args)
+
+    results = {"config": {k: v for k, v in vars(args).items() if not k.startswith("child")}, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for genes in (args.genes, 4 * args.genes):
+            prefix = os.path.join(tmp, f"matrix_{genes}")
+            sizes = make_matrix(prefix, genes, args.samples)
+            for fmt in ("tsv", "parquet"):
+                for mode in ("engine", "pandas"):
+                    result = run(mode, f"{prefix}.{fmt}", args.chunk_rows)
+                    results["runs"].append({"genes": genes, "format": fmt, "file_mb": round(sizes[fmt] / (1 << 20), 1),
+                                            "mode": mode, **result})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Throughput of serial vs batched Titan embedding against a local stub endpoint.
+
+The stub mimics `bedrock-runtime.invoke_model` with a fixed per-request latency and
+an optional throttling rate, so no AWS credentials are needed.
+
+    python benchmarks/bench_embeddings.py --texts 500 --latency-ms 40 --workers 1 4 8 16
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from bedrock_clients import BEDROCK_MAX_ATTEMPTS
+from embeddings import EmbeddingCache, embed_text_input, embed_texts
+
+
+class StubBedrockClient:
+    """Local stand-in for invoke_model returning deterministic Titan-shaped vectors."""
+
+    def __init__(self, latency_s=0.04, throttle_rate=0.0, dim=1024):
+        self.latency_s = latency_s
+        self.throttle_rate = throttle_rate
+        self.dim = dim
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, body, modelId, accept, contentType):
+        # The shared client retries throttled calls itself (botocore retry mode); so does the stub
+        for attempt in range(BEDROCK_MAX_ATTEMPTS):
+            with self._lock:
+                self.calls += 1
+                throttle = random.random() < self.throttle_rate
+                if throttle:
+                    self.throttled += 1
+            time.sleep(self.latency_s)
+            if not throttle:
+                break
+            # botocore-style jittered exponential backoff, scaled down to the stub latency
+            time.sleep(min(random.random() * 2 ** attempt, 20) * 0.05)
+        else:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+        text = json.loads(body)["inputText"]
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return {"body": io.BytesIO(json.dumps({"embedding": vector.tolist()}).encode())}
+
+
+def run(texts, latency_ms, throttle_rate, worker_counts):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Serial baseline: one blocking round-trip per text, like the original helper
+        client = StubBedrockClient(latency_ms / 1000, throttle_rate)
+        cache = EmbeddingCache(os.path.join(tmp, "serial.sqlite3"))
+        start = time.perf_counter()
+        for t in texts:
+            embed_text_input(client, t, cache=cache)
+        elapsed = time.perf_counter() - start
+        results.append({"mode": "serial", "workers": 1, "seconds": elapsed,
+                        "texts_per_s": len(texts) / elapsed, "calls": client.calls, "throttled": client.throttled})
+
+        for workers in worker_counts:
+            client = StubBedrockClient(latency_ms / 1000, throttle_rate)
+            cache = EmbeddingCache(os.path.join(tmp, f"batch{workers}.sqlite3"))
+            start = time.perf_counter()
+            matrix = embed_texts(client, texts, max_workers=workers, cache=cache)
+            elapsed = time.perf_counter() - start
+            assert matrix.shape[0] == len(texts)
+            results.append({"mode": "batch", "workers": workers, "seconds": elapsed,
+                            "texts_per_s": len(texts) / elapsed, "calls": client.calls, "throttled": client.throttled})
+
+            # Same corpus again: should be served entirely from the cache
+            start = time.perf_counter()
+            embed_texts(client, texts, max_workers=workers, cache=cache)
+            elapsed = time.perf_counter() - start
+            results.append({"mode": "batch_warm_cache", "workers": workers, "seconds": elapsed,
+                            "texts_per_s": len(texts) / elapsed, "calls": client.calls, "throttled": client.throttled})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    texts = [f"abstract {i}: NF1 variant c.{i}G>A in neurofibromatosis cohort" for i in range(args.texts)]
+    results = run(texts, args.latency_ms, args.throttle_rate, args.workers)
+    print(json.dumps({"benchmark": "embeddings", "texts": args.texts, "latency_ms": args.latency_ms,
+                      "throttle_rate": args.throttle_rate, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""End-to-end performance benchmark that needs no AWS account or Tavily key.
+
+Starts FakeBedrock and FakeTavily (see fake_services.py) on localhost, points boto3
+and strands_tools.tavily at them, and measures with an empty cache directory:
+
+    construction   import time of the orchestrator and cold build time of every sub-agent
+    embedding      embed_texts throughput, cold and from the embedding cache
+    indexing       KnowledgeIndex.add_texts throughput
+    retrieval      hybrid search latency, with and without query embedding
+    turns          biohacker_agent turns: first output, total, sub-agent time and the
+                   orchestrator's own routing overhead (total minus sub-agent spans)
+    bedrock_app    AgentCore entrypoint, blocking and streaming
+
+Results are printed as JSON (and written to --out); pass --compare OLD.json to print the
+change of every metric against an earlier run, e.g. one from the previous commit.
+
+    python benchmarks/bench_offline.py --ttft-ms 300 --token-ms 5 --output-tokens 150 --out bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "biohacker"))
+
+from fake_services import FakeBedrock, FakeTavily
+
+PROMPTS = [
+    "GROMACS tutorial for a lysozyme in water simulation",
+    "Best tools for simulating molecular dynamics? Review the literature",
+    "Clean the missing values in my expression csv file",
+    "What does a ribosome do?",
+]
+
+
+def summarize(samples_ms):
+    samples_ms = sorted(samples_ms)
+    if not samples_ms:
+        return {}
+    return {"n": len(samples_ms), "mean_ms": round(statistics.fmean(samples_ms), 2),
+            "p50_ms": round(samples_ms[len(samples_ms) // 2], 2),
+            "p95_ms": round(samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))], 2)}
+
+
+def point_at_fakes(bedrock, tavily, workdir):
+    # Must happen before any biohacker module is imported: settings and clients read these once
+    os.environ.update({
+        "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": bedrock.url,
+        "AWS_ACCESS_KEY_ID": "offline", "AWS_SECRET_ACCESS_KEY": "offline",
+        "AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1",
+        "TAVILY_API_KEY": "offline",
+        "BIOHACKER_CACHE_DIR": os.path.join(workdir, "cache"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "BIOHACKER_SEMANTIC_CACHE": "off",
+    })
+    os.environ.pop("AWS_PROFILE", None)
+    import strands_tools.tavily
+
+    strands_tools.tavily.TAVILY_API_BASE_URL = tavily.url
+
+
+def bench_construction(repeats):
+    start = time.perf_counter()
+    import biohacker_agent
+    import_ms = (time.perf_counter() - start) * 1000
+
+    from code_researcher_assistant import build_researcher_agent
+    from data_cleaning_assistant import build_data_agent
+    from literature_assistant import build_literature_agent
+    from no_expertise import build_general_agent
+    from software_assistant import build_software_agent
+
+    factories = {"orchestrator": biohacker_agent.build_biohacker_agent, "software_assistant": build_software_agent,
+                 "literature_assistant": build_literature_agent, "data_cleaning_assistant": build_data_agent,
+                 "general_assistant": build_general_agent, "code_researcher_assistant": build_researcher_agent}
+    builds = {}
+    for name, factory in factories.items():
+        samples = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            factory()
+            samples.append((time.perf_counter() - t) * 1000)
+        builds[name] = summarize(samples)
+    return {"import_orchestrator_ms": round(import_ms, 1), "build": builds}
+
+
+def bench_embedding_and_index(n_texts, n_queries, workdir):
+    from embeddings import EmbeddingCache, embed_texts
+    from hybrid_retriever import HybridRetriever
+    from memory_agent import get_bedrock_client
+    from vector_index import KnowledgeIndex
+
+    client = get_bedrock_client()
+    cache = EmbeddingCache(os.path.join(workdir, "bench_embeddings.sqlite3"))
+    texts = [f"Abstract {i}: NF1 variant c.{i + 100}G>A in a neurofibromatosis type 1 cohort, "
+             f"assessed with GROMACS and ClustalW pipelines (batch {i % 17})." for i in range(n_texts)]
+
+    t = time.perf_counter()
+    embed_texts(client, texts, cache=cache)
+    cold_s = time.perf_counter() - t
+    t = time.perf_counter()
+    embed_texts(client, texts, cache=cache)
+    warm_s = time.perf_counter() - t
+
+    index = KnowledgeIndex(os.path.join(workdir, "bench_index"),
+                           embed_fn=lambda batch: embed_texts(client, batch, cache=cache))
+    metadatas = [{"source": f"https://example.org/{i}", "journal": f"Journal {i % 5}", "pub_date": f"{2000 + i % 25}"}
+                 for i in range(n_texts)]
+    t = time.perf_counter()
+    index.add_texts(texts, metadatas)
+    index_s = time.perf_counter() - t
+
+    retriever = HybridRetriever(index)
+    t = time.perf_counter()
+    retriever.refresh()
+    lexical_build_ms = (time.perf_counter() - t) * 1000
+    queries = [f"NF1 c.{100 + i * 7}G>A pathogenicity" for i in range(n_queries)]
+    with_embed, search_only = [], []
+    for q in queries:
+        t = time.perf_counter()
+        vector = index.embed_query(q)
+        embedded = time.perf_counter()
+        retriever.search(q, k=5, query_vector=vector)
+        done = time.perf_counter()
+        with_embed.append((done - t) * 1000)
+        search_only.append((done - embedded) * 1000)
+    filtered = []
+    for q in queries:
+        vector = index.embed_query(q)
+        t = time.perf_counter()
+        retriever.search(q, k=5, query_vector=vector, journal="Journal 1", date_from="2010", date_to="2015")
+        filtered.append((time.perf_counter() - t) * 1000)
+
+    return {
+        "embedding": {"texts": n_texts, "cold_texts_per_s": round(n_texts / cold_s, 1),
+                      "warm_texts_per_s": round(n_texts / max(warm_s, 1e-9), 1)},
+        "indexing": {"chunks": n_texts, "chunks_per_s_cached_embeddings": round(n_texts / index_s, 1),
+                     "lexical_index_build_ms": round(lexical_build_ms, 2)},
+        "retrieval": {"search_with_query_embedding": summarize(with_embed), "search": summarize(search_only),
+                      "search_filtered": summarize(filtered)},
+    }
+
+
+def _sub_agent_ms(records):
+    # Outermost pooled sub-agent leases in the turn (agent_pool tags them with the session)
+    by_id = {r["span_id"]: r for r in records}
+
+    def is_lease(record):
+        return record is not None and "biohacker.session" in record["attributes"]
+
+    total = 0.0
+    for r in records:
+        if not is_lease(r):
+            continue
+        parent = by_id.get(r["parent_id"])
+        while parent is not None and not is_lease(parent):
+            parent = by_id.get(parent["parent_id"])
+        if parent is None:
+            total += r["duration_ms"]
+    return total
+
+
+def bench_turns(prompts, repeats):
+    import biohacker_agent
+    import telemetry
+    from streaming import stream_turn
+
+    recent = telemetry.setup()
+    agent = biohacker_agent.biohacker_agent
+
+    async def run(prompt):
+        async for event in stream_turn(agent, prompt):
+            if event["type"] == "done":
+                return event
+
+    per_prompt = {}
+    for prompt in prompts:
+        ttfb, total, sub, routing = [], [], [], []
+        for _ in range(repeats):
+            agent.messages.clear()
+            with telemetry.span("bench.turn") as turn:
+                done = asyncio.run(run(prompt))
+            sub_ms = _sub_agent_ms(recent.spans(telemetry.trace_id(turn))) if recent else 0.0
+            ttfb.append(done["ttfb_ms"])
+            total.append(done["total_ms"])
+            sub.append(sub_ms)
+            routing.append(done["total_ms"] - sub_ms)
+        per_prompt[prompt] = {"ttfb": summarize(ttfb), "total": summarize(total),
+                              "sub_agents": summarize(sub), "routing_overhead": summarize(routing)}
+    return per_prompt
+
+
+def bench_bedrock_app(prompts, repeats):
+    try:
+        import bedrock_app
+    except ImportError as e:
+        return {"skipped": f"bedrock_app not importable: {e}"}
+
+    async def consume(gen):
+        async for event in gen:
+            if event["type"] == "done":
+                return event
+
+    blocking, streaming_ttfb, streaming_total = [], [], []
+    for i in range(repeats):
+        for j, prompt in enumerate(prompts):
+            session = f"bench-{i}-{j}"
+            t = time.perf_counter()
+            bedrock_app.invoke({"prompt": prompt, "session_id": session})
+            blocking.append((time.perf_counter() - t) * 1000)
+            done = asyncio.run(consume(bedrock_app.invoke({"prompt": prompt, "session_id": session, "stream": True})))
+            streaming_ttfb.append(done["ttfb_ms"])
+            streaming_total.append(done["total_ms"])
+    return {"blocking": summarize(blocking), "streaming_ttfb": summarize(streaming_ttfb),
+            "streaming_total": summarize(streaming_total)}
+
+
+def _flatten(obj, prefix=""):
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield prefix, obj
+
+
+def compare(old, new, out=sys.stderr):
+    before = dict(_flatten(old.get("results", {})))
+    for key, value in _flatten(new["results"]):
+        if key in before and before[key]:
+            change = (value - before[key]) / before[key] * 100
+            out.write(f"{key}: {before[key]} -> {value} ({change:+.1f}%)\n")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="fake model delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=5, help="fake model delay per output token")
+    parser.add_argument("--output-tokens", type=int, default=150, help="words in every fake answer")
+    parser.add_argument("--embed-ms", type=float, default=40, help="fake embedding delay per text")
+    parser.add_argument("--max-rps", type=float, help="fake Bedrock throttles above this many requests/s")
+    parser.add_argument("--tavily-ms", type=float, default=800, help="fake Tavily delay per request")
+    parser.add_argument("--texts", type=int, default=300, help="texts to embed and index")
+    parser.add_argument("--queries", type=int, default=50, help="retrieval queries")
+    parser.add_argument("--repeats", type=int, default=2, help="repeats per turn / construction")
+    parser.add_argument("--prompt-cache", help="BIOHACKER_PROMPT_CACHE for this run (agents, 'all' or 'off')")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["construction", "index", "turns", "bedrock_app"])
+    parser.add_argument("--out", help="also write the JSON here")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare", "skip")}
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeBedrock(args.ttft_ms, args.token_ms, args.output_tokens, args.embed_ms,
+                        max_rps=args.max_rps) as bedrock, \
+            FakeTavily(args.tavily_ms) as tavily:
+        point_at_fakes(bedrock, tavily, workdir)
+        if args.prompt_cache is not None:
+            os.environ["BIOHACKER_PROMPT_CACHE"] = args.prompt_cache
+        os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+        if "construction" not in args.skip:
+            results["construction"] = bench_construction(args.repeats)
+        if "index" not in args.skip:
+            results.update(bench_embedding_and_index(args.texts, args.queries, workdir))
+        if "turns" not in args.skip:
+            with contextlib.redirect_stdout(sys.stderr):  # agents print progress
+                results["turns"] = bench_turns(PROMPTS, args.repeats)
+        if "bedrock_app" not in args.skip:
+            with contextlib.redirect_stdout(sys.stderr):  # agents print progress
+                results["bedrock_app"] = bench_bedrock_app(PROMPTS, args.repeats)
+
+        import agent_pool
+        import bedrock_clients
+        import bedrock_models
+        import tavily_cache
+
+        results["sub_agent_pool"] = agent_pool.agent_pool.stats()
+        results["prompt_cache"] = bedrock_models.stats()
+        results["bedrock_clients"] = bedrock_clients.stats()
+        results["tavily_cache"] = tavily_cache.stats()
+        services = {"bedrock": bedrock.calls, "tavily": tavily.calls}
+
+    report = {"benchmark": "offline", "commit": git_commit(), "created": time.time(), "config": config,
+              "results": results, "fake_service_calls": services}
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
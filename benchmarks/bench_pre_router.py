@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Routing accuracy of the local pre-router and the turn latency it saves.
+
+Accuracy is measured against the labelled queries in routing_queries.jsonl (the route a
+careful human would pick for each query):
+
+    coverage    share of queries the pre-router dispatches itself
+    precision   share of those dispatches that picked the labelled specialist
+    classify    time spent deciding, per query
+
+"embedding" mode needs an embedding model; by default a local character-trigram
+embedder stands in for Titan (pass --embedder bedrock to use the real one, which needs
+AWS credentials and skips the latency run).
+
+Latency saved is measured end to end against FakeBedrock (see fake_services.py): every
+query is run once through the orchestrator LLM and once with the pre-router on, and
+the difference in turn time is reported for the dispatched queries.
+
+    python benchmarks/bench_pre_router.py --ttft-ms 600 --token-ms 10 --output-tokens 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "biohacker"))
+
+from fake_services import FakeBedrock, FakeTavily
+
+DIM = 256
+
+
+def trigram_embed(texts):
+    """Hashed character-trigram counts; a crude but deterministic stand-in for Titan."""
+    out = []
+    for text in texts:
+        vector = [0.0] * DIM
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            vector[int.from_bytes(hashlib.md5(padded[i:i + 3].encode()).digest()[:4], "little") % DIM] += 1.0
+        out.append(vector)
+    return out
+
+
+def load_queries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def accuracy(router, queries):
+    import pre_router
+
+    direct = correct = 0
+    timings, mistakes, confusion = [], [], {}
+    for item in queries:
+        start = time.perf_counter()
+        decision = router.classify(item["query"])
+        timings.append((time.perf_counter() - start) * 1000)
+        route = decision["route"]
+        confusion.setdefault(item["route"], {}).setdefault(route or "llm", 0)
+        confusion[item["route"]][route or "llm"] += 1
+        if route:
+            direct += 1
+            if route == item["route"]:
+                correct += 1
+            else:
+                mistakes.append({"query": item["query"], "expected": item["route"], "got": route,
+                                 "method": decision["method"]})
+    timings.sort()
+    examples = {q for qs in pre_router.ROUTE_EXAMPLES.values() for q in qs}
+    return {
+        "queries": len(queries),
+        "coverage": round(direct / len(queries), 3),
+        "precision": round(correct / direct, 3) if direct else None,
+        "classify_p50_ms": round(timings[len(timings) // 2], 3),
+        "classify_p95_ms": round(timings[int(len(timings) * 0.95)], 3),
+        "queries_also_in_route_examples": sum(item["query"] in examples for item in queries),
+        "confusion": confusion,
+        "mistakes": mistakes,
+    }
+
+
+def latency_saved(queries, repeats):
+    import biohacker_agent
+    import pre_router
+    from streaming import stream_turn
+
+    async def run(prompt):
+        async for event in stream_turn(agent, prompt):
+            if event["type"] == "done":
+                return event
+
+    agent = biohacker_agent.build_biohacker_agent()
+    router = pre_router.PreRouter("rules")
+    turns = {"llm": [], "pre_routed": []}
+    saved = []
+    for item in queries:
+        if not router.classify(item["query"])["route"]:
+            continue
+        times = {}
+        for mode in ("llm", "pre_routed"):
+            pre_router._default_router = router if mode == "pre_routed" else None
+            pre_router.PRE_ROUTER_MODE = "rules" if mode == "pre_routed" else "off"
+            samples = []
+            for _ in range(repeats):
+                agent.messages.clear()
+                samples.append(asyncio.run(run(item["query"]))["total_ms"])
+            times[mode] = statistics.median(samples)
+            turns[mode].append(times[mode])
+        saved.append(times["llm"] - times["pre_routed"])
+    pre_router._default_router, pre_router.PRE_ROUTER_MODE = None, "off"
+    if not saved:
+        return {"dispatched_queries": 0}
+    return {
+        "dispatched_queries": len(saved),
+        "llm_routed_turn_ms": round(statistics.fmean(turns["llm"]), 1),
+        "pre_routed_turn_ms": round(statistics.fmean(turns["pre_routed"]), 1),
+        "saved_per_dispatched_turn_ms": round(statistics.fmean(saved), 1),
+        "saved_per_turn_ms_all_queries": round(sum(saved) / len(queries), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=os.path.join(HERE, "routing_queries.jsonl"), help="labelled queries")
+    parser.add_argument("--embedder", choices=["trigram", "bedrock"], default="trigram")
+    parser.add_argument("--ttft-ms", type=float, default=600)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=1, help="turns per query and router")
+    parser.add_argument("--skip-turns", action="store_true", help="only measure accuracy")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    args.skip_turns = args.skip_turns or args.embedder == "bedrock"
+    results = {"config": vars(args)}
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeBedrock(args.ttft_ms, args.token_ms, args.output_tokens, research=False) as bedrock, \
+            FakeTavily(50) as tavily:
+        if args.embedder == "trigram":
+            os.environ.update({
+                "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": bedrock.url, "AWS_ACCESS_KEY_ID": "offline",
+                "AWS_SECRET_ACCESS_KEY": "offline", "AWS_REGION": "us-east-1", "AWS_DEFAULT_REGION": "us-east-1",
+                "TAVILY_API_KEY": "offline", "BIOHACKER_CACHE_DIR": workdir, "BIOHACKER_SEMANTIC_CACHE": "off",
+            })
+        import pre_router
+
+        embed_fn = trigram_embed if args.embedder == "trigram" else None
+        results["rules"] = accuracy(pre_router.PreRouter("rules"), queries)
+        results["embedding"] = accuracy(pre_router.PreRouter("embedding", embed_fn=embed_fn), queries)
+        if not args.skip_turns:
+            import strands_tools.tavily
+
+            strands_tools.tavily.TAVILY_API_BASE_URL = tavily.url
+            with contextlib.redirect_stdout(sys.stderr):  # agents print progress
+                results["latency"] = latency_saved(queries, args.repeats)
+            results["fake_service_calls"] = bedrock.calls
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Save and restore cost of python_repl state: one dill pickle vs per-variable snapshots.
+
+Simulates a growing analysis session. Every step adds one array and one DataFrame of
+--mb megabytes each and bumps a small counter, then saves the namespace both ways:
+
+    pickle     what strands' python_repl does: test-pickle every variable, then dump the
+               whole namespace to repl_state.pkl
+    snapshot   repl_snapshot.SnapshotStore: only variables whose fingerprint changed
+
+Per step it reports save time and bytes written; at the end, the time to restore the
+session in a fresh namespace and to read one value back (for the snapshot, one array
+and, separately, one DataFrame, which is only read when a step names it).
+
+    python benchmarks/bench_repl_snapshot.py --steps 10 --mb 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import dill
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+import repl_snapshot
+from repl_snapshot import SnapshotStore
+
+
+def pickle_save(namespace, path):
+    # strands_tools.python_repl.ReplState.save_state, minus the exec
+    save_dict = {}
+    for name, value in namespace.items():
+        if not name.startswith("_"):
+            try:
+                dill.dumps(value)
+                save_dict[name] = value
+            except BaseException:
+                continue
+    with open(path, "wb") as f:
+        dill.dump(save_dict, f)
+    return os.path.getsize(path)
+
+
+def make_frame(rows, rng):
+    import pandas as pd
+
+    return pd.DataFrame({"gene": [f"G{i}" for i in range(rows)], "log2fc": rng.standard_normal(rows),
+                         "pvalue": rng.random(rows), "count": rng.integers(0, 10_000, rows)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--mb", type=float, default=20, help="size of each new array (and DataFrame)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    try:
+        import pandas  # noqa: F401
+        frames = True
+    except ImportError:
+        frames = False
+
+    steps = []
+    namespace = {"__name__": "__main__", "counter": 0}
+    with tempfile.TemporaryDirectory() as workdir:
+        pickle_path = os.path.join(workdir, "repl_state.pkl")
+        store = SnapshotStore(os.path.join(workdir, "snapshot"))
+        for step in range(args.steps):
+            namespace[f"expr_{step}"] = rng.standard_normal(int(args.mb * (1 << 20) / 8))
+            if frames:
+                namespace[f"de_{step}"] = make_frame(int(args.mb * (1 << 20) / 40), rng)
+            namespace["counter"] += 1
+
+            start = time.perf_counter()
+            pickle_bytes = pickle_save(namespace, pickle_path)
+            pickle_s = time.perf_counter() - start
+            start = time.perf_counter()
+            report = store.save(namespace)
+            snapshot_s = time.perf_counter() - start
+            steps.append({"step": step + 1, "pickle_save_s": round(pickle_s, 3), "pickle_bytes_written": pickle_bytes,
+                          "snapshot_save_s": round(snapshot_s, 3), "snapshot_bytes_written": report["bytes_written"],
+                          "snapshot_written": report["written"], "snapshot_unchanged": report["unchanged"]})
+
+        last = f"expr_{args.steps - 1}"
+        start = time.perf_counter()
+        with open(pickle_path, "rb") as f:
+            restored = dill.load(f)
+        pickle_restore = time.perf_counter() - start
+        float(restored[last][-1])
+        pickle_first_value = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = SnapshotStore(os.path.join(workdir, "snapshot"))
+        restored = snapshot.load()
+        snapshot_restore = time.perf_counter() - start
+        float(restored[last][-1])
+        snapshot_first_value = time.perf_counter() - start
+        snapshot_first_frame = None
+        if frames:
+            start = time.perf_counter()
+            snapshot.materialize(restored, f"de_{args.steps - 1}.shape")
+            float(restored[f"de_{args.steps - 1}"]["pvalue"].iloc[-1])
+            snapshot_first_frame = time.perf_counter() - start
+
+        # A save straight after restoring must not rewrite anything
+        restored["__name__"] = "__main__"
+        start = time.perf_counter()
+        resave = snapshot.save(restored)
+        resave["save_s"] = round(time.perf_counter() - start, 3)
+
+    print(json.dumps({
+        "config": {**vars(args), "dataframes": frames, "arrow": repl_snapshot.pyarrow is not None},
+        "steps": steps,
+        "restore": {"pickle_s": round(pickle_restore, 3), "pickle_first_value_s": round(pickle_first_value, 3),
+                    "snapshot_s": round(snapshot_restore, 3), "snapshot_first_value_s": round(snapshot_first_value, 3),
+                    "snapshot_first_frame_s": snapshot_first_frame and round(snapshot_first_frame, 3)},
+        "save_after_restore": resave,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Recall and latency of vector-only, BM25-only and hybrid retrieval on a synthetic corpus.
+
+"vector" scores every chunk; "vector_nearest" goes through `KnowledgeIndex.nearest`,
+which uses the IVF lists from BIOHACKER_KB_IVF_MIN chunks on (the hybrid runs too).
+
+Each chunk is topical filler plus one gene symbol and one variant ID (e.g. "NF1
+c.3827G>A"). The stand-in embedding is a bag of hashed word vectors in which
+identifiers carry little weight, the way dense models blur "c.3827G>A" and
+"c.3872G>A", and in which every filler word has a synonym with the same vector.
+Two query kinds, each with exactly one relevant chunk:
+
+    identifier   the chunk's variant ID and gene plus four of its words (lexical wins)
+    paraphrase   synonyms of a dozen of the chunk's words (vectors win)
+
+The filtered run adds the chunk's journal and a +/-2 year pub_date window.
+
+    python benchmarks/bench_retrieval.py --sizes 2000 10000 50000 --queries 200 --k 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+import numpy as np
+
+from hybrid_retriever import HybridRetriever
+from vector_index import KnowledgeIndex
+
+DIM = 128
+GENES = ["NF1", "NF2", "TP53", "BRCA1", "BRCA2", "KRAS", "EGFR", "PTEN", "APC", "MLH1",
+         "MSH2", "ATM", "CHEK2", "PALB2", "CDH1", "SMAD4", "STK11", "RB1", "VHL", "RET"]
+JOURNALS = [f"Journal of Synthetic Genomics {i}" for i in range(20)]
+TOPICS = [[f"t{t}w{w}" for w in range(300)] for t in range(20)]
+IDENTIFIER_WEIGHT = 0.1
+
+
+class HashedBagEmbedder:
+    """Deterministic bag-of-words embedding; identifiers contribute IDENTIFIER_WEIGHT."""
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+        self._vectors = {}
+
+    def _word(self, word):
+        vector = self._vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode()).digest()[:4], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._vectors[word] = vector
+        return vector
+
+    def __call__(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.split():
+                if re.fullmatch(r"[ts]\d+w\d+", word):
+                    # "s3w7" is a synonym of "t3w7"
+                    out[i] += self._word("t" + word[1:])
+                else:
+                    out[i] += IDENTIFIER_WEIGHT * self._word(word)
+        return out
+
+
+def make_corpus(n, rng):
+    texts, metadatas, variants = [], [], []
+    for i in range(n):
+        topic = rng.randrange(len(TOPICS))
+        gene = rng.choice(GENES)
+        variant = f"c.{i + 100}{rng.choice('ACGT')}>{rng.choice('ACGT')}"
+        words = rng.choices(TOPICS[topic], k=40)
+        words.insert(rng.randrange(len(words)), f"{gene} {variant}")
+        texts.append(" ".join(words))
+        metadatas.append({
+            "title": f"Chunk {i}",
+            "journal": rng.choice(JOURNALS),
+            "pub_date": f"{rng.randint(2000, 2024)}-{rng.randint(1, 12):02d}-01",
+            "source": f"https://example.org/article/{i}",
+        })
+        variants.append((gene, variant, topic))
+    return texts, metadatas, variants
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def run_size(n, n_queries, k, rng, tmp):
+    embed = HashedBagEmbedder()
+    texts, metadatas, variants = make_corpus(n, rng)
+    index = KnowledgeIndex(os.path.join(tmp, f"kb{n}"), embed_fn=embed)
+    start = time.perf_counter()
+    for s in range(0, n, 5000):
+        index.add_texts(texts[s:s + 5000], metadatas[s:s + 5000])
+    ingest_s = time.perf_counter() - start
+
+    retriever = HybridRetriever(index)
+    start = time.perf_counter()
+    retriever.refresh()
+    bm25_build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.nearest(embed(["warm up"])[0], k)
+    ivf_build_s = time.perf_counter() - start
+    # Chunks are appended in corpus order, so slot i holds "Chunk i"
+    title_of_slot = {slot: f"Chunk {i}" for i, slot in enumerate(index.live_slots().tolist())}
+
+    targets = rng.sample(range(n), min(n_queries, n))
+    methods = ("vector", "vector_nearest", "bm25", "hybrid", "hybrid_filtered")
+    hits = {(kind, m): 0 for kind in ("identifier", "paraphrase") for m in methods}
+    latency = {m: [] for m in methods}
+    candidates = []
+    for target in targets:
+        gene, variant, topic = variants[target]
+        words = [w for w in texts[target].split() if w.startswith("t")]
+        queries = {
+            "identifier": " ".join([gene, variant] + rng.sample(words, 4)),
+            "paraphrase": " ".join("s" + w[1:] for w in rng.sample(words, 12)),
+        }
+        want = f"Chunk {target}"
+        year = int(metadatas[target]["pub_date"][:4])
+        filters = {"journal": metadatas[target]["journal"], "date_from": str(year - 2), "date_to": str(year + 2)}
+
+        for kind, query in queries.items():
+            q_vec = embed([query])[0]
+
+            def vector_only():
+                slots, scores = index.vector_scores(q_vec)
+                top = np.argpartition(-scores, k - 1)[:k]
+                return [title_of_slot[int(s)] for s in slots[top]]
+
+            def vector_nearest():
+                return [title_of_slot[int(s)] for s in index.nearest(q_vec, k)[0]]
+
+            def bm25_only():
+                with retriever._lock:
+                    slots, scores = retriever.bm25_scores(query)
+                return [title_of_slot[int(s)] for s in slots[np.argsort(-scores)[:k]]]
+
+            def hybrid():
+                return [d.metadata["title"] for d in retriever.search(query, k, query_vector=q_vec)]
+
+            def hybrid_filtered():
+                return [d.metadata["title"] for d in retriever.search(query, k, query_vector=q_vec, **filters)]
+
+            for name, fn in (("vector", vector_only), ("vector_nearest", vector_nearest), ("bm25", bm25_only),
+                             ("hybrid", hybrid), ("hybrid_filtered", hybrid_filtered)):
+                result, ms = timed(fn, 3)
+                hits[kind, name] += want in result
+                latency[name].append(ms)
+        candidates.append(len(retriever._allowed(**filters)))
+
+    return {
+        "corpus": n,
+        "ingest_s": round(ingest_s, 2),
+        "bm25_build_s": round(bm25_build_s, 2),
+        "ivf_build_s": round(ivf_build_s, 2),
+        "filtered_candidates_median": statistics.median(candidates),
+        "recall_at_k": {kind: {m: round(hits[kind, m] / len(targets), 3) for m in methods}
+                        for kind in ("identifier", "paraphrase")},
+        "latency_ms_median": {name: round(statistics.median(v), 3) for name, v in latency.items()},
+        "latency_ms_p95": {name: round(float(np.percentile(v, 95)), 3) for name, v in latency.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_size(n, args.queries, args.k, rng, tmp) for n in args.sizes]
+    print(json.dumps({"benchmark": "retrieval", "k": args.k, "queries": args.queries, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
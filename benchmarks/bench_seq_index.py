@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Random access to large FASTA/FASTQ files: seq_index vs reading the whole file.
+
+Writes a synthetic genome (a few long contigs, 60 bases per line) and a read set, then
+measures with seq_index.SequenceFile:
+
+    index_build     first open, writes the .fai
+    index_reopen    later opens, index already on disk
+    get_by_name     one record / region, averaged over --lookups random keys
+    sample          --sample random reads through the index
+    stats           length distribution, GC, N and quality for the whole file
+
+against the baseline every agent tool used before: parse the whole file (`full_parse`)
+to pull out the same record, and reservoir sampling over a full stream.
+
+    python benchmarks/bench_seq_index.py --reads 1000000 --contig-mb 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+import numpy as np
+
+import seq_index
+
+
+def make_fasta(path, contigs, contig_mb, seed=0):
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACGTN", dtype=np.uint8)
+    with open(path, "wb") as f:
+        for i in range(contigs):
+            bases = alphabet[rng.choice(5, size=int(contig_mb * (1 << 20)), p=[0.29, 0.21, 0.21, 0.29, 0.0])]
+            lines = np.pad(bases, (0, -len(bases) % 60), constant_values=ord("A")).reshape(-1, 60)
+            f.write(f">chr{i + 1} synthetic\n".encode())
+            f.write(np.hstack([lines, np.full((len(lines), 1), ord("\n"), dtype=np.uint8)]).tobytes())
+
+
+def make_fastq(path, reads, length, seed=0):
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACGT", dtype=np.uint8)
+    with open(path, "wb") as f:
+        for start in range(0, reads, 100000):
+            count = min(100000, reads - start)
+            bases = alphabet[rng.integers(0, 4, size=(count, length))]
+            quals = rng.integers(ord("#"), ord("J"), size=(count, length), dtype=np.uint8)
+            f.write(b"".join(b"@read%d/1\n%s\n+\n%s\n" % (start + i, bases[i].tobytes(), quals[i].tobytes())
+                             for i in range(count)))
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def bench(path, keys, regions, sample_size):
+    out = {"file_mb": round(os.path.getsize(path) / (1 << 20), 1)}
+    if os.path.exists(path + ".fai"):
+        os.remove(path + ".fai")
+    seconds, handle = timed(lambda: seq_index.SequenceFile(path))
+    handle.close()
+    out["index_build_s"] = round(seconds, 3)
+    seconds, handle = timed(lambda: seq_index.SequenceFile(path))
+    out["index_reopen_s"] = round(seconds, 4)
+    out["records"] = len(handle)
+
+    seconds, _ = timed(lambda: [handle.record(key) for key in keys])
+    out["get_by_name_ms"] = round(seconds / len(keys) * 1000, 4)
+    seconds, _ = timed(lambda: [handle.entry(random.randrange(len(handle))) for _ in keys])
+    out["get_by_number_ms"] = round(seconds / len(keys) * 1000, 4)
+    if regions:
+        seconds, _ = timed(lambda: [handle.region(region) for region in regions])
+        out["region_ms"] = round(seconds / len(regions) * 1000, 4)
+    seconds, _ = timed(lambda: handle.sample(sample_size, seed=1))
+    out["sample_s"] = round(seconds, 4)
+    seconds, stats = timed(handle.stats)
+    out["stats_s"] = round(seconds, 3)
+    out["stats_mb_per_s"] = round(out["file_mb"] / seconds, 1)
+    out["gc_fraction"] = stats["gc_fraction"]
+    handle.close()
+
+    # Baseline: every lookup is a full parse of the file
+    target = keys[0]
+    seconds, _ = timed(lambda: next(r for r in seq_index.iter_records(path) if r["name"] == target))
+    out["full_parse_one_record_s"] = round(seconds, 3)
+    seconds, _ = timed(lambda: seq_index.reservoir_sample(path, sample_size, seed=1))
+    out["reservoir_sample_s"] = round(seconds, 3)
+    out["speedup_lookup"] = round(out["full_parse_one_record_s"] * 1000 / max(out["get_by_name_ms"], 1e-6))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=1000000)
+    parser.add_argument("--read-length", type=int, default=150)
+    parser.add_argument("--contigs", type=int, default=4)
+    parser.add_argument("--contig-mb", type=float, default=25)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = {"config": vars(args)}
+    with tempfile.TemporaryDirectory() as tmp:
+        fasta, fastq = os.path.join(tmp, "genome.fa"), os.path.join(tmp, "reads.fastq")
+        make_fasta(fasta, args.contigs, args.contig_mb)
+        make_fastq(fastq, args.reads, args.read_length)
+        contig_bases = int(args.contig_mb * (1 << 20))
+        regions = []
+        for _ in range(args.lookups):
+            start = rng.randrange(1, contig_bases - 1000)
+            regions.append(f"chr{rng.randrange(args.contigs) + 1}:{start}-{start + 999}")
+        # Whole contigs are tens of MB, so the genome's name lookups are few; regions are 1 kb
+        results["fasta"] = bench(fasta, [f"chr{args.contigs}"] * 3, regions, min(args.sample, args.contigs))
+        results["fastq"] = bench(fastq, [f"read{rng.randrange(args.reads)}/1" for _ in range(args.lookups)], [],
+                                 args.sample)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Volcano plots of synthetic DESeq2-style results: volcano.py vs volcano_plot.R.
+
+Writes gene_name / log2FoldChange / pvalue / padj tables with --rows rows (5% truly
+differential) and plots each one, at the R script's 10 x 8 in and 300 dpi, with:
+
+    volcano     volcano.volcano: chunked read, all significant points, downsampled bulk
+    matplotlib  read the whole table with pandas and scatter every point (what a
+                hand-written python_repl plot does)
+    r           Rscript volcano_plot.R <table> <png> (ggplot2, every point); skipped
+                when Rscript, ggplot2 or dplyr isn't installed
+
+Every run is a fresh process: `seconds` includes interpreter start-up and imports,
+`plot_seconds` is imports + read + compute + render, and peak RSS is the run's own.
+
+    python benchmarks/bench_volcano.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.join(HERE, "..")
+sys.path.insert(0, os.path.join(REPO, "biohacker"))
+
+
+def make_results(path, rows, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    fc = rng.normal(0, 0.8, rows)
+    p = rng.uniform(0, 1, rows)
+    de = rng.random(rows) < 0.05
+    fc[de] += rng.choice([-2.5, 2.5], de.sum())
+    p[de] = rng.beta(0.2, 30, de.sum())
+    padj = np.minimum(p * rows / (np.argsort(np.argsort(p)) + 1), 1)
+    pd.DataFrame({"gene_name": [f"Gene_{i}" for i in range(rows)], "log2FoldChange": fc, "pvalue": p,
+                  "padj": padj}).to_csv(path, index=False)
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork+exec on Linux (it would report the parent's peak); VmHWM doesn't
+    try:
+        with open("/proc/self/status") as f:
+            return round(next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024, 1)
+    except OSError:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def matplotlib_all(source, output, dpi):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+
+    data = pd.read_csv(source)
+    data["neg_log10_pvalue"] = -np.log10(data["pvalue"])
+    up = (data["pvalue"] < 0.05) & (data["log2FoldChange"] > 1)
+    down = (data["pvalue"] < 0.05) & (data["log2FoldChange"] < -1)
+    fig, ax = plt.subplots(figsize=(10, 8))
+    for mask, color in ((down, "blue"), (~(up | down), "grey"), (up, "red")):
+        ax.scatter(data.loc[mask, "log2FoldChange"], data.loc[mask, "neg_log10_pvalue"], s=6, c=color, alpha=0.6)
+    fig.savefig(output, dpi=dpi)
+
+
+def child(args):
+    output = os.path.join(os.path.dirname(args.child_input), f"{args.child_mode}.png")
+    start = time.perf_counter()
+    if args.child_mode == "r":
+        subprocess.run(["Rscript", os.path.join(REPO, "volcano_plot.R"), args.child_input, output], check=True,
+                       capture_output=True)
+        rss = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+        print(json.dumps({"plot_seconds": round(time.perf_counter() - start, 3), "peak_rss_mb": rss}))
+        return
+    if args.child_mode == "volcano":
+        from volcano import volcano
+
+        report = volcano(args.child_input, output=output, p_column="pvalue", label_top=0, dpi=args.dpi)
+        drawn = report["points_drawn"]
+    else:
+        matplotlib_all(args.child_input, output, args.dpi)
+        drawn = None
+    print(json.dumps({"plot_seconds": round(time.perf_counter() - start, 3), "peak_rss_mb": peak_rss_mb(),
+                      "points_drawn": drawn}))
+
+
+def r_available():
+    if not shutil.which("Rscript"):
+        return False
+    check = subprocess.run(["Rscript", "-e", "library(ggplot2); library(dplyr)"], capture_output=True)
+    return check.returncode == 0
+
+
+def run(mode, path, dpi):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, __file__, "--child-mode", mode, "--child-input", path, "--dpi", str(dpi)],
+                         check=True, capture_output=True, text=True)
+    result = {"seconds": round(time.perf_counter() - start, 3)}
+    result.update(json.loads(out.stdout.strip().splitlines()[-1]))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--child-mode", help=argparse.SUPPRESS)
+    parser.add_argument("--child-input", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_mode:
+        return child(args)
+
+    modes = ["volcano", "matplotlib"] + (["r"] if r_available() else [])
+    results = {"config": {"rows": args.rows, "dpi": args.dpi}, "runs": []}
+    if "r" not in modes:
+        results["r"] = "skipped: Rscript with ggplot2 and dplyr not found"
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"results_{rows}.csv")
+            make_results(path, rows)
+            for mode in modes:
+                results["runs"].append({"rows": rows, "mode": mode, **run(mode, path, args.dpi)})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Run time of per-sample analysis snippets: fresh interpreters vs the warm worker pool.
+
+Every sample runs the same small numpy/pandas analysis (a z-scored expression matrix
+and a per-gene summary). Compared:
+
+    subprocess      one fresh `python -c` per snippet, importing numpy/pandas each time
+                    (what a sandboxed run costs without a pool)
+    in_process      exec in the benchmark process, one after another (python_repl; no
+                    isolation, imports already cached)
+    pool_serial     worker_pool.WorkerPool.run, one snippet at a time
+    pool_parallel   worker_pool.WorkerPool.run_many over all workers
+
+    python benchmarks/bench_worker_pool.py --samples 16 --workers 4 --genes 2000
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "biohacker"))
+
+from worker_pool import WorkerPool
+
+SNIPPET = """
+import numpy as np
+import pandas as pd
+rng = np.random.default_rng({seed})
+counts = pd.DataFrame(rng.poisson(20, size=({genes}, 24)).astype(float))
+logged = np.log2(counts + 1)
+z = (logged.sub(logged.mean(axis=1), axis=0)).div(logged.std(axis=1) + 1e-9, axis=0)
+for _ in range({repeats}):
+    corr = np.corrcoef(z.to_numpy())
+result = {{"sample": {seed}, "top_gene": int(z.abs().max(axis=1).idxmax()), "mean_corr": float(corr.mean())}}
+print("sample", {seed}, "done")
+"""
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--genes", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=1, help="correlation passes per sample (CPU work)")
+    args = parser.parse_args()
+
+    snippets = [SNIPPET.format(seed=i, genes=args.genes, repeats=args.repeats) for i in range(args.samples)]
+    results = {"config": vars(args)}
+
+    def run_subprocesses():
+        for code in snippets:
+            subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+    def run_in_process():
+        for code in snippets:
+            exec(code, {"__name__": "__main__"})
+
+    results["subprocess_s"] = round(timed(run_subprocesses)[0], 3)
+    with redirect_stdout(io.StringIO()):
+        results["in_process_s"] = round(timed(run_in_process)[0], 3)
+
+    pool = WorkerPool(args.workers)
+    try:
+        results["pool_warm_up_s"] = round(timed(pool.warm)[0], 3)
+        serial_s, serial = timed(lambda: [pool.run(code) for code in snippets])
+        parallel_s, parallel = timed(lambda: pool.run_many(snippets))
+        assert all(r["status"] == "ok" for r in serial + parallel), [r["error"] for r in serial + parallel]
+        assert [r["result"] for r in serial] == [r["result"] for r in parallel]
+        results["pool_serial_s"] = round(serial_s, 3)
+        results["pool_parallel_s"] = round(parallel_s, 3)
+        results["per_snippet_ms"] = {
+            "subprocess": round(1000 * results["subprocess_s"] / args.samples, 1),
+            "pool": round(1000 * serial_s / args.samples, 1),
+        }
+        results["pool_stats"] = pool.stats()
+    finally:
+        pool.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Local stand-ins for Bedrock Runtime and Tavily, for benchmarks that must run offline.
+
+FakeBedrock speaks enough of the bedrock-runtime REST protocol for boto3 and strands:
+
+    POST /model/{id}/converse-stream   AWS event-stream of text or a tool call
+    POST /model/{id}/converse          the same turn as one JSON response
+    POST /model/{id}/invoke            Titan-shaped {"embedding": [...]}
+
+Point boto3 at it with AWS_ENDPOINT_URL_BEDROCK_RUNTIME. Replies are scripted rather
+than generated: when the request offers one of the ROUTES tools and the user text
+matches its keywords the model calls that tool, a research agent calls tavily_search
+once, and otherwise (or once a tool result is back) it answers with `output_tokens`
+words. Time to first token, per-token delay, embedding delay and a request-rate
+quota (exceeding it returns ThrottlingException) are configurable.
+Usage mimics prompt caching: the prefix up to the last cachePoint block (tools, then
+system) reports cacheWriteInputTokens the first time and cacheReadInputTokens after.
+
+FakeTavily answers /search, /extract, /crawl and /map after a fixed delay; point
+`strands_tools.tavily.TAVILY_API_BASE_URL` at it.
+"""
+
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+
+# Orchestrator tools and the words that send a query to them; the last one is the fallback
+ROUTES = {
+    "software_assistant": ("gromacs", "install", "tutorial", "script", "code", "clustalw"),
+    "literature_assistant": ("literature", "paper", "papers", "best tools", "review"),
+    "data_cleaning_assistant": ("csv", "clean", "file", "files", "missing values"),
+    "general_assistant": (),
+}
+
+
+def _event(event_type, payload):
+    """One AWS event-stream message (prelude, headers, JSON payload, CRCs)."""
+    headers = b""
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"), (":message-type", "event")):
+        name_b, value_b = name.encode(), value.encode()
+        headers += struct.pack(">B", len(name_b)) + name_b + struct.pack(">BH", 7, len(value_b)) + value_b
+    body = json.dumps(payload).encode()
+    prelude = struct.pack(">II", 12 + len(headers) + len(body) + 4, len(headers))
+    message = prelude + struct.pack(">I", zlib.crc32(prelude)) + headers + body
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def _user_text(message):
+    return " ".join(block["text"] for block in message.get("content", []) if "text" in block)
+
+
+class _Server:
+    handler = None
+
+    def __init__(self, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def count(self, kind, **extra):
+        with self._lock:
+            stats = self.calls.setdefault(kind, {"calls": 0})
+            stats["calls"] += 1
+            for key, value in extra.items():
+                stats[key] = stats.get(key, 0) + value
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+
+    def _json(self, obj, status=200):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _BedrockHandler(_Handler):
+    def do_POST(self):
+        service = self.server.service
+        match = re.fullmatch(r"/model/([^/]+)/(converse-stream|converse|invoke)", self.path)
+        if not match:
+            return self._json({"message": f"unknown path {self.path}"}, 404)
+        model_id, action = unquote(match.group(1)), match.group(2)
+        request = self._body()
+        if not service.admit():
+            service.count("throttled")
+            data = json.dumps({"message": "Too many requests, please wait before trying again."}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("x-amzn-ErrorType", "ThrottlingException")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if action == "invoke":
+            return self._invoke(service, model_id, request)
+
+        turn = service.plan_turn(request)
+        usage = service.usage(request, turn["output_tokens"])
+        service.count(action, **usage)
+        time.sleep(service.ttft_ms / 1000)
+        if action == "converse":
+            time.sleep(service.token_ms * turn["output_tokens"] / 1000)
+            return self._json({
+                "output": {"message": {"role": "assistant", "content": [turn["block"]]}},
+                "stopReason": turn["stop_reason"],
+                "usage": usage,
+                "metrics": {"latencyMs": int(service.ttft_ms)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event_type, payload):
+            frame = _event(event_type, payload)
+            self.wfile.write(f"{len(frame):x}\r\n".encode() + frame + b"\r\n")
+            self.wfile.flush()
+
+        send("messageStart", {"role": "assistant"})
+        block = turn["block"]
+        if "toolUse" in block:
+            tool_use = block["toolUse"]
+            send("contentBlockStart", {"contentBlockIndex": 0,
+                                       "start": {"toolUse": {"toolUseId": tool_use["toolUseId"], "name": tool_use["name"]}}})
+            send("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"toolUse": {"input": json.dumps(tool_use["input"])}}})
+        else:
+            words = block["text"].split(" ")
+            for i in range(0, len(words), 8):
+                time.sleep(service.token_ms * len(words[i:i + 8]) / 1000)
+                send("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": " ".join(words[i:i + 8]) + " "}})
+        send("contentBlockStop", {"contentBlockIndex": 0})
+        send("messageStop", {"stopReason": turn["stop_reason"]})
+        send("metadata", {"usage": usage, "metrics": {"latencyMs": int(service.ttft_ms)}})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _invoke(self, service, model_id, request):
+        time.sleep(service.embed_ms / 1000)
+        text = request.get("inputText", "")
+        service.count("invoke", inputTokens=max(1, len(text) // 4))
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(service.embed_dim).astype(np.float32)
+        return self._json({"embedding": vector.tolist(), "inputTextTokenCount": max(1, len(text) // 4)})
+
+
+class FakeBedrock(_Server):
+    """Scripted bedrock-runtime endpoint.
+
+    Args:
+        ttft_ms: delay before the first streamed event (or the whole converse response)
+        token_ms: delay per output token
+        output_tokens: words in every text answer
+        embed_ms: delay per invoke_model (embedding) call
+        embed_dim: embedding size
+        research: whether agents offered tavily_search call it once before answering
+        cache_min_tokens: smallest prefix a cache point caches, as on Bedrock
+        max_rps: requests per second above which calls fail with ThrottlingException
+    """
+
+    handler = _BedrockHandler
+
+    def __init__(self, ttft_ms=300, token_ms=5, output_tokens=150, embed_ms=40, embed_dim=1024, research=True,
+                 cache_min_tokens=1024, max_rps=None, port=0):
+        super().__init__(port)
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.output_tokens = output_tokens
+        self.embed_ms = embed_ms
+        self.embed_dim = embed_dim
+        self.research = research
+        self.cache_min_tokens = cache_min_tokens
+        self._cached_prefixes = set()
+        self.max_rps = max_rps
+        self._admitted = []
+
+    def admit(self):
+        """False when the last second already saw max_rps requests."""
+        if not self.max_rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._admitted = [t for t in self._admitted if now - t < 1.0]
+            if len(self._admitted) >= self.max_rps:
+                return False
+            self._admitted.append(now)
+            return True
+
+    def usage(self, request, output_tokens):
+        """Token usage for a request; a prefix ending in a cache point is written once, then read."""
+        total = max(1, len(json.dumps(request)) // 4)
+        usage = {"inputTokens": total, "outputTokens": output_tokens, "totalTokens": total + output_tokens}
+        blocks = request.get("toolConfig", {}).get("tools", []) + request.get("system", [])
+        points = [i for i, block in enumerate(blocks) if "cachePoint" in block]
+        prefix = [block for block in blocks[:points[-1]] if "cachePoint" not in block] if points else []
+        tokens = len(json.dumps(prefix)) // 4 if prefix else 0
+        if tokens >= self.cache_min_tokens:
+            key = hashlib.sha256(json.dumps(prefix, sort_keys=True).encode()).hexdigest()
+            with self._lock:
+                hit = key in self._cached_prefixes
+                self._cached_prefixes.add(key)
+            usage["cacheReadInputTokens" if hit else "cacheWriteInputTokens"] = tokens
+            usage["inputTokens"] = total - tokens
+        return usage
+
+    def plan_turn(self, request):
+        messages = request.get("messages", [])
+        last = messages[-1] if messages else {}
+        tools = {t["toolSpec"]["name"]: t["toolSpec"] for t in request.get("toolConfig", {}).get("tools", []) if "toolSpec" in t}
+        got_result = any("toolResult" in block for block in last.get("content", []))
+        if tools and not got_result:
+            text = _user_text(last)
+            routed = [name for name in ROUTES if name in tools]
+            if routed:
+                lowered = text.lower()
+                name = next((n for n in routed if any(k in lowered for k in ROUTES[n])), routed[-1])
+                return self._tool_call(tools[name], name, text)
+            if self.research and "tavily_search" in tools:
+                return self._tool_call(tools["tavily_search"], "tavily_search", text[:200])
+        words = ("lorem ipsum dolor sit amet consectetur adipiscing elit " * (self.output_tokens // 8 + 1)).split()
+        return {"block": {"text": " ".join(words[:self.output_tokens])}, "stop_reason": "end_turn",
+                "output_tokens": self.output_tokens}
+
+    def _tool_call(self, spec, name, text):
+        schema = spec.get("inputSchema", {}).get("json", {})
+        argument = (schema.get("required") or list(schema.get("properties", {})) or ["query"])[0]
+        return {"block": {"toolUse": {"toolUseId": "tooluse_" + uuid.uuid4().hex[:12], "name": name,
+                                      "input": {argument: text}}},
+                "stop_reason": "tool_use", "output_tokens": 20}
+
+
+class _TavilyHandler(_Handler):
+    def do_POST(self):
+        service = self.server.service
+        request = self._body()
+        endpoint = self.path.strip("/")
+        service.count(endpoint)
+        time.sleep(service.latency_ms / 1000)
+        query = request.get("query") or request.get("url") or ", ".join(request.get("urls", []))
+        pages = [{"title": f"Result {i} for {query}"[:120], "url": f"https://example.org/{endpoint}/{i}",
+                  "content": f"Synthetic {endpoint} content {i}. " * 20, "score": 1 - i / 10} for i in range(5)]
+        if endpoint == "search":
+            return self._json({"query": query, "results": pages, "response_time": service.latency_ms / 1000})
+        if endpoint == "extract":
+            return self._json({"results": [{"url": p["url"], "raw_content": p["content"]} for p in pages],
+                               "failed_results": []})
+        if endpoint == "crawl":
+            return self._json({"base_url": query, "results": [{"url": p["url"], "raw_content": p["content"]} for p in pages]})
+        if endpoint == "map":
+            return self._json({"base_url": query, "results": [p["url"] for p in pages]})
+        return self._json({"detail": f"unknown endpoint {endpoint}"}, 404)
+
+
+class FakeTavily(_Server):
+    """Tavily REST stand-in answering every request with five synthetic results after `latency_ms`."""
+
+    handler = _TavilyHandler
+
+    def __init__(self, latency_ms=800, port=0):
+        super().__init__(port)
+        self.latency_ms = latency_ms
@@ -0,0 +1,219 @@
+"""
+Per-session pool of warm sub-agents.
+
+The specialist tools (software, literature, data cleaning, general, code researcher)
+used to build a fresh strands `Agent` on every call. The pool builds each specialist
+once per session, hands the same instance back on later calls so it keeps its
+conversation context, and evicts idle instances by TTL and an LRU bound.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import telemetry
+
+DEFAULT_SESSION = "default"
+
+# Idle agents are dropped after this many seconds, and the pool never holds more than
+# this many agents across all sessions (least recently used goes first)
+POOL_TTL_SECONDS = float(os.environ.get("BIOHACKER_AGENT_POOL_TTL", "1800"))
+POOL_MAX_AGENTS = int(os.environ.get("BIOHACKER_AGENT_POOL_MAX", "32"))
+
+# Session the current call belongs to; set by the CLI / AgentCore entrypoint
+_current_session = ContextVar("biohacker_session", default=DEFAULT_SESSION)
+
+
+def current_session():
+    return _current_session.get()
+
+
+@contextmanager
+def session_scope(session_id):
+    """Route sub-agent lookups made inside the block to `session_id`'s agents."""
+    token = _current_session.set(session_id or DEFAULT_SESSION)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def run_in_session(make_coroutine):
+    """Run `make_coroutine()` to completion on its own thread and event loop, keeping the caller's session_scope."""
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(context.run, lambda: asyncio.run(make_coroutine())).result()
+
+
+def run_agent(agent, prompt):
+    """`agent(prompt)`, with the caller's session_scope visible to the tools the turn runs.
+
+    Agent.__call__ runs the turn on a fresh executor thread without copying contextvars,
+    so sub-agent tools called from it would lease the default session's agents.
+    """
+    return run_in_session(lambda: agent.invoke_async(prompt))
+
+
+class _PoolEntry:
+    def __init__(self, key, agent):
+        self.key = key
+        self.agent = agent
+        self.last_used = time.monotonic()
+        # A strands Agent can't run two invocations at once; calls to the same
+        # specialist in the same session queue up on this lock
+        self.lock = threading.Lock()
+        # Callers holding or waiting for the lock, counted under the pool lock so an
+        # entry is never evicted between being handed out and being locked
+        self.users = 0
+        # Set by drop_session while in use; evicted when the last user releases it
+        self.dropped = False
+
+
+class AgentPool:
+    """Keeps one instance of each specialist per session.
+
+    Args:
+        ttl_seconds: idle time after which an agent is evicted
+        max_agents: upper bound on pooled agents across all sessions
+        on_evict: optional callback(session_id, name) run after an agent is evicted
+    """
+
+    def __init__(self, ttl_seconds=POOL_TTL_SECONDS, max_agents=POOL_MAX_AGENTS, on_evict=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_agents = max_agents
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"constructed": 0, "reused": 0, "evicted": 0, "construct_seconds": 0.0}
+        self._construct_seconds = {}
+        self._evicted = []
+
+    def _evict(self, key):
+        del self._entries[key]
+        self._stats["evicted"] += 1
+        self._evicted.append(key)
+
+    def _evict_expired(self, now):
+        for key in [k for k, e in self._entries.items() if now - e.last_used > self.ttl_seconds]:
+            if not self._entries[key].users:
+                self._evict(key)
+
+    def _evict_lru(self):
+        for key in list(self._entries):
+            if len(self._entries) < self.max_agents:
+                break
+            if not self._entries[key].users:
+                self._evict(key)
+
+    def _run_evict_callbacks(self):
+        # Called outside the pool lock; the callback may touch other pools
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        if self.on_evict:
+            for session_id, name in evicted:
+                self.on_evict(session_id, name)
+
+    def _get_entry(self, name, factory, session_id):
+        key = (session_id or current_session(), name)
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = now
+                entry.users += 1
+                # The session is back before its dropped entry was released: keep it
+                entry.dropped = False
+                self._stats["reused"] += 1
+                return entry
+
+        # Build outside the pool lock so one slow construction doesn't block other sessions
+        start = time.perf_counter()
+        agent = factory()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Another thread built the same agent first; keep theirs
+                entry.users += 1
+                self._stats["reused"] += 1
+                return entry
+            self._evict_lru()
+            entry = self._entries[key] = _PoolEntry(key, agent)
+            entry.users += 1
+            self._stats["constructed"] += 1
+            self._stats["construct_seconds"] += elapsed
+            self._construct_seconds[name] = elapsed
+            return entry
+
+    def acquire(self, name, factory, session_id=None):
+        """Lock and return the pool entry for `name`; pair with release(entry).
+
+        Prefer lease(). This form exists for async callers that need to take the lock
+        off the event loop (e.g. via asyncio.to_thread) and release it later.
+        """
+        entry = self._get_entry(name, factory, session_id)
+        self._run_evict_callbacks()
+        entry.lock.acquire()
+        entry.last_used = time.monotonic()
+        return entry
+
+    def release(self, entry):
+        entry.last_used = time.monotonic()
+        entry.lock.release()
+        with self._lock:
+            entry.users -= 1
+            if entry.dropped and not entry.users and self._entries.get(entry.key) is entry:
+                self._evict(entry.key)
+        self._run_evict_callbacks()
+
+    @contextmanager
+    def lease(self, name, factory, session_id=None):
+        """Borrow the `name` agent for the current session, building it with `factory` if needed.
+
+        The agent is locked for the duration of the block.
+        """
+        entry = self.acquire(name, factory, session_id)
+        try:
+            with telemetry.agent_span(name, entry.agent, **{"biohacker.session": session_id or current_session()}):
+                yield entry.agent
+        finally:
+            self.release(entry)
+
+    def drop_session(self, session_id):
+        """Forget every agent belonging to `session_id`; agents in use go when released."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == session_id]:
+                if self._entries[key].users:
+                    self._entries[key].dropped = True
+                else:
+                    self._evict(key)
+        self._run_evict_callbacks()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Construction/reuse counters plus an estimate of the construction time saved."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pooled"] = len(self._entries)
+            constructed = stats["constructed"]
+            avg = stats["construct_seconds"] / constructed if constructed else 0.0
+            stats["avg_construct_seconds"] = avg
+            stats["estimated_seconds_saved"] = avg * stats["reused"]
+            stats["construct_seconds_by_agent"] = dict(self._construct_seconds)
+            return stats
+
+
+# Shared by every specialist tool in the process
+agent_pool = AgentPool()
@@ -0,0 +1,392 @@
+"""
+Content-addressed local store for software the software agent downloads.
+
+Every "GROMACS tutorial" session used to download the same source tarballs, wheels and
+Bioconductor packages again. `fetch` serves them from a local store instead:
+
+    blobs/<sha256>        file contents, stored once however many URLs point at them
+    artifacts.sqlite3     (url, version) -> sha256, size, file name, last use
+
+Lookups go by checksum, then by URL and version, then to a local mirror directory
+(BIOHACKER_ARTIFACT_MIRROR, files named by SHA-256 or by their download file name), and
+only then to the network. Checksums ("sha256:<hex>", "md5:<hex>", or bare SHA-256) are
+verified on download. The store is capped at BIOHACKER_ARTIFACT_CACHE_GB; least
+recently used blobs are evicted past it. With BIOHACKER_OFFLINE=1 the network is never
+used, so a warm cache or mirror is enough to set everything up again.
+
+Shell installs can go through it too:
+
+    python biohacker/artifact_cache.py fetch <url> [--checksum sha256:<hex>] [-o <dir>]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+from strands import tool
+
+import telemetry
+from settings import cache_path
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_MAX_BYTES = int(float(os.environ.get("BIOHACKER_ARTIFACT_CACHE_GB", "20")) * (1 << 30))
+ARTIFACT_MIRROR = os.environ.get("BIOHACKER_ARTIFACT_MIRROR", "")
+OFFLINE = os.environ.get("BIOHACKER_OFFLINE", "").lower() in ("1", "true", "on")
+DOWNLOAD_TIMEOUT_SECONDS = float(os.environ.get("BIOHACKER_DOWNLOAD_TIMEOUT", "60"))
+CHUNK_BYTES = 1 << 20
+_SHA256 = re.compile("[0-9a-f]{64}")
+
+
+class ArtifactUnavailable(Exception):
+    """Not cached, not in the mirror, and the network is off or failed."""
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def parse_checksum(checksum):
+    """(algorithm, hex digest) from "algo:hex" or a bare SHA-256; (None, None) if not given."""
+    if not checksum:
+        return None, None
+    algorithm, _, digest = checksum.strip().rpartition(":")
+    algorithm = (algorithm or "sha256").lower().replace("-", "")
+    if algorithm not in hashlib.algorithms_available:
+        raise ValueError(f"unknown checksum algorithm {algorithm!r}")
+    length = hashlib.new(algorithm).digest_size * 2
+    digest = digest.strip().lower()
+    # The digest names a blob on disk; anything but fixed-length hex would be a path
+    if not length or not re.fullmatch(f"[0-9a-f]{{{length}}}", digest):
+        raise ValueError(f"invalid {algorithm} checksum {digest!r}; expected {length or 'fixed-length'} hex digits")
+    return algorithm, digest
+
+
+def _file_name(url):
+    return os.path.basename(urllib.parse.urlparse(url).path) or "download"
+
+
+class ArtifactCache:
+    """Content-addressed artifact store with an SQLite index and LRU size cap.
+
+    Args:
+        directory: store directory, created if missing
+        max_bytes: total blob size above which least recently used blobs are evicted
+        mirror: optional directory of pre-downloaded files, consulted before the network
+        offline: never download; serve from the store or mirror only
+    """
+
+    def __init__(self, directory=None, max_bytes=ARTIFACT_CACHE_MAX_BYTES, mirror=ARTIFACT_MIRROR, offline=OFFLINE):
+        self.directory = directory or os.path.dirname(cache_path("artifacts", "artifacts.sqlite3"))
+        self.max_bytes = max_bytes
+        self.mirror = mirror or None
+        self.offline = offline
+        self._stats = {"hits": 0, "mirror_hits": 0, "downloads": 0, "bytes_downloaded": 0, "bytes_served": 0,
+                       "evicted": 0, "failures": 0}
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        # One download per URL at a time; other callers wait and then hit the cache
+        self._url_locks = {}
+        self._conn = sqlite3.connect(os.path.join(self.directory, "artifacts.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts (url TEXT, version TEXT, sha256 TEXT, size INTEGER,"
+            " file_name TEXT, created REAL, last_used REAL, PRIMARY KEY (url, version))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts (sha256)")
+        self._conn.commit()
+
+    def blob_path(self, sha256):
+        if not _SHA256.fullmatch(sha256 or ""):
+            raise ValueError(f"not a sha256 digest: {sha256!r}")
+        return os.path.join(self.directory, "blobs", sha256)
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _lookup(self, url, version, algorithm, digest):
+        """sha256 of a stored blob matching the request, or None."""
+        with self._lock:
+            if algorithm == "sha256":
+                rows = [(digest,)]
+            else:
+                rows = self._conn.execute(
+                    "SELECT sha256 FROM artifacts WHERE url = ? AND version = ?", (url, version)
+                ).fetchall()
+        for (sha256,) in rows:
+            if os.path.exists(self.blob_path(sha256)):
+                if algorithm not in (None, "sha256") and _hash_file(self.blob_path(sha256), algorithm) != digest:
+                    continue  # same URL, different contents than the caller expects
+                return sha256
+        return None
+
+    def _mirror_candidates(self, url, algorithm, digest):
+        if not self.mirror:
+            return []
+        names = [digest] if algorithm == "sha256" else []
+        names.append(_file_name(url))
+        return [os.path.join(self.mirror, name) for name in names if os.path.isfile(os.path.join(self.mirror, name))]
+
+    def _ingest(self, source, algorithm, digest):
+        """Hash `source` into the store; returns (sha256, size)."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                sha256, checked, size = _copy_hashing(source, out, algorithm)
+            if digest and checked != digest:
+                raise ChecksumMismatch(f"expected {algorithm}:{digest}, got {algorithm}:{checked}")
+            # Read-only: fetch without dest_dir hands out the blob path itself
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, self.blob_path(sha256))
+            return sha256, size
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _record(self, url, version, sha256, size):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM artifacts WHERE url = ? AND version = ?", (url, version)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url, version) DO UPDATE SET"
+                " sha256 = excluded.sha256, size = excluded.size, last_used = excluded.last_used",
+                (url, version, sha256, size, _file_name(url), now, now),
+            )
+            self._conn.commit()
+            replaced = row[0] if row and row[0] != sha256 else None
+            if replaced and not self._conn.execute(
+                    "SELECT 1 FROM artifacts WHERE sha256 = ?", (replaced,)).fetchone():
+                # The URL now serves different contents; nothing else points at the old blob
+                try:
+                    os.remove(self.blob_path(replaced))
+                except FileNotFoundError:
+                    pass
+
+    def fetch(self, url, version="", checksum=None, dest_dir=None):
+        """Local path of the artifact at `url`, downloading it only if no stored or mirrored copy matches.
+
+        Args:
+            url: download URL (http, https or file)
+            version: optional version label; the same URL can hold several versions
+            checksum: expected "sha256:<hex>", "md5:<hex>", ... (or a bare SHA-256)
+            dest_dir: if given, the file is also copied there under its download name
+
+        Returns:
+            dict with path, sha256, size and source ("cache", "mirror" or "download")
+        """
+        algorithm, digest = parse_checksum(checksum)
+        version = version or ""
+        with telemetry.span("artifact.fetch", **{"artifact.url": url}), self._url_lock(url):
+            source = "cache"
+            sha256 = self._lookup(url, version, algorithm, digest)
+            if sha256 is not None:
+                self._count(hits=1)
+            else:
+                sha256, source = self._fetch_missing(url, algorithm, digest)
+            size = os.path.getsize(self.blob_path(sha256))
+            self._record(url, version, sha256, size)
+            self._count(bytes_served=size)
+            telemetry.annotate(**{"artifact.source": source, "artifact.bytes": size})
+        self.evict(keep=sha256)
+        path = self.blob_path(sha256)
+        if dest_dir:
+            path = _place(path, os.path.join(dest_dir, _file_name(url)))
+        return {"path": path, "sha256": sha256, "size": size, "source": source}
+
+    def _fetch_missing(self, url, algorithm, digest):
+        for candidate in self._mirror_candidates(url, algorithm, digest):
+            try:
+                with open(candidate, "rb") as f:
+                    sha256, _ = self._ingest(f, algorithm, digest)
+                self._count(mirror_hits=1)
+                return sha256, "mirror"
+            except ChecksumMismatch:
+                logger.warning("mirror copy %s does not match the expected checksum", candidate)
+        if self.offline:
+            self._count(failures=1)
+            raise ArtifactUnavailable(f"{url} is not in the artifact cache or mirror, and BIOHACKER_OFFLINE is set")
+        try:
+            request = urllib.request.Request(url, headers={"User-Agent": "biohacker-artifact-cache"})
+            with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+                sha256, size = self._ingest(response, algorithm, digest)
+        except ChecksumMismatch:
+            self._count(failures=1)
+            raise
+        except OSError as e:
+            self._count(failures=1)
+            raise ArtifactUnavailable(f"could not download {url}: {e}") from e
+        self._count(downloads=1, bytes_downloaded=size)
+        return sha256, "download"
+
+    def evict(self, keep=None):
+        """Delete least recently used blobs until the store fits in max_bytes; returns bytes freed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sha256, MAX(size), MAX(last_used) FROM artifacts GROUP BY sha256 ORDER BY MAX(last_used)"
+            ).fetchall()
+            total = sum(size for _, size, _ in rows)
+            freed = 0
+            for sha256, size, _ in rows:
+                if total - freed <= self.max_bytes:
+                    break
+                if sha256 == keep:
+                    continue
+                try:
+                    os.remove(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM artifacts WHERE sha256 = ?", (sha256,))
+                freed += size
+                self._stats["evicted"] += 1
+            self._conn.commit()
+        return freed
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def entries(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, version, sha256, size, last_used FROM artifacts ORDER BY last_used DESC"
+            ).fetchall()
+        return [dict(zip(("url", "version", "sha256", "size", "last_used"), row)) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            blobs, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT sha256, MAX(size) AS size FROM artifacts"
+                " GROUP BY sha256)"
+            ).fetchone()
+            out = dict(self._stats)
+        out.update(blobs=blobs, bytes=total, max_bytes=self.max_bytes, mirror=self.mirror, offline=self.offline)
+        requests = out["hits"] + out["mirror_hits"] + out["downloads"]
+        out["local_share"] = (out["hits"] + out["mirror_hits"]) / requests if requests else 0.0
+        return out
+
+
+def _copy_hashing(source, out, algorithm):
+    """Copy a file object, returning (sha256, digest in `algorithm`, size)."""
+    sha256 = hashlib.sha256()
+    checker = hashlib.new(algorithm) if algorithm not in (None, "sha256") else None
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        if checker is not None:
+            checker.update(chunk)
+        out.write(chunk)
+        size += len(chunk)
+    checked = checker.hexdigest() if checker is not None else sha256.hexdigest()
+    return sha256.hexdigest(), checked, size
+
+
+def _hash_file(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _place(blob, target):
+    """Copy the blob to `target`; returns target.
+
+    Not a hard link: an in-place edit of the working copy would change the shared blob,
+    and lookups don't re-hash it. copyfile uses the kernel's copy fast path where it can.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    shutil.copyfile(blob, target)
+    return target
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_artifact_cache():
+    """Process-wide artifact cache under BIOHACKER_CACHE_DIR."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ArtifactCache()
+        return _default_cache
+
+
+def stats():
+    return _default_cache.stats() if _default_cache is not None else {}
+
+
+@tool
+def fetch_artifact(url: str, version: Optional[str] = None, checksum: Optional[str] = None,
+                   dest_dir: str = ".") -> str:
+    """
+    Download a software artifact (source tarball, wheel, R/Bioconductor package, data
+    file) through the local artifact cache.
+
+    Use this instead of http_request, wget or curl for anything that will be installed
+    or unpacked: repeated setups are then served from local disk, and work offline.
+
+    Args:
+        url: download URL
+        version: version label, if the URL doesn't already pin one
+        checksum: expected checksum from the project's release page, "sha256:<hex>" or "md5:<hex>"
+        dest_dir: directory to place the file in
+
+    Returns:
+        The local file path and whether it came from the cache, the mirror or the network
+    """
+    try:
+        fetched = get_artifact_cache().fetch(url, version=version, checksum=checksum, dest_dir=dest_dir)
+    except (ArtifactUnavailable, ChecksumMismatch, ValueError) as e:
+        return f"Error: {e}"
+    return (f"{fetched['path']} ({fetched['size']} bytes, sha256 {fetched['sha256']}, "
+            f"served from {fetched['source']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch a file through the biohacker artifact cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch = commands.add_parser("fetch", help="print the local path of a URL, downloading it if needed")
+    fetch.add_argument("url")
+    fetch.add_argument("--version", default="")
+    fetch.add_argument("--checksum", help='"sha256:<hex>", "md5:<hex>" or a bare SHA-256')
+    fetch.add_argument("-o", "--dest-dir", help="also place the file here under its download name")
+    commands.add_parser("stats", help="print cache statistics")
+    args = parser.parse_args()
+
+    cache = get_artifact_cache()
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+        return
+    try:
+        print(cache.fetch(args.url, version=args.version, checksum=args.checksum, dest_dir=args.dest_dir)["path"])
+    except (ArtifactUnavailable, ChecksumMismatch, ValueError) as e:
+        raise SystemExit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,49 @@
 from strands import Agent
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
-from biohacker_agent import biohacker_agent 
+from session_registry import session_agent, async_session_agent
+from streaming import run_turn, stream_turn
+import telemetry
 
 app = BedrockAgentCoreApp()
+telemetry.setup()
+
+
+def _session_id(payload, context):
+    # AgentCore passes the runtime session in the request context; allow an explicit override
+    return payload.get("session_id") or getattr(context, "session_id", None)
+
+
+async def _stream(session_id, user_message):
+    # Yield text and tool start/end events as they happen; AgentCore sends each as an SSE event
+    async with async_session_agent(session_id) as agent:
+        async for event in stream_turn(agent, user_message):
+            if event["type"] == "done":
+                print(f"[invoke] session={session_id} ttfb_ms={event['ttfb_ms']:.0f} total_ms={event['total_ms']:.0f}")
+            yield event
+
 
 @app.entrypoint
-def invoke(payload):
-    """Process user input and return a response"""
+def invoke(payload, context=None):
+    """Process user input and return a response
+
+    Each session ID gets its own orchestrator agent and history.
+    Send {"prompt": ..., "stream": true} to receive incremental events instead of one final result.
+    """
     # Log incoming payload to confirm the request reached the handler
     print("[invoke] payload:", payload)
 
     user_message = payload.get("prompt", "Hello")
-    result = biohacker_agent(user_message)
-
-    # Defensive extraction of text from the agent result
-    if hasattr(result, "message"):
-        response_text = result.message
-    elif isinstance(result, dict) and "message" in result:
-        response_text = result.get("message")
-    else:
-        response_text = str(result)
+    session_id = _session_id(payload, context)
+    if payload.get("stream"):
+        return _stream(session_id, user_message)
+
+    # Same semantic cache and pre-routing as the streaming path
+    with session_agent(session_id) as agent:
+        done = run_turn(agent, user_message)
+        # The turn's final assistant message, whether it came from the LLM, a specialist or the cache
+        response_text = agent.messages[-1] if agent.messages else done["text"]
+    print(f"[invoke] session={session_id} ttfb_ms={done['ttfb_ms']:.0f} total_ms={done['total_ms']:.0f}"
+          f" cache={done['cache']} pre_routed={done['pre_routed']}")
 
     print("[invoke] response_text:", response_text)
     return {"result": response_text}
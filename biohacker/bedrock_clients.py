@@ -0,0 +1,274 @@
+"""
+One process-wide bedrock-runtime client, with a per-model concurrency limiter.
+
+Every strands model and every embedding call goes through `get_client()`, so they share:
+
+    one boto3 session and client     credentials are resolved and TLS connections opened
+                                     once, and kept alive in a pool of BEDROCK_MAX_POOL
+    adaptive retries                 botocore's client-side rate limiting backs off as
+                                     soon as Bedrock starts throttling
+    a limiter per model ID           at most MODEL_CONCURRENCY calls in flight per model,
+                                     and a token bucket whose rate is halved when Bedrock
+                                     throttles and grows back while calls succeed
+
+`stats()` reports calls, queue wait and throttle rate per model. Per-model limits can
+be set with BIOHACKER_BEDROCK_LIMITS, e.g. "amazon.titan-embed-text-v2:0=20:8" for 20
+requests/s and 8 in flight.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import unquote
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+BEDROCK_MAX_POOL = int(os.environ.get("BIOHACKER_BEDROCK_MAX_POOL", "64"))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get("BIOHACKER_BEDROCK_MAX_ATTEMPTS", "8"))
+BEDROCK_READ_TIMEOUT = float(os.environ.get("BIOHACKER_BEDROCK_READ_TIMEOUT", "120"))
+# Default per-model limits; a rate of 0 means no rate cap until the first throttle
+MODEL_CONCURRENCY = int(os.environ.get("BIOHACKER_BEDROCK_CONCURRENCY", "16"))
+MODEL_RATE = float(os.environ.get("BIOHACKER_BEDROCK_RPS", "0"))
+MODEL_LIMITS = os.environ.get("BIOHACKER_BEDROCK_LIMITS", "")
+# Floor for the adaptive rate, and the window the observed request rate is measured over
+MIN_RATE = 0.5
+RATE_WINDOW_SECONDS = 10.0
+
+_THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException"}
+_MODEL_PATH = re.compile(r"/model/([^/]+)/")
+
+
+def parse_limits(spec):
+    """{"model": (rate, concurrency)} from "model=rate:concurrency,..."."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.rpartition("=")
+        rate, _, concurrency = values.partition(":")
+        limits[model] = (float(rate or 0), int(concurrency or MODEL_CONCURRENCY))
+    return limits
+
+
+class ModelLimiter:
+    """Concurrency cap plus an adaptive token bucket for one model.
+
+    Args:
+        max_concurrency: calls allowed in flight at once
+        rate: requests per second to start from; 0 or None leaves the rate uncapped
+            until Bedrock throttles
+    """
+
+    def __init__(self, max_concurrency=MODEL_CONCURRENCY, rate=MODEL_RATE):
+        self.max_concurrency = max_concurrency
+        self.rate = rate or None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._tokens = float(max_concurrency)
+        self._refilled = time.monotonic()
+        self._recent = deque()
+        self._decreased = 0.0
+        self.stats = {"calls": 0, "attempts": 0, "throttles": 0, "errors": 0, "in_flight": 0,
+                      "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0}
+
+    def _take_token(self):
+        # Sleep until the bucket has a token; never hold the lock while sleeping
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._recent.append(now)
+                while self._recent and now - self._recent[0] > RATE_WINDOW_SECONDS:
+                    self._recent.popleft()
+                if self.rate is None:
+                    return
+                self._tokens = min(float(self.max_concurrency), self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._recent.pop()
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    @contextmanager
+    def slot(self):
+        """Hold one call slot; yields the seconds spent waiting for it."""
+        start = time.perf_counter()
+        self._take_token()
+        self._slots.acquire()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["queue_wait_seconds"] += waited
+            self.stats["max_queue_wait_seconds"] = max(self.stats["max_queue_wait_seconds"], waited)
+        try:
+            yield waited
+        finally:
+            with self._lock:
+                self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    def on_attempt(self, throttled):
+        with self._lock:
+            self.stats["attempts"] += 1
+            if throttled:
+                self.stats["throttles"] += 1
+                now = time.monotonic()
+                # A burst of throttles is one congestion signal: back off once per second at most
+                if now - self._decreased >= 1.0:
+                    self._decreased = now
+                    observed = len([t for t in self._recent if now - t <= 1.0])
+                    self.rate = max(MIN_RATE, 0.5 * (self.rate or max(observed, MIN_RATE * 2)))
+                    self._tokens = min(self._tokens, 1.0)
+            elif self.rate is not None:
+                # Every second of clean calls raises the rate by 10% (at least 1 request/s)
+                self.rate += max(1.0, 0.1 * self.rate) / self.rate
+
+    def on_error(self):
+        with self._lock:
+            self.stats["errors"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats)
+            out["rate_limit"] = self.rate
+        out["throttle_rate"] = out["throttles"] / out["attempts"] if out["attempts"] else 0.0
+        out["avg_queue_wait_ms"] = 1000 * out["queue_wait_seconds"] / out["calls"] if out["calls"] else 0.0
+        return out
+
+
+class LimitedBedrockClient:
+    """bedrock-runtime client proxy that runs model calls through the model's limiter.
+
+    Anything other than converse, converse_stream and invoke_model is passed through.
+    """
+
+    def __init__(self, client, limits=None):
+        self._client = client
+        self._limits = parse_limits(MODEL_LIMITS) if limits is None else limits
+        self._limiters = {}
+        self._lock = threading.Lock()
+        client.meta.events.register("needs-retry.bedrock-runtime", self._on_attempt)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def limiter(self, model_id):
+        with self._lock:
+            limiter = self._limiters.get(model_id)
+            if limiter is None:
+                rate, concurrency = self._limits.get(model_id, (MODEL_RATE, MODEL_CONCURRENCY))
+                limiter = self._limiters[model_id] = ModelLimiter(concurrency, rate)
+            return limiter
+
+    def _on_attempt(self, response=None, caught_exception=None, request_dict=None, **kwargs):
+        # Runs for every HTTP attempt, including the ones botocore retries internally
+        match = _MODEL_PATH.search((request_dict or {}).get("url_path", ""))
+        if match is None:
+            return None
+        code = None
+        if response is not None:
+            code = response[1].get("Error", {}).get("Code")
+        elif caught_exception is not None:
+            code = type(caught_exception).__name__
+        self.limiter(unquote(match.group(1))).on_attempt(code in _THROTTLE_CODES)
+        return None
+
+    def _call(self, operation, kwargs, streaming=False):
+        limiter = self.limiter(kwargs.get("modelId"))
+        slot = limiter.slot()
+        waited = slot.__enter__()
+        telemetry.annotate(**{"bedrock.queue_wait_ms": round(waited * 1000, 2)})
+        try:
+            response = getattr(self._client, operation)(**kwargs)
+        except BaseException as e:
+            limiter.on_error()
+            slot.__exit__(type(e), e, e.__traceback__)
+            raise
+        if not streaming:
+            slot.__exit__(None, None, None)
+            return response
+        # Keep the slot until the event stream has been read to the end
+        response["stream"] = _release_after(response["stream"], slot)
+        return response
+
+    def converse(self, **kwargs):
+        return self._call("converse", kwargs)
+
+    def converse_stream(self, **kwargs):
+        return self._call("converse_stream", kwargs, streaming=True)
+
+    def invoke_model(self, **kwargs):
+        return self._call("invoke_model", kwargs)
+
+    def stats(self):
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model_id: limiter.snapshot() for model_id, limiter in limiters.items()}
+
+
+def _release_after(stream, slot):
+    try:
+        yield from stream
+    finally:
+        slot.__exit__(None, None, None)
+
+
+_session = None
+_client = None
+_client_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared with the parent
+    global _session, _client, _client_lock
+    _session, _client, _client_lock = None, None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_session():
+    """Process-wide boto3 session."""
+    global _session
+    with _client_lock:
+        if _session is None:
+            import boto3
+
+            _session = boto3.Session()
+        return _session
+
+
+def region():
+    return os.environ.get("AWS_REGION") or get_session().region_name or "us-east-1"
+
+
+def get_client():
+    """Process-wide, rate-limited bedrock-runtime client."""
+    global _client
+    session = get_session()
+    # Resolved before taking the lock: region() may need get_session(), which takes it too
+    region_name = region()
+    with _client_lock:
+        if _client is None:
+            from botocore.config import Config
+
+            config = Config(
+                max_pool_connections=BEDROCK_MAX_POOL,
+                retries={"mode": "adaptive", "max_attempts": BEDROCK_MAX_ATTEMPTS},
+                read_timeout=BEDROCK_READ_TIMEOUT,
+                tcp_keepalive=True,
+                user_agent_extra="biohacker strands-agents",
+            )
+            _client = LimitedBedrockClient(session.client("bedrock-runtime", region_name=region_name, config=config))
+        return _client
+
+
+def stats():
+    """Per-model calls, queue wait and throttle rate of the shared client."""
+    return _client.stats() if _client is not None else {}
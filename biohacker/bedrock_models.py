@@ -0,0 +1,107 @@
+"""
+Bedrock model construction for every agent, with optional prompt caching.
+
+The orchestrator, software and literature prompts are long and never change, yet
+without caching they are re-processed on every model call, including every step of a
+multi-tool loop. With caching on, a Bedrock cache point is placed after the tool specs
+and after the system prompt, so later calls within the cache TTL (about five minutes)
+read that prefix from cache instead. Bedrock ignores cache points on prefixes below the
+model's minimum size (1024 tokens for Claude Sonnet), so short agents cost nothing extra.
+
+Agents to cache are listed in BIOHACKER_PROMPT_CACHE: a comma-separated subset of
+AGENT_NAMES, "all", or "off". Cache read/write tokens are put on each model-call span
+and counted per agent (see `stats`).
+"""
+
+import os
+import threading
+
+from strands.models import BedrockModel
+
+import bedrock_clients
+import telemetry
+
+AGENT_NAMES = ("orchestrator", "software_assistant", "literature_assistant", "data_cleaning_assistant",
+               "general_assistant", "code_researcher_assistant", "kb_agent", "web_scraper")
+DEFAULT_CACHED_AGENTS = "orchestrator,software_assistant,literature_assistant"
+PROMPT_CACHE = os.environ.get("BIOHACKER_PROMPT_CACHE", DEFAULT_CACHED_AGENTS).lower()
+# Bedrock's only cache point type
+CACHE_POINT_TYPE = "default"
+
+_USAGE_KEYS = ("inputTokens", "outputTokens", "cacheReadInputTokens", "cacheWriteInputTokens")
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def cached_agents(setting=None):
+    """Names of the agents whose prompts get cache points."""
+    setting = (PROMPT_CACHE if setting is None else setting).strip().lower()
+    if setting in ("", "off", "none", "0", "false"):
+        return set()
+    if setting in ("all", "on", "1", "true"):
+        return set(AGENT_NAMES)
+    return {name.strip() for name in setting.split(",") if name.strip()}
+
+
+def _record(agent_name, usage):
+    with _stats_lock:
+        stats = _stats.setdefault(agent_name, {"calls": 0, **{key: 0 for key in _USAGE_KEYS}})
+        stats["calls"] += 1
+        for key in _USAGE_KEYS:
+            stats[key] += usage.get(key, 0)
+
+
+class _SharedClientSession:
+    """Stands in for the boto3 session BedrockModel builds its client from, and hands it the shared client."""
+
+    @property
+    def region_name(self):
+        return bedrock_clients.region()
+
+    def client(self, *args, **kwargs):
+        return bedrock_clients.get_client()
+
+
+class InstrumentedBedrockModel(BedrockModel):
+    """BedrockModel on the shared client that reports prompt-cache usage on the model-call span and in `stats`."""
+
+    def __init__(self, agent_name, **config):
+        # Every agent shares one pooled, rate-limited client; BedrockModel would otherwise build its own per agent
+        super().__init__(boto_session=_SharedClientSession(), **config)
+        self.agent_name = agent_name
+
+    async def stream(self, *args, **kwargs):
+        async for event in super().stream(*args, **kwargs):
+            usage = event.get("metadata", {}).get("usage") if isinstance(event, dict) else None
+            if usage:
+                # strands' model-call span is current here but only records input/output tokens
+                telemetry.annotate(**{attr: usage[key] for key, attr in telemetry.USAGE_ATTRIBUTES.items()
+                                      if key.startswith("cache") and key in usage})
+                _record(self.agent_name, usage)
+            yield event
+
+
+def build_model(agent_name, model_id=None, **config):
+    """Bedrock model for `agent_name`, with cache points if that agent is listed in BIOHACKER_PROMPT_CACHE.
+
+    Args:
+        agent_name: one of AGENT_NAMES
+        model_id: Bedrock model ID, defaults to strands' default model
+        **config: any other BedrockModel config (temperature, max_tokens, ...)
+    """
+    if model_id:
+        config["model_id"] = model_id
+    if agent_name in cached_agents():
+        config.setdefault("cache_prompt", CACHE_POINT_TYPE)
+        config.setdefault("cache_tools", CACHE_POINT_TYPE)
+    return InstrumentedBedrockModel(agent_name, **config)
+
+
+def stats():
+    """Per-agent model calls and token counts, including cache reads and writes, since start-up."""
+    with _stats_lock:
+        out = {name: dict(values) for name, values in _stats.items()}
+    for values in out.values():
+        prompt = values["inputTokens"] + values["cacheReadInputTokens"] + values["cacheWriteInputTokens"]
+        values["cache_read_share"] = values["cacheReadInputTokens"] / prompt if prompt else 0.0
+    return {"cached_agents": sorted(cached_agents()), "agents": out}
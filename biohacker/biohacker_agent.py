@@ -6,13 +6,28 @@ A specialized Strands agent that is the orchestrator to utilize sub-agents and t
 
 """
 
+import argparse
 import json
+import os
 from strands import Agent
 from strands_tools import file_read, file_write, editor, workflow, handoff_to_user
 from data_cleaning_assistant import data_cleaning_assistant
 from software_assistant import software_assistant
 from literature_assistant import literature_assistant
 from no_expertise import general_assistant
+from concurrent_dispatch import consult_specialists
+from agent_pool import agent_pool
+import artifact_cache
+import bedrock_clients
+import bedrock_models
+from bedrock_models import build_model
+import tavily_cache
+import semantic_cache
+import pre_router
+import uploads_ingest
+import worker_pool
+import telemetry
+from streaming import render_turn
 # from code_researcher_assistant import code_researcher_assistant
 
 
@@ -39,20 +54,39 @@ You are Biohacker, a sophisticated research assistant designed to coordinate bio
    - If query involves a specified program → Software Agent
    - If query is outside these specialized areas → General Assistant
    - For complex queries, coordinate multiple agents as needed
+   - If several agents are needed and their tasks don't depend on each other's answers → call consult_specialists once with all of them so they run concurrently
 
 Always confirm your understanding before routing to ensure accurate assistance.
 """
 
+def build_biohacker_agent(conversation_manager=None):
+    """Build an orchestrator agent; the AgentCore app builds one per session."""
+    kwargs = {"conversation_manager": conversation_manager} if conversation_manager is not None else {}
+    return Agent(
+        model=build_model("orchestrator"),
+        system_prompt=BIOHACKER_PROMPT,
+        callback_handler=None,
+        tools=[data_cleaning_assistant, software_assistant, literature_assistant, general_assistant, consult_specialists, handoff_to_user],
+        **kwargs,
+    )
+
+
+# Spans from strands and from our own wrappers go to one provider (see telemetry.py)
+telemetry.setup()
+
 # Create a file-focused agent with selected tools
-biohacker_agent = Agent(
-    system_prompt=BIOHACKER_PROMPT,
-    callback_handler=None,
-    tools=[data_cleaning_assistant, software_assistant, literature_assistant, general_assistant, handoff_to_user],
-)
+biohacker_agent = build_biohacker_agent()
 
 ''''''
 # Example usage
-if __name__ == "__main__":
+def main(on_ready=None, waterfall=None):
+    """Interactive CLI loop; on_ready is called just before the first prompt.
+
+    With waterfall (or BIOHACKER_WATERFALL=1) a per-turn latency waterfall of agent,
+    model and tool spans is printed after every answer.
+    """
+    if waterfall is None:
+        waterfall = os.environ.get("BIOHACKER_WATERFALL", "").lower() in ("1", "true", "yes")
     
     print(
         '''
@@ -72,10 +106,18 @@ if __name__ == "__main__":
     3. Ask me questions about basic biology
     4. Help you with file management, workflow automation and scripting
 
-    Type 'exit' to quit
+    Type 'exit' to quit, 'pool' to see sub-agent reuse stats, 'cache' for research cache stats,
+    'cache clear [route]' to forget cached answers (all, or one specialist's),
+    'router' for pre-router stats, 'bedrock' for Bedrock queueing and throttling stats,
+    'workers' for code worker pool stats,
+    'ingest' to index new or changed files from the uploads folder
         '''
     )
 
+    # The terminal runner uses this to measure connect-to-prompt latency
+    if on_ready is not None:
+        on_ready()
+
     # Interactive loop
     while True:
         try:
@@ -83,11 +125,39 @@ if __name__ == "__main__":
             if user_input.lower() == "exit":
                 print("\nGoodbye! 👋")
                 break
+            if user_input.lower() == "pool":
+                print(json.dumps(agent_pool.stats(), indent=2))
+                continue
+            if user_input.lower().startswith("cache clear"):
+                cache = semantic_cache.get_semantic_cache()
+                route = user_input.split()[2] if len(user_input.split()) > 2 else None
+                print(json.dumps({"answers_dropped": cache.invalidate(route) if cache else "off"}, indent=2))
+                continue
+            if user_input.lower() == "cache":
+                cache = semantic_cache.get_semantic_cache()
+                print(json.dumps({"research": tavily_cache.stats(), "answers": cache.stats() if cache else "off",
+                                  "prompts": bedrock_models.stats(), "software": artifact_cache.stats()}, indent=2))
+                continue
+            if user_input.lower() == "router":
+                router = pre_router.get_pre_router()
+                print(json.dumps(router.stats() if router else "off", indent=2))
+                continue
+            if user_input.lower() == "bedrock":
+                print(json.dumps(bedrock_clients.stats(), indent=2))
+                continue
+            if user_input.lower() == "workers":
+                print(json.dumps(worker_pool.stats() or "not started", indent=2))
+                continue
+            if user_input.lower() == "ingest":
+                print(json.dumps(uploads_ingest.ingest_uploads(), indent=2))
+                continue
             
             print("Thinking...")
-            response = biohacker_agent(user_input)
-            content = str(response)
-            print(content)
+            # Stream text and tool progress as it happens instead of waiting for the full answer
+            with telemetry.agent_span("orchestrator", biohacker_agent) as turn:
+                render_turn(biohacker_agent, user_input)
+            if waterfall:
+                print("\n" + telemetry.waterfall(telemetry.trace_id(turn)))
             
         except KeyboardInterrupt:
             print("\n\nExecution interrupted. Exiting...")
@@ -95,3 +165,9 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"\nAn error occurred: {str(e)}")
             print("Please try asking a different question.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Biohacker research assistant CLI")
+    parser.add_argument("--waterfall", action="store_true", help="print a latency waterfall after every turn")
+    main(waterfall=parser.parse_args().waterfall or None)
@@ -1,6 +1,8 @@
 from strands import Agent, tool
-from strands_tools.tavily import tavily_search, tavily_extract, tavily_crawl, tavily_map
+from tavily_cache import tavily_search, tavily_extract, tavily_crawl, tavily_map
 import json
+from agent_pool import agent_pool
+from bedrock_models import build_model
 
 CODE_RESEARCHER_SYSTEM_PROMPT ='''
                     You are a Researcher Agent that gathers information from code repositories, documentations, and scholarly articles. 
@@ -8,19 +10,26 @@ CODE_RESEARCHER_SYSTEM_PROMPT ='''
                     2. Include source URLs and keep findings concise, without losing information
                     3. Always prioritise accuracy and reliability in your findings, if there is not enough information, warn the user.
                     '''
+
+
+def build_researcher_agent():
+    return Agent(
+        model=build_model("code_researcher_assistant"),
+        system_prompt=CODE_RESEARCHER_SYSTEM_PROMPT,
+        callback_handler=None, ## impt to suppress output
+        tools=[tavily_search, tavily_extract,  tavily_crawl, tavily_map],
+    )
+
+
 @tool
 def code_researcher_assistant(user_input):
 
     try:
             print("Searching code repositories, documentations, and scholarly articles (this may take ~5mins...☕?)")
-            researcher_agent = Agent(
-                system_prompt=CODE_RESEARCHER_SYSTEM_PROMPT,
-                callback_handler=None, ## impt to suppress output
-                tools=[tavily_search, tavily_extract,  tavily_crawl, tavily_map],
-            )
-            researcher_response = researcher_agent(
-                f"Research: '{user_input}'. Use your available tools to gather information from reliable sources.",
-            )
+            with agent_pool.lease("code_researcher_assistant", build_researcher_agent) as researcher_agent:
+                researcher_response = researcher_agent(
+                    f"Research: '{user_input}'. Use your available tools to gather information from reliable sources.",
+                )
             research_findings = str(researcher_response)
 
             if len(research_findings) > 0:
@@ -0,0 +1,128 @@
+"""
+Concurrent fan-out of independent specialist calls for one orchestrator turn.
+
+When a query needs several specialists whose work doesn't depend on each other
+(e.g. a literature review plus a data-cleaning pass), running them one after another
+costs the sum of their latencies. `consult_specialists` runs them on a bounded thread
+pool instead and merges the answers back in the order they were requested.
+
+strands' default ConcurrentToolExecutor already runs several tool calls from one model
+message at the same time. This tool adds what that doesn't:
+
+    cap         at most BIOHACKER_MAX_PARALLEL_AGENTS specialists per turn; the executor
+                starts every tool call in the message at once, and each specialist is
+                its own Bedrock conversation, so a wide fan-out runs into throttling
+    breakdown   per-specialist wall time and the sequential equivalent, in the result
+                the orchestrator sees and on the tool's span
+    one call    the prompt asks for a single consult_specialists call, which the model
+                follows more reliably than emitting parallel tool calls by itself
+
+The breakdown is part of each call's own result, so concurrent sessions never see
+each other's timings.
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from strands import tool
+
+import telemetry
+from data_cleaning_assistant import data_cleaning_assistant
+from literature_assistant import literature_assistant
+from no_expertise import general_assistant
+from software_assistant import software_assistant
+
+# Upper bound on specialists running at once within a single turn
+MAX_PARALLEL_SPECIALISTS = int(os.environ.get("BIOHACKER_MAX_PARALLEL_AGENTS", "3"))
+
+SPECIALISTS = {
+    "data_cleaning_assistant": data_cleaning_assistant,
+    "software_assistant": software_assistant,
+    "literature_assistant": literature_assistant,
+    "general_assistant": general_assistant,
+}
+
+def _run_branch(index, name, query):
+    start = time.perf_counter()
+    try:
+        specialist = SPECIALISTS[name]
+        answer = str(specialist(query))
+        error = None
+    except Exception as e:
+        answer, error = f"Error from {name}: {e}", str(e)
+    return {"index": index, "agent": name, "query": query, "answer": answer,
+            "seconds": time.perf_counter() - start, "error": error}
+
+
+def dispatch(requests, max_workers=MAX_PARALLEL_SPECIALISTS):
+    """Run specialist requests concurrently.
+
+    Args:
+        requests: list of {"agent": <specialist name>, "query": <sub-query>}
+        max_workers: concurrency limit for this turn
+
+    Returns:
+        one result dict per request, in request order, each with its wall time
+    """
+    # The model writes this argument; reject anything but a list of objects before indexing into it
+    if not isinstance(requests, list) or not all(isinstance(r, dict) for r in requests):
+        raise ValueError('requests must be a list of {"agent": ..., "query": ...} objects')
+    unknown = [r.get("agent") for r in requests
+               if not isinstance(r.get("agent"), str) or r["agent"] not in SPECIALISTS]
+    if unknown:
+        raise ValueError(f"unknown specialist(s) {unknown}; expected one of {sorted(SPECIALISTS)}")
+    if any(not isinstance(r.get("query"), str) or not r["query"].strip() for r in requests):
+        raise ValueError("every request needs a non-empty 'query' string")
+
+    workers = max(1, min(max_workers, len(requests)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="specialist") as pool:
+        # Each branch gets a copy of the caller's context so the session scope carries over
+        futures = [
+            pool.submit(contextvars.copy_context().run, _run_branch, i, r["agent"], r["query"])
+            for i, r in enumerate(requests)
+        ]
+        results = [f.result() for f in futures]
+    return sorted(results, key=lambda r: r["index"])
+
+
+def format_results(results, total_seconds):
+    sections = [f"## {r['agent']}\n{r['answer']}" for r in results]
+    timings = "\n".join(f"- {r['agent']}: {r['seconds']:.1f}s" + (" (error)" if r["error"] else "") for r in results)
+    serial = sum(r["seconds"] for r in results)
+    return (
+        "\n\n".join(sections)
+        + f"\n\n## Latency breakdown\n{timings}\n- wall time: {total_seconds:.1f}s (sequential would be ~{serial:.1f}s)"
+    )
+
+
+@tool
+def consult_specialists(requests: List[Dict[str, str]]) -> str:
+    """
+    Ask several specialist agents independent questions at the same time.
+
+    Use this instead of calling specialists one by one when a query needs more than one
+    of them and their answers don't depend on each other.
+
+    Args:
+        requests: list of {"agent": ..., "query": ...} where agent is one of
+            data_cleaning_assistant, software_assistant, literature_assistant, general_assistant
+
+    Returns:
+        Each specialist's answer under its own heading, in request order, followed by a
+        per-specialist latency breakdown
+    """
+    start = time.perf_counter()
+    try:
+        results = dispatch(requests)
+    except ValueError as e:
+        return f"Error: {e}"
+    total_seconds = time.perf_counter() - start
+    telemetry.annotate(**{
+        "specialists.agents": [r["agent"] for r in results],
+        "specialists.seconds": [round(r["seconds"], 3) for r in results],
+        "specialists.wall_seconds": round(total_seconds, 3),
+    })
+    return format_results(results, total_seconds)
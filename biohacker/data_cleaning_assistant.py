@@ -3,22 +3,36 @@
 from strands import Agent, tool
 from strands_tools import file_read, file_write, editor, shell
 import json
+from agent_pool import agent_pool
+from bedrock_models import build_model
+from memory_agent import similarity_search
+from uploads_ingest import index_uploads
+from cleaning_engine import clean_table
+from seq_index import sequence_file
 
 DATA_SYSTEM_PROMPT = """
 You are a file sorter that helps organises the users files, stored in ./uploads
+To answer questions about the contents of uploaded papers and notes, run index_uploads (it only re-reads new or changed files) and then similarity_search.
+To clean tabular data (CSV/TSV/Parquet expression matrices, count tables), never read the whole file: look at its first lines, then call clean_table with a spec (preview_rows first to check the result, then with an output file).
+For FASTA/FASTQ files (genomes, sequencing reads), use sequence_file instead of file_read: stats for an overview, then get, region or sample for the records you need.
 """
 
 
+def build_data_agent():
+    return Agent(
+        model=build_model("data_cleaning_assistant"),
+        system_prompt=DATA_SYSTEM_PROMPT,
+        tools=[editor, file_read, file_write, shell, index_uploads, similarity_search, clean_table, sequence_file],
+    )
+
+
 @tool
 def data_cleaning_assistant(query: str) -> str:
     try:
         print("Searching data files...")
 
-        data_agent = Agent(
-            system_prompt=DATA_SYSTEM_PROMPT,
-            tools=[editor, file_read, file_write, shell],
-        )
-        agent_response = data_agent(query)
+        with agent_pool.lease("data_cleaning_assistant", build_data_agent) as data_agent:
+            agent_response = data_agent(query)
         text_response = str(agent_response)
 
         if len(text_response) > 0:
@@ -0,0 +1,243 @@
+"""
+Near-duplicate chunk elimination between splitting and embedding.
+
+Repeated scrapes return the same abstract from PubMed, the publisher and a preprint
+server, plus boilerplate that survives every split. Each copy costs an embedding call
+and an index slot, and copies crowd each other out of the top-k. Before embedding,
+every chunk is checked against the current batch and against everything ingested
+earlier:
+
+    exact   SHA-256 of the normalized text
+    near    MinHash signature of word shingles, bucketed with LSH; candidates are kept
+            as duplicates when their estimated Jaccard similarity reaches the threshold
+
+The first copy wins. Sources of dropped copies are recorded against it (in this
+store and in the kept chunk's "duplicate_sources" metadata), so provenance survives.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+from embeddings import normalize_text
+from vector_index import chunk_id
+
+logger = logging.getLogger(__name__)
+
+DEDUP_THRESHOLD = float(os.environ.get("BIOHACKER_DEDUP_THRESHOLD", "0.85"))
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 Jaccard become candidates, then the threshold decides
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(0x5EED)
+# Kept below 2**31 so a * hash + b cannot overflow uint64 for 32-bit shingle hashes
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).lower().encode("utf-8")).hexdigest()
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """32-bit hashes of the word `size`-grams of the normalized text."""
+    words = normalize_text(text).lower().split()
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM uint32 values) of the text's shingles."""
+    hashes = shingles(text)
+    return (((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def band_keys(signature, bands=LSH_BANDS):
+    rows = len(signature) // bands
+    return [hashlib.blake2b(signature[b * rows:(b + 1) * rows].tobytes(), digest_size=8).hexdigest() for b in range(bands)]
+
+
+def jaccard_estimate(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+class ChunkDeduplicator:
+    """Persistent exact + MinHash/LSH duplicate detector for knowledge-base chunks.
+
+    Args:
+        path: SQLite file for hashes, LSH buckets and provenance, created if missing
+        threshold: minimum estimated Jaccard similarity for a near duplicate
+    """
+
+    def __init__(self, path, threshold=DEDUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS hashes (content_hash TEXT PRIMARY KEY, doc_id TEXT);
+            CREATE TABLE IF NOT EXISTS signatures (doc_id TEXT PRIMARY KEY, signature BLOB);
+            CREATE TABLE IF NOT EXISTS buckets (band INTEGER, key TEXT, doc_id TEXT);
+            CREATE INDEX IF NOT EXISTS buckets_key ON buckets(band, key);
+            CREATE TABLE IF NOT EXISTS provenance (doc_id TEXT, source TEXT, UNIQUE(doc_id, source));
+            """
+        )
+        self._conn.commit()
+
+    def _forget(self, doc_ids):
+        # Stored chunk was deleted from the index since; it can no longer absorb duplicates
+        for doc_id in doc_ids:
+            for table in ("hashes", "signatures", "buckets", "provenance"):
+                self._conn.execute(f"DELETE FROM {table} WHERE doc_id = ?", (doc_id,))
+
+    def _stored_match(self, digest, signature, alive):
+        row = self._conn.execute("SELECT doc_id FROM hashes WHERE content_hash = ?", (digest,)).fetchone()
+        if row and alive(row[0]):
+            return row[0], "exact"
+        candidates = set()
+        for band, key in enumerate(band_keys(signature)):
+            candidates.update(r[0] for r in self._conn.execute(
+                "SELECT doc_id FROM buckets WHERE band = ? AND key = ?", (band, key)))
+        best, best_score = None, self.threshold
+        for doc_id in candidates:
+            row = self._conn.execute("SELECT signature FROM signatures WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                continue
+            score = jaccard_estimate(signature, np.frombuffer(row[0], dtype=np.uint32))
+            if score >= best_score and alive(doc_id):
+                best, best_score = doc_id, score
+        return (best, "near") if best else (None, None)
+
+    def deduplicate(self, documents, index=None):
+        """Drop chunks that duplicate earlier ones and register the survivors.
+
+        Args:
+            documents: split LangChain Documents, in ingestion order
+            index: KnowledgeIndex the survivors are about to be added to; used to ignore
+                stored chunks that have since been deleted and to record provenance on
+                chunks already in the index
+
+        Returns:
+            (kept documents, report dict with exact/near duplicate counts and embeddings avoided)
+        """
+        documents = list(documents)
+        report = {"chunks": len(documents), "exact_duplicates": 0, "near_duplicates": 0}
+        kept, kept_ids, batch_hashes, batch_buckets, batch_sigs = [], [], {}, {}, []
+        merged_into_stored = {}
+        dead = set()
+
+        def alive(doc_id):
+            if index is None:
+                return True
+            if doc_id in dead:
+                return False
+            if doc_id in index.existing_ids([doc_id]):
+                return True
+            dead.add(doc_id)
+            self._forget([doc_id])
+            return False
+
+        with self._lock:
+            for doc in documents:
+                text, metadata = doc.page_content, dict(doc.metadata)
+                digest = content_hash(text)
+                signature = minhash(text)
+                keys = band_keys(signature)
+
+                # Within this batch first, then against everything ingested before
+                match, kind = None, None
+                if digest in batch_hashes:
+                    match, kind = batch_hashes[digest], "exact"
+                else:
+                    candidates = {i for band, key in enumerate(keys) for i in batch_buckets.get((band, key), ())}
+                    scored = [(jaccard_estimate(signature, batch_sigs[i]), i) for i in candidates]
+                    scored = [s for s in scored if s[0] >= self.threshold]
+                    if scored:
+                        match, kind = max(scored)[1], "near"
+                if match is None:
+                    stored, kind = self._stored_match(digest, signature, alive)
+                    if stored:
+                        # A re-scrape of the very same chunk is not a new source
+                        if chunk_id(metadata.get("source"), text) != stored:
+                            merged_into_stored.setdefault(stored, set()).add(metadata.get("source"))
+                        report[f"{kind}_duplicates"] += 1
+                        continue
+
+                if match is not None:
+                    report[f"{kind}_duplicates"] += 1
+                    target = kept[match].metadata
+                    source = metadata.get("source")
+                    if source and source != target.get("source") and source not in target["duplicate_sources"]:
+                        target["duplicate_sources"].append(source)
+                    continue
+
+                # Same ID the index will assign, so later batches can point at this chunk
+                doc_id = chunk_id(metadata.get("source"), text)
+                metadata.setdefault("duplicate_sources", [])
+                doc.metadata = metadata
+                batch_hashes[digest] = len(kept)
+                for band, key in enumerate(keys):
+                    batch_buckets.setdefault((band, key), []).append(len(kept))
+                batch_sigs.append(signature)
+                kept_ids.append(doc_id)
+                kept.append(doc)
+
+                self._conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?)", (digest, doc_id))
+                self._conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?)", (doc_id, signature.tobytes()))
+                self._conn.execute("DELETE FROM buckets WHERE doc_id = ?", (doc_id,))
+                self._conn.executemany("INSERT INTO buckets VALUES (?, ?, ?)",
+                                       [(band, key, doc_id) for band, key in enumerate(keys)])
+
+            for doc_id, doc in zip(kept_ids, kept):
+                for source in doc.metadata["duplicate_sources"]:
+                    self._conn.execute("INSERT OR IGNORE INTO provenance VALUES (?, ?)", (doc_id, source))
+            for doc_id, sources in merged_into_stored.items():
+                for source in sources:
+                    if source:
+                        self._conn.execute("INSERT OR IGNORE INTO provenance VALUES (?, ?)", (doc_id, source))
+            self._conn.commit()
+
+        if index is not None and merged_into_stored:
+            index.update_metadata({doc_id: {"duplicate_sources": self.provenance(doc_id)} for doc_id in merged_into_stored})
+
+        report["kept"] = len(kept)
+        # Titan embeds one text per invoke_model call, so every dropped chunk is a call saved
+        report["embeddings_avoided"] = report["exact_duplicates"] + report["near_duplicates"]
+        return kept, report
+
+    def provenance(self, doc_id):
+        """Sources whose copies of `doc_id` were dropped as duplicates."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT source FROM provenance WHERE doc_id = ? ORDER BY rowid", (doc_id,))]
+
+    def merged_sources(self, doc_ids):
+        """Every source that was merged into any of `doc_ids`."""
+        doc_ids = list(doc_ids)
+        found = set()
+        with self._lock:
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                found.update(r[0] for r in self._conn.execute(
+                    f"SELECT DISTINCT source FROM provenance WHERE doc_id IN ({','.join('?' * len(batch))})", batch))
+        return found
+
+    def stats(self):
+        with self._lock:
+            (chunks,) = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()
+            (merged,) = self._conn.execute("SELECT COUNT(*) FROM provenance").fetchone()
+        return {"chunks": chunks, "merged_sources": merged}
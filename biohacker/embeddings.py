@@ -0,0 +1,261 @@
+"""
+Titan embeddings with a persistent, content-addressed cache.
+
+Vectors are stored in SQLite as float32 blobs keyed by the model ID and a hash of the
+normalized text, so re-embedding the same abstracts on every rebuild is a local lookup
+instead of an `invoke_model` round-trip.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import telemetry
+from settings import cache_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_MODEL = "amazon.titan-embed-text-v2:0"
+
+# Concurrent invoke_model calls for batch embedding. Throttled calls are retried by the
+# shared client's adaptive retry mode (bedrock_clients.py), not here
+EMBED_MAX_WORKERS = int(os.environ.get("BIOHACKER_EMBED_WORKERS", "8"))
+
+# Max number of cached vectors (a Titan v2 vector is 4 KB) before least recently used rows go
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("BIOHACKER_EMBED_CACHE_MAX", "200000"))
+
+
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_id, text):
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+class EmbeddingCache:
+    """SQLite-backed map of (model ID, normalized text) -> float32 vector.
+
+    Args:
+        path: database file, created if missing
+        max_entries: size cap; the least recently used rows are evicted past it
+    """
+
+    def __init__(self, path=None, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        self.path = path or cache_path("embeddings.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connect()
+        # SQLite connections must not cross fork(); forked runner sessions reopen their own
+        os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model_id TEXT, dim INTEGER, vector BLOB, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_access)")
+        self._conn.commit()
+
+    def get_many(self, model_id, texts):
+        """Cached vectors for `texts`, with None where a text hasn't been embedded yet."""
+        keys = [cache_key(model_id, t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+
+    def get(self, model_id, text):
+        return self.get_many(model_id, [text])[0]
+
+    def put_many(self, model_id, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((cache_key(model_id, text), model_id, vector.shape[0], vector.tobytes(), now))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def put(self, model_id, text, vector):
+        self.put_many(model_id, [text], [vector])
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count <= self.max_entries:
+            return
+        # Trim to 90% of the cap so we don't evict again on the very next insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (excess,),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache, opened on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+#Semantic Similarity with Amazon Titan Embeddings
+#Calls Bedrock's invoke_model() API
+#Sends the text in JSON as {"inputText:"}
+#Gets back an embedding (a list of numbers)
+#Returns embedding as a NumPy array
+def _invoke_embedding(bedrock_client, prompt_data, modelId):
+    accept = "application/json"
+    contentType = "application/json"
+    body = json.dumps({"inputText": prompt_data})
+    response = bedrock_client.invoke_model(
+        body=body, modelId=modelId, accept=accept, contentType=contentType
+    )
+    response_body = json.loads(response.get("body").read())
+    embedding = response_body.get("embedding")
+    return np.array(embedding, dtype=np.float32)
+
+
+def embed_text_input(bedrock_client, prompt_data, modelId=DEFAULT_EMBED_MODEL, cache=None):
+    """Embed one text, reading through the embedding cache."""
+    cache = cache if cache is not None else get_embedding_cache()
+    vector = cache.get(modelId, prompt_data)
+    if vector is None:
+        vector = _invoke_embedding(bedrock_client, prompt_data, modelId)
+        cache.put(modelId, prompt_data, vector)
+    return vector
+
+
+def _embed_missing(fn, texts, vectors, cache, model_id, max_workers):
+    """Fill the None slots of `vectors` by running fn over the matching texts in a thread pool."""
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if not missing:
+        return vectors
+    # Embed each distinct missing text once; map() keeps results in input order
+    unique = list(dict.fromkeys(texts[i] for i in missing))
+    workers = max(1, min(max_workers, len(unique)))
+    if workers == 1:
+        fresh = [fn(t) for t in unique]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+            fresh = list(pool.map(fn, unique))
+    fresh = [np.asarray(v, dtype=np.float32) for v in fresh]
+    cache.put_many(model_id, unique, fresh)
+    by_text = dict(zip(unique, fresh))
+    for i in missing:
+        vectors[i] = by_text[texts[i]]
+    return vectors
+
+
+def embed_texts(bedrock_client, texts, modelId=DEFAULT_EMBED_MODEL, max_workers=EMBED_MAX_WORKERS, cache=None):
+    """Embed many texts concurrently.
+
+    Cached texts are served locally; the rest go to Bedrock through a bounded thread
+    pool; throttled requests are retried one by one by the client's adaptive retries.
+
+    Args:
+        bedrock_client: a bedrock-runtime client
+        texts: iterable of strings
+        modelId: embedding model
+        max_workers: maximum concurrent invoke_model calls
+        cache: an EmbeddingCache, defaults to the process-wide one
+
+    Returns:
+        float32 matrix of shape (len(texts), dim), rows in input order
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    cache = cache if cache is not None else get_embedding_cache()
+    with telemetry.span("embed_texts", **{"gen_ai.request.model": modelId, "embedding.texts": len(texts)}):
+        vectors = cache.get_many(modelId, texts)
+        telemetry.annotate(**{"embedding.cache_hits": sum(v is not None for v in vectors)})
+        vectors = _embed_missing(
+            lambda t: _invoke_embedding(bedrock_client, t, modelId), texts, vectors, cache, modelId, max_workers
+        )
+    return np.vstack(vectors)
+
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # LangChain is only needed for the vector store path
+    Embeddings = object
+
+
+class CachedBedrockEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that serves repeats from the embedding cache.
+
+    Args:
+        embeddings: the underlying `BedrockEmbeddings` (or any LangChain embeddings)
+        model_id: cache namespace, defaults to the wrapped model's ID
+        cache: an EmbeddingCache, defaults to the process-wide one
+        max_workers: concurrent embedding requests for cache misses
+    """
+
+    def __init__(self, embeddings, model_id=None, cache=None, max_workers=EMBED_MAX_WORKERS):
+        self.embeddings = embeddings
+        self.model_id = model_id or getattr(embeddings, "model_id", DEFAULT_EMBED_MODEL)
+        self.cache = cache if cache is not None else get_embedding_cache()
+        self.max_workers = max_workers
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = self.cache.get_many(self.model_id, texts)
+        # The wrapped embeddings embed one text per request, so fan the misses out ourselves
+        vectors = _embed_missing(
+            lambda t: self.embeddings.embed_documents([t])[0],
+            texts, vectors, self.cache, self.model_id, self.max_workers,
+        )
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text):
+        vector = self.cache.get(self.model_id, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_id, text, vector)
+        return np.asarray(vector, dtype=np.float32).tolist()
@@ -0,0 +1,340 @@
+"""
+Hybrid lexical + vector retrieval over the knowledge index.
+
+Dense vectors match gene symbols (NF1), variant IDs (c.3827G>A, p.Arg1276Gln) and tool
+names poorly, so every query is scored twice:
+    - BM25 over an in-memory inverted index; only the postings of the query's terms are
+      visited, so cost follows how rare the terms are rather than corpus size
+    - cosine similarity from the KnowledgeIndex vectors, through its IVF lists once the
+      index is large (`KnowledgeIndex.nearest`), so this side grows with about the
+      square root of the corpus too
+and the two are merged with a weighted sum of scores scaled over the pooled
+candidates (rank-only fusion such as RRF loses the signal that an exact variant
+match is far ahead of everything else).
+
+Metadata filters (pub_date range, journal, source) are resolved against small
+per-field indexes first, so both scorers only ever see the allowed chunks.
+"""
+
+import bisect
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Keeps identifiers like NF1, c.3827G>A, p.Arg1276Gln, rs1234, GROMACS-2023 in one piece
+_TOKEN_RE = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_.:>+\-]*[A-Za-z0-9>])?")
+_SUBTOKEN_SPLIT = re.compile(r"[_.:>+\-]+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# How deep each ranking is read before fusing, and the share of the lexical score
+CANDIDATE_DEPTH = 50
+LEXICAL_WEIGHT = 0.5
+# Terms in more than this share of chunks only rescore candidates found by rarer terms
+COMMON_TERM_RATIO = 0.02
+
+
+def tokenize(text):
+    """Lowercased tokens; compound identifiers also contribute their parts (c.3827G>A -> c, 3827g)."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group(0).lower()
+        tokens.append(token)
+        parts = [p for p in _SUBTOKEN_SPLIT.split(token) if p]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+_DATE_FORMATS = (("%Y-%m-%d", "day"), ("%Y/%m/%d", "day"), ("%Y-%m", "month"), ("%Y/%m", "month"),
+                 ("%d %B %Y", "day"), ("%d %b %Y", "day"), ("%B %d, %Y", "day"), ("%b %d, %Y", "day"),
+                 ("%B %Y", "month"), ("%b %Y", "month"), ("%Y %b %d", "day"), ("%Y %b", "month"), ("%Y", "year"))
+
+
+def _parse_date_precision(value):
+    """(date, "day" | "month" | "year") for a date string, (None, None) if unknown."""
+    if isinstance(value, (date, datetime)):
+        return (value if isinstance(value, date) and not isinstance(value, datetime) else value.date()), "day"
+    if not value or not isinstance(value, str):
+        return None, None
+    value = value.strip()
+    for fmt, precision in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date(), precision
+        except ValueError:
+            continue
+    match = re.search(r"\b(19|20)\d{2}\b", value)
+    return (date(int(match.group(0)), 1, 1), "year") if match else (None, None)
+
+
+def parse_date(value):
+    """Best-effort date from scraper metadata ("2024-05-01", "2024/05", "May 2024", "2024"); None if unknown."""
+    return _parse_date_precision(value)[0]
+
+
+def date_bounds(date_from=None, date_to=None):
+    """Inclusive (first, last) ordinals for a date filter; raises ValueError for an unreadable date.
+
+    A year or month upper bound means the end of that period: date_to="2021" keeps 2021-06-15.
+    """
+    lo, hi = -math.inf, math.inf
+    if date_from:
+        start, _ = _parse_date_precision(date_from)
+        if start is None:
+            raise ValueError(f"unrecognised date_from {date_from!r}; use e.g. 2021, 2021-06 or 2021-06-30")
+        lo = start.toordinal()
+    if date_to:
+        end, precision = _parse_date_precision(date_to)
+        if end is None:
+            raise ValueError(f"unrecognised date_to {date_to!r}; use e.g. 2021, 2021-06 or 2021-06-30")
+        if precision == "year":
+            end = date(end.year, 12, 31)
+        elif precision == "month":
+            end = date(end.year + end.month // 12, end.month % 12 + 1, 1) - timedelta(days=1)
+        hi = end.toordinal()
+    return lo, hi
+
+
+def _norm_field(value):
+    return " ".join(str(value).split()).lower() if value not in (None, "", "N/A") else None
+
+
+def _lookup(slots, scores, wanted):
+    """Scores of `wanted` slots from slot-sorted (slots, scores) arrays, 0 where absent."""
+    out = np.zeros(len(wanted), dtype=np.float32)
+    if len(slots):
+        pos = np.clip(np.searchsorted(slots, wanted), 0, len(slots) - 1)
+        found = slots[pos] == wanted
+        out[found] = scores[pos[found]]
+    return out
+
+
+class HybridRetriever:
+    """BM25 + vector retriever with metadata pre-filtering.
+
+    The lexical and metadata indexes are built from the KnowledgeIndex on first use and
+    patched incrementally as chunks are added or deleted.
+
+    Args:
+        index: a KnowledgeIndex
+        lexical_weight: share of the fused score taken from BM25 (the rest is cosine)
+    """
+
+    def __init__(self, index, lexical_weight=LEXICAL_WEIGHT):
+        self.index = index
+        self.lexical_weight = lexical_weight
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)  # term -> {slot: term frequency}
+        self._arrays = {}  # term -> (slots, tfs) numpy view of the postings, rebuilt when the term changes
+        self._doc_len = {}
+        self._len_array = np.zeros(0, dtype=np.float32)  # doc length indexed by slot
+        self._doc_terms = {}  # slot -> distinct terms, so deletes touch only their postings
+        self._total_len = 0
+        self._journal = defaultdict(set)
+        self._source = defaultdict(set)
+        self._dated = []  # sorted (ordinal, slot)
+        self._slot_meta = {}
+        self._seen_version = None
+        self._seen_layout = None
+
+    # -- index maintenance -------------------------------------------------
+
+    def _add_doc(self, slot, text, metadata):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self._postings[term][slot] = tf
+            self._arrays.pop(term, None)
+        length = sum(counts.values())
+        self._doc_len[slot] = length
+        if slot >= len(self._len_array):
+            grown = np.zeros(max(slot + 1, 2 * len(self._len_array)), dtype=np.float32)
+            grown[:len(self._len_array)] = self._len_array
+            self._len_array = grown
+        self._len_array[slot] = length
+        self._doc_terms[slot] = tuple(counts)
+        self._total_len += length
+
+        journal, source = _norm_field(metadata.get("journal")), _norm_field(metadata.get("source"))
+        published = parse_date(metadata.get("pub_date"))
+        if journal:
+            self._journal[journal].add(slot)
+        if source:
+            self._source[source].add(slot)
+        if published:
+            bisect.insort(self._dated, (published.toordinal(), slot))
+        self._slot_meta[slot] = (journal, source, published)
+
+    def _remove_doc(self, slot):
+        for term in self._doc_terms.pop(slot, ()):
+            postings = self._postings[term]
+            postings.pop(slot, None)
+            self._arrays.pop(term, None)
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(slot, 0)
+        journal, source, published = self._slot_meta.pop(slot, (None, None, None))
+        if journal:
+            self._journal[journal].discard(slot)
+        if source:
+            self._source[source].discard(slot)
+        if published:
+            i = bisect.bisect_left(self._dated, (published.toordinal(), slot))
+            if i < len(self._dated) and self._dated[i] == (published.toordinal(), slot):
+                del self._dated[i]
+
+    def refresh(self):
+        """Bring the lexical/metadata indexes in line with the KnowledgeIndex."""
+        with self._lock:
+            if self._seen_layout is not None and self._seen_layout != self.index.layout_version:
+                # Compaction renumbered slots; start over
+                self._reset()
+            if self._seen_version == self.index.version:
+                return
+            changed = self.index.metadata_changes(self._seen_version) if self._seen_version is not None else set()
+            if changed is None:
+                self._reset()
+                changed = set()
+            live = set(self.index.live_slots().tolist())
+            known = set(self._doc_len)
+            # Chunks whose metadata changed are re-read, so the journal/source/date indexes follow
+            stale = (known - live) | (changed & known)
+            for slot in stale:
+                self._remove_doc(slot)
+            added = sorted(live - (known - stale))
+            for start in range(0, len(added), 500):
+                batch = added[start:start + 500]
+                for slot, doc in zip(batch, self.index.get_documents(batch)):
+                    self._add_doc(slot, doc.page_content, doc.metadata)
+            self._seen_version = self.index.version
+            self._seen_layout = self.index.layout_version
+
+    # -- filtering and scoring ---------------------------------------------
+
+    def _allowed(self, date_from=None, date_to=None, journal=None, source=None):
+        """Slots passing the metadata filters, or None when no filter is set."""
+        allowed = None
+
+        def narrow(current, slots):
+            return set(slots) if current is None else current & slots
+
+        # Placeholder values such as "N/A" normalise to None and don't filter anything
+        journals = [j for j in map(_norm_field, [journal] if isinstance(journal, str) else journal or []) if j]
+        if journals:
+            allowed = narrow(allowed, set().union(*(self._journal.get(j, set()) for j in journals)))
+        sources = [s for s in map(_norm_field, [source] if isinstance(source, str) else source or []) if s]
+        if sources:
+            slots = set()
+            for s in sources:
+                # Exact source, or any source containing it (e.g. a domain such as biorxiv.org)
+                slots |= self._source.get(s) or set().union(*(v for k, v in self._source.items() if s in k))
+            allowed = narrow(allowed, slots)
+        if date_from or date_to:
+            lo, hi = date_bounds(date_from, date_to)
+            i = bisect.bisect_left(self._dated, (lo, -1))
+            j = bisect.bisect_right(self._dated, (hi, math.inf))
+            allowed = narrow(allowed, {slot for _, slot in self._dated[i:j]})
+        return allowed
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            order = np.argsort(slots)
+            arrays = self._arrays[term] = (slots[order], tfs[order])
+        return arrays
+
+    def bm25_scores(self, query, allowed=None, depth=CANDIDATE_DEPTH):
+        """BM25 over the postings of the query's terms.
+
+        Terms are visited rarest first. Once the rarer terms have produced `depth`
+        candidates, terms found in more than COMMON_TERM_RATIO of the corpus only add to
+        those candidates instead of pulling in their whole posting lists, so a query's
+        cost follows its rare terms rather than corpus size.
+
+        Args:
+            query: free text
+            allowed: sorted array of permitted slots, or None for all
+            depth: candidates wanted before common terms stop expanding the set
+
+        Returns:
+            slot-sorted (slots, scores) arrays
+        """
+        n = len(self._doc_len)
+        slots_acc, scores_acc = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if n == 0:
+            return slots_acc, scores_acc
+        avg_len = self._total_len / n
+        terms = [(arrays, term) for term in set(tokenize(query)) if (arrays := self._term_arrays(term)) is not None]
+        for (slots, tfs), _ in sorted(terms, key=lambda t: len(t[0][0])):
+            idf = math.log(1 + (n - len(slots) + 0.5) / (len(slots) + 0.5))
+            if len(slots_acc) >= depth and len(slots) > COMMON_TERM_RATIO * n:
+                # Common term: score the existing candidates only
+                tfs = _lookup(slots, tfs, slots_acc)
+                slots = slots_acc
+            elif allowed is not None:
+                keep = np.isin(slots, allowed, assume_unique=True)
+                slots, tfs = slots[keep], tfs[keep]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._len_array[slots] / avg_len)
+            contribution = idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+            if slots is slots_acc:
+                scores_acc = scores_acc + contribution
+            else:
+                merged = np.union1d(slots_acc, slots)
+                scores_acc = _lookup(slots_acc, scores_acc, merged) + _lookup(slots, contribution, merged)
+                slots_acc = merged
+        return slots_acc, scores_acc.astype(np.float32)
+
+    def search_with_scores(self, query, k=3, date_from=None, date_to=None, journal=None, source=None,
+                           query_vector=None):
+        """Top-k (Document, fused score) pairs for `query` within the metadata filters.
+
+        The best CANDIDATE_DEPTH chunks of each ranking are pooled, each score is scaled
+        to [0, 1] over the pool, and the pool is re-ranked by
+        `lexical_weight * bm25 + (1 - lexical_weight) * cosine`.
+        """
+        self.refresh()
+        with self._lock:
+            allowed = self._allowed(date_from, date_to, journal, source)
+            if allowed is not None:
+                if not allowed:
+                    return []
+                allowed = np.fromiter(sorted(allowed), dtype=np.int64, count=len(allowed))
+            depth = max(CANDIDATE_DEPTH, 5 * k)
+            lexical_slots, lexical_scores = self.bm25_scores(query, allowed, depth)
+
+        vector = self.index.embed_query(query) if query_vector is None else query_vector
+        vector_slots, _ = self.index.nearest(vector, depth, allowed)
+        if len(vector_slots) == 0:
+            return []
+
+        if len(lexical_scores) > depth:
+            lexical_top = lexical_slots[np.argpartition(-lexical_scores, depth - 1)[:depth]]
+        else:
+            lexical_top = lexical_slots
+        pool = np.union1d(lexical_top, vector_slots)
+        lexical = _lookup(lexical_slots, lexical_scores, pool)
+        # Exact cosine for the whole pool, so lexical candidates the IVF probe missed aren't scored 0
+        _, cosine = self.index.vector_scores(vector, pool)
+
+        def scaled(x):
+            span = float(x.max() - x.min()) if len(x) else 0.0
+            return (x - x.min()) / span if span > 0 else np.zeros_like(x)
+
+        fused = self.lexical_weight * scaled(lexical) + (1 - self.lexical_weight) * scaled(cosine)
+        order = np.argsort(-fused, kind="stable")[:k]
+        docs = self.index.get_documents(pool[order])
+        return [(doc, float(score)) for doc, score in zip(docs, fused[order])]
+
+    def search(self, query, k=3, **filters):
+        return [doc for doc, _ in self.search_with_scores(query, k, **filters)]
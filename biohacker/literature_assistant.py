@@ -2,8 +2,10 @@
 
 from strands import Agent, tool
 from strands_tools import file_read, file_write, editor
-from strands_tools.tavily import tavily_search, tavily_extract, tavily_crawl, tavily_map
+from tavily_cache import tavily_search, tavily_extract, tavily_crawl, tavily_map
 import json
+from agent_pool import agent_pool
+from bedrock_models import build_model
 
 LITERATURE_ASSISTANT_SYSTEM_PROMPT = """
 You are a bioinformatician that is an expert in bioinformatic tools involved in research. Your capabilities include:
@@ -29,6 +31,14 @@ Focus on being clear, encouraging, and educational in all interactions. Always e
 """
 
 
+def build_literature_agent():
+    return Agent(
+        model=build_model("literature_assistant"),
+        system_prompt=LITERATURE_ASSISTANT_SYSTEM_PROMPT,
+        tools=[editor, file_read, file_write, tavily_search, tavily_extract, tavily_crawl, tavily_map],
+    )
+
+
 @tool
 def literature_assistant(query: str) -> str:
     """
@@ -47,11 +57,8 @@ def literature_assistant(query: str) -> str:
     try:
         print("Searching literature database...")
 
-        literature_agent = Agent(
-            system_prompt=LITERATURE_ASSISTANT_SYSTEM_PROMPT,
-            tools=[editor, file_read, file_write, tavily_search, tavily_extract, tavily_crawl, tavily_map],
-        )
-        agent_response = literature_agent(formatted_query)
+        with agent_pool.lease("literature_assistant", build_literature_agent) as literature_agent:
+            agent_response = literature_agent(formatted_query)
         text_response = str(agent_response)
 
         if len(text_response) > 0:
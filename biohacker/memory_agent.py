@@ -1,30 +1,40 @@
-# importing 
-import boto3
+"""
+Memory subsystem: scrape scholarly articles into a persistent knowledge index and
+answer questions from it.
+
+Importing this module is cheap. The Bedrock client, the knowledge index and the
+knowledge-base agent are all created on first use, and the scrape/index/answer flow
+only runs through the explicit entry points:
+
+    build(topic)      scrape articles about `topic` and append the new chunks to the index
+    load()            open the persisted index (lazily memory-mapped)
+    query(question)   retrieve relevant chunks (hybrid BM25 + vector, see hybrid_retriever)
+                      and answer with a Bedrock model
+
+`similarity_search` and `get_kb_agent()` can be handed to the orchestrator directly.
+"""
+
 import os
 import json
 import logging
-import numpy as np
+import threading
 
-import os
-os.environ["TAVILY_API_KEY"] = "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"
+from strands import Agent, tool
 
+import bedrock_clients
+import semantic_cache
+import telemetry
+from bedrock_models import build_model
 
 # Create a logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-
-from strands import Agent, tool
-from strands.models import BedrockModel
-
-from botocore.exceptions import ClientError
-
-# second cell
-region = os.environ.get("AWS_REGION")
-bedrock_client = boto3.client(
-    service_name='bedrock-runtime',
-    region_name="us-east-1"
-)
+# Lazily created shared state (see get_bedrock_client / load / get_kb_agent)
+_kb_index = None
+_kb_retriever = None
+_kb_deduplicators = {}
+_kb_agent = None
+_init_lock = threading.Lock()
 
 #String constants: Label each model you want to use
 #Need to think if we want to use other models
@@ -35,7 +45,7 @@ mistral='mistral'
 titan='titan'
 cohere = 'cohere'
 
-# Map model nicknames to the actual Bedrock model ID's 
+# Map model nicknames to the actual Bedrock model ID's
 models_dict = {
     claude3 : 'anthropic.claude-3-haiku-20240307-v1:0',
     llama2: 'meta.llama2-13b-chat-v1',
@@ -47,19 +57,19 @@ models_dict = {
 ##Inference parameters
 
 # max length of the response of the agent
-max_tokens_val = 200 
+max_tokens_val = 200
 
 #Temp sets randomness in generation (lower = more deterministic, high = more creative and random)
 temperature_val = 0.1
 
-# Setting special parameters for each model 
+# Setting special parameters for each model
 # Might have to experiment with this
 # Model looks at all possible next tokens(words/pieces of words)
 # Keeps only top k most likely tokens that model might pick from the model vocabulary while generating its response
 dict_add_params = {
-    llama3: {}, #"max_gen_len":max_tokens_val, "temperature":temperature_val} , 
+    llama3: {}, #"max_gen_len":max_tokens_val, "temperature":temperature_val} ,
     claude3: {"top_k": 200, },# "temperature": temperature_val, "max_tokens": max_tokens_val},
-    mistral: {}, #{"max_tokens":max_tokens_val, "temperature": temperature_val} , 
+    mistral: {}, #{"max_tokens":max_tokens_val, "temperature": temperature_val} ,
     titan:  {"topK": 200, },# "maxTokenCount": max_tokens_val},
 }
 
@@ -72,6 +82,38 @@ inference_config={
     "topP": 0.9
 }
 
+# Chunking used when ingesting documents: LLM's cant handle super long text directly
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 400
+
+system_text = """You are a memory-enabled research assistant for biologists.
+You have access to prior context and a memory store containing information from GitHub, CRAN, bioRxiv, PubMed, software manuals, and publications.
+
+Your tasks are:
+1. Remember and recall important facts from previous conversations or memory.
+2. When answering, combine the user’s latest question with relevant stored knowledge.
+3. If memory is too long, summarize key points instead of repeating everything verbatim.
+4. Guide the user on practical next steps for biological workflows (BLAST, GROMACS, AutoDock Vina, ChimeraX, etc.), including data transformation or preparation when necessary.
+5. If no relevant memory is found, say so honestly and ask clarifying questions.
+6. Maintain consistency: once a fact has been given and stored, do not contradict it later unless the user provides an update.
+7. Present responses clearly, in steps or options, so that a biologist can decide the best next action.
+
+Always act as a reliable memory agent that helps researchers make sense of their data and choose the right tools.
+"""
+
+
+def get_bedrock_client():
+    """Shared bedrock-runtime client (see bedrock_clients.py)."""
+    return bedrock_clients.get_client()
+
+
+#Helper function: get extra parameters
+def get_additional_model_fields(modelId):
+    # dict_add_params is keyed by nickname, so map the model ID back first
+    nickname = next((name for name, model in models_dict.items() if model == modelId), modelId)
+    return dict_add_params.get(nickname)
+
+
 #Sending a request; Wraps user input into Bedrock's message format
 #Adds system prompt except for Mistral and Titan which dosent support system prompts
 def generate_conversation(bedrock_client,model_id,system_text,input_text):
@@ -101,47 +143,18 @@ def generate_conversation(bedrock_client,model_id,system_text,input_text):
     if model_id in [models_dict.get(mistral), models_dict.get(titan)]:
         system_prompts = [] # not supported
 
-# Inference parameters to use.
-
-
-#Base inference parameters to use.
-#inference_config 
-
-
-    # Send the message.
-    response = bedrock_client.converse(
+    request = dict(
         modelId=model_id,
         messages=messages,
         system=system_prompts,
         inferenceConfig=inference_config,
-        additionalModelRequestFields=get_additional_model_fields(model_id)
     )
+    additional_fields = get_additional_model_fields(model_id)
+    if additional_fields:
+        request["additionalModelRequestFields"] = additional_fields
 
-    return response
-
-#Example Usage
-system_text = """You are a memory-enabled research assistant for biologists.
-You have access to prior context and a memory store containing information from GitHub, CRAN, bioRxiv, PubMed, software manuals, and publications.
-
-Your tasks are:
-1. Remember and recall important facts from previous conversations or memory.
-2. When answering, combine the user’s latest question with relevant stored knowledge.
-3. If memory is too long, summarize key points instead of repeating everything verbatim.
-4. Guide the user on practical next steps for biological workflows (BLAST, GROMACS, AutoDock Vina, ChimeraX, etc.), including data transformation or preparation when necessary.
-5. If no relevant memory is found, say so honestly and ask clarifying questions.
-6. Maintain consistency: once a fact has been given and stored, do not contradict it later unless the user provides an update.
-7. Present responses clearly, in steps or options, so that a biologist can decide the best next action.
-
-Always act as a reliable memory agent that helps researchers make sense of their data and choose the right tools.
-"""
-
-input_text = "How should I prepare my FASTA file for BLAST?"
-
-#Helper function: get extra parameters
-def get_additional_model_fields(modelId):
-
-    return dict_add_params.get(modelId)
-    #{"top_k": top_k, "max_tokens": max_tokens}}
+    # Send the message.
+    return bedrock_client.converse(**request)
 
 #Extract the output
 def get_converse_output(response_obj):
@@ -151,53 +164,11 @@ def get_converse_output(response_obj):
 
     for content in output_message['content']:
         ret_messages.append(content['text'])
-        
-    return ret_messages, role_out
-
-response = generate_conversation(bedrock_client, models_dict[claude3], system_text, input_text)
-
-messages, role = get_converse_output(response)
-print(messages)
-
-#Semantic Similarity with Amazon Titan Embeddings
-#Calls Bedrock's invoke_model() API
-#Sends the text in JSON as {"inputText:"}
-#Gets back an embedding (a list of numbers)
-#Returns embedding as a NumPy array
-def embed_text_input(bedrock_client, prompt_data, modelId="amazon.titan-embed-text-v1"):
-    accept = "application/json"
-    contentType = "application/json"
-    body = json.dumps({"inputText": prompt_data})
-    response = bedrock_client.invoke_model(
-        body=body, modelId=modelId, accept=accept, contentType=contentType
-    )
-    response_body = json.loads(response.get("body").read())
-    embedding = response_body.get("embedding")
-    return np.array(embedding)
-
-#Langchain components we need 
-from langchain.docstore.document import Document
-from langchain.document_loaders import TextLoader
-from langchain.embeddings import BedrockEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-
-from langchain.document_loaders import PyPDFLoader
-from langchain.tools.retriever import create_retriever_tool
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import CharacterTextSplitter
 
+    return ret_messages, role_out
 
-#Titan embeddings via Langchain
-br_embeddings = BedrockEmbeddings(model_id="amazon.titan-embed-text-v2:0", client=bedrock_client)
 
 #Creating the web scraper
-from langchain.docstore.document import Document
-from strands import Agent, tool
-from strands_tools.tavily import tavily_search, tavily_extract, tavily_crawl, tavily_map
-import json
-
 WEB_SCRAPER_SYSTEM_PROMPT = """
 You are a web scraper that scrapes biological scholarly articles from the web.
 1. Use your research tools to find the most recent and relevant articles based on the keywords in the user input.
@@ -208,10 +179,14 @@ You are a web scraper that scrapes biological scholarly articles from the web.
 
 @tool
 def web_scraper_assistant(user_input: str):
+    from langchain_core.documents import Document
+    from tavily_cache import tavily_search, tavily_extract, tavily_crawl, tavily_map
+
     try:
         print("Searching scholarly articles (this may take ~5mins...☕)")
-        
+
         researcher_agent = Agent(
+            model=build_model("web_scraper"),
             system_prompt=WEB_SCRAPER_SYSTEM_PROMPT,
             callback_handler=None,
             tools=[tavily_search, tavily_extract, tavily_crawl, tavily_map],
@@ -267,191 +242,134 @@ def web_scraper_assistant(user_input: str):
             )
         ]
 
-# Run the scraper to get structured Documents
-docs = web_scraper_assistant("NF1 pathogenicity recent research")
-
-# Safety check
-print(f"Number of docs retrieved: {len(docs)}")
-print(docs[0].metadata)
-
-#Semantic Similarity with Amazon Titan Embeddings
-def embed_text_input(bedrock_client, prompt_data, modelId="amazon.titan-embed-text-v2:0"):
-    accept = "application/json"
-    contentType = "application/json"
-    body = json.dumps({"inputText": prompt_data})
-    response = bedrock_client.invoke_model(
-        body=body, modelId=modelId, accept=accept, contentType=contentType
-    )
-    response_body = json.loads(response.get("body").read())
-    embedding = response_body.get("embedding")
-    return np.array(embedding)
-
-#JUST TESTING
-user_input = 'Things to do that are productive'
-document_1 = 'swimming, site seeing, sky diving'
-document_2 = 'cleaning, note taking, studying'
-
-user_input_vector = embed_text_input(bedrock_client, user_input)
-document_1_vector = embed_text_input(bedrock_client, document_1)
-document_2_vector = embed_text_input(bedrock_client, document_2)
-
-doc_1_match_score = np.dot(user_input_vector, document_1_vector)
-doc_2_match_score = np.dot(user_input_vector, document_2_vector)
-
-print(f'"{user_input}" matches "{document_1}" with a score of {doc_1_match_score:.1f}')
-print(f'"{user_input}" matches "{document_2}" with a score of {doc_2_match_score:.1f}')
-
-#Simplifying search with Langchain and FAISS
-from langchain.docstore.document import Document
-from langchain.document_loaders import TextLoader
-from langchain.embeddings import BedrockEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-
-from langchain.document_loaders import PyPDFLoader
-from langchain.tools.retriever import create_retriever_tool
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import CharacterTextSplitter
-
-br_embeddings = BedrockEmbeddings(model_id="amazon.titan-embed-text-v2:0", client=bedrock_client)
-
-# Embed PubMed docs into FAISS index
-vectorstore = FAISS.from_documents(docs, br_embeddings)
-
-# Create retriever for semantic search
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
-query = "How can NF1 missense variants be identified?"
-results = retriever.get_relevant_documents(query)
-
-for i, r in enumerate(results, 1):
-    print(f"\nResult {i}")
-    print("Title:", r.metadata.get("title"))
-    print("Authors:", r.metadata.get("authors"))
-    print("Journal:", r.metadata.get("journal"))
-    print("Date:", r.metadata.get("pub_date"))
-    print("Source:", r.metadata.get("source"))
-    print("Abstract snippet:", r.page_content[:300], "...")
 
-query = "Explain how NF1 pathogenicity is predicted"
-retrieved_docs = retriever.get_relevant_documents(query)
+def load(path=None):
+    """Open the persisted knowledge index. Vectors are memory-mapped on the first search."""
+    global _kb_index
+    with _init_lock:
+        if _kb_index is None or (path is not None and _kb_index.path != path):
+            from embeddings import embed_texts
+            from vector_index import KnowledgeIndex
 
-# Concatenate retrieved content into system prompt
-context = "\n\n".join([f"Title: {d.metadata['title']}\nAbstract: {d.page_content}" for d in retrieved_docs])
+            _kb_index = KnowledgeIndex(path, embed_fn=lambda texts: embed_texts(get_bedrock_client(), texts))
+        return _kb_index
 
-system_text_with_context = system_text + f"\n\nRelevant PubMed articles:\n{context}"
 
-response = generate_conversation(
-    bedrock_client,
-    models_dict[claude3],
-    system_text_with_context,
-    query
-)
+def get_deduplicator(index=None):
+    """Duplicate detector whose state lives next to the knowledge index."""
+    from dedup import ChunkDeduplicator
 
-messages, role = get_converse_output(response)
-print(messages)
+    path = os.path.join((load() if index is None else index).path, "dedup.sqlite3")
+    with _init_lock:
+        if path not in _kb_deduplicators:
+            _kb_deduplicators[path] = ChunkDeduplicator(path)
+        return _kb_deduplicators[path]
 
 
-#Split into chunkc: LLM's cant handle super long text directly
-split_docs = CharacterTextSplitter(
-    chunk_size=2000,
-    chunk_overlap=400,
-    separator="\n"
-).split_documents(docs)
+def split_documents(docs):
+    #Split into chunks: LLM's cant handle super long text directly
+    from langchain_text_splitters import CharacterTextSplitter
 
-print(f"Number of documents after split and chunking={len(docs)}")
+    return CharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separator="\n"
+    ).split_documents(docs)
 
 
-# Comvert to embeddings and store in FAISS
-vs = FAISS.from_documents(split_docs, br_embeddings)
-
-#Check index size
-print(f"vectorstore_faiss_aws: number of elements in the index={vs.index.ntotal}::")
-
-docs[0]
-
-#Search FAISS vector store
-search_results = vs.similarity_search(
-    "Explain how NF1 pathogenicity is predicted", k=3
-)
-print(search_results[0])
-
-#Combining search results with text generation
-from langchain_core.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from langchain.prompts.chat import ChatPromptTemplate
-from langchain_community.chat_models import BedrockChat
-from langchain_core.messages import HumanMessage
-from langchain.chains import ConversationChain
-from langchain_core.output_parsers import StrOutputParser
-
-
-SYSTEM_MESSAGE = """
-System: Here is some important context which can help inform the questions the Human asks.
-Make sure to not make anything up to answer the question if it is not provided in the context.
-
-Context: {context}
-"""
-HUMAN_MESSAGE = "{text}"
-
-messages = [
-    ("system", SYSTEM_MESSAGE),
-    ("human", HUMAN_MESSAGE)
-]
-
-prompt_data = ChatPromptTemplate.from_messages(messages)
-
-human_input =  "Explain how NF1 pathogenicity is predicted"
-search_results = vs.similarity_search(human_input, k=3)
-context_string = '\n\n'.join([f'Document {ind+1}: ' + i.page_content for ind, i in enumerate(search_results)])
-len(context_string)
-
-human_query =  "Explain how NF1 pathogenicity is predicted"
-
-from langchain_core.prompts import PromptTemplate
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.memory import ConversationBufferMemory 
-from langchain_aws import ChatBedrock
+def build(topic, index=None):
+    """Scrape articles about `topic` and append their new chunks to the knowledge index.
 
+    Args:
+        topic: search keywords for the web scraper
+        index: KnowledgeIndex to write to, defaults to load()
 
-# turn verbose to true to see the full logs and documents
-modelId = models_dict.get(claude3)
-cl_llm = ChatBedrock(
-    model_id=modelId,
-    client=bedrock_client,
-    model_kwargs={"temperature": 0.1, 'max_tokens': 100},
-)
+    Returns:
+        dict summarising what was ingested
+    """
+    index = load() if index is None else index
+    # Run the scraper to get structured Documents
+    docs = web_scraper_assistant(topic)
+    split_docs = split_documents(docs)
+    # Mirrored abstracts and repeated boilerplate are dropped before they cost an embedding
+    unique_docs, dedup_report = get_deduplicator(index).deduplicate(split_docs, index)
+    added = index.add_documents(unique_docs)
+    report = {"documents": len(docs), **dedup_report, "added": len(added), "index_size": len(index)}
+    if added:
+        report["answers_invalidated"] = semantic_cache.knowledge_changed()
+    logger.info("memory build for %r: %s", topic, report)
+    return report
+
+
+def get_retriever():
+    """Hybrid BM25 + vector retriever over load(), rebuilt if the index is reopened."""
+    global _kb_retriever
+    index = load()
+    with _init_lock:
+        if _kb_retriever is None or _kb_retriever.index is not index:
+            from hybrid_retriever import HybridRetriever
+
+            _kb_retriever = HybridRetriever(index)
+        return _kb_retriever
+
+
+def retrieve(question, k=3, date_from=None, date_to=None, journal=None, source=None):
+    """Top-k chunks from the knowledge index for `question`.
 
-br_embeddings = BedrockEmbeddings(model_id="amazon.titan-embed-text-v2:0", client=bedrock_client)
+    Args:
+        question: free-text query; gene symbols and variant IDs are matched exactly as well
+        k: number of chunks to return
+        date_from, date_to: inclusive pub_date bounds ("2021", "2021-06", "2021-06-30")
+        journal: journal name, or a list of names
+        source: URL/domain (substring match), or a list of them
+    """
+    with telemetry.span("kb.retrieve", k=k, journal=journal, source=source, date_from=date_from, date_to=date_to):
+        return get_retriever().search(question, k=k, date_from=date_from, date_to=date_to,
+                                      journal=journal, source=source)
 
-chain = prompt_data | cl_llm | StrOutputParser()
-chain_input = {
-        "context": context_string, #"This is a sample context doc", #context_doc,
-        "text": human_query,
-    }
 
+def query(question, k=3, model_id=None):
+    """Answer `question` with a Bedrock model, grounded in the top-k retrieved chunks."""
+    retrieved_docs = retrieve(question, k)
 
-for chunk in chain.stream(chain_input):
-    print(chunk, end="", flush=True)
+    # Concatenate retrieved content into system prompt
+    context = "\n\n".join([f"Title: {d.metadata.get('title', 'Untitled')}\nAbstract: {d.page_content}" for d in retrieved_docs])
+    system_text_with_context = system_text + f"\n\nRelevant PubMed articles:\n{context}"
 
-print(chain.invoke(chain_input))
+    response = generate_conversation(
+        get_bedrock_client(),
+        model_id or models_dict[claude3],
+        system_text_with_context,
+        question
+    )
+    messages, role = get_converse_output(response)
+    return "\n".join(messages)
 
 
 @tool
-def similarity_search(query: str) -> str:
+def similarity_search(query: str, date_from: str = "", date_to: str = "", journal: str = "", source: str = "") -> str:
     """
-    Search the knowledge base based on the provided query. 
+    Search the knowledge base based on the provided query.
 
     Args:
         query (str): the query to retrieve relevant knowledge.
+        date_from (str): optional earliest publication date, e.g. "2020" or "2020-06-01".
+        date_to (str): optional latest publication date.
+        journal (str): optional journal name to restrict results to.
+        source (str): optional source URL or domain to restrict results to.
 
     Returns:
         str: The search results
 
     """
-    search_results = vs.similarity_search(query, k=3)
+    from hybrid_retriever import date_bounds
+
+    try:
+        date_bounds(date_from or None, date_to or None)
+    except ValueError as e:
+        return f"Error: {e}"
+    search_results = retrieve(query, k=3, date_from=date_from or None, date_to=date_to or None,
+                              journal=journal or None, source=source or None)
     context_string = '\n\n'.join([f'Document {ind+1}: ' + i.page_content for ind, i in enumerate(search_results)])
     return(context_string)
 
@@ -459,10 +377,10 @@ def similarity_search(query: str) -> str:
 ANSWER_SYSTEM_PROMPT = """
 You are a helpful knowledge assistant that provides clear, concise answers based on information retrieved from a knowledge base.
 
-The information from the knowledge base contains document IDs and content preview. Focus on the actual content and 
+The information from the knowledge base contains document IDs and content preview. Focus on the actual content and
 ignore the metadata.
 
-For any question, use only the content from knowledge base to answer. Use the knowledge base tool only once. 
+For any question, use only the content from knowledge base to answer. Use the knowledge base tool only once.
 
 Your responses should:
 1. Be direct and to the point
@@ -490,8 +408,37 @@ Example response for missing information:
 "I don't have any information about your birthday stored."
 """
 
-kb_agent = Agent(system_prompt=ANSWER_SYSTEM_PROMPT, model = "us.anthropic.claude-3-7-sonnet-20250219-v1:0", tools=[similarity_search])
+KB_AGENT_MODEL = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+
+def get_kb_agent():
+    """Knowledge-base answering agent, created on first use."""
+    global _kb_agent
+    with _init_lock:
+        if _kb_agent is None:
+            _kb_agent = Agent(system_prompt=ANSWER_SYSTEM_PROMPT, model=build_model("kb_agent", KB_AGENT_MODEL),
+                              tools=[similarity_search])
+        return _kb_agent
+
+
+# Example usage
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    # Needs TAVILY_API_KEY in the environment for the scraper
+    print(build("NF1 pathogenicity recent research"))
+
+    for i, r in enumerate(retrieve("How can NF1 missense variants be identified?"), 1):
+        print(f"\nResult {i}")
+        print("Title:", r.metadata.get("title"))
+        print("Authors:", r.metadata.get("authors"))
+        print("Journal:", r.metadata.get("journal"))
+        print("Date:", r.metadata.get("pub_date"))
+        print("Source:", r.metadata.get("source"))
+        print("Abstract snippet:", r.page_content[:300], "...")
 
-response = kb_agent("Could you tell me the most recent research talked about in PubMed")
+    print(query("Explain how NF1 pathogenicity is predicted"))
 
-response = kb_agent("Could you give me the metadata for the most recent research you found")
\ No newline at end of file
+    kb_agent = get_kb_agent()
+    response = kb_agent("Could you tell me the most recent research talked about in PubMed")
+    response = kb_agent("Could you give me the metadata for the most recent research you found")
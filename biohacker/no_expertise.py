@@ -1,5 +1,7 @@
 from strands import Agent, tool
 import json
+from agent_pool import agent_pool
+from bedrock_models import build_model
 
 GENERAL_ASSISTANT_SYSTEM_PROMPT = """
 You are GeneralAssist, a concise general knowledge assistant for topics outside specialized domains. Your key characteristics are:
@@ -29,6 +31,14 @@ Always maintain accuracy while prioritizing conciseness and clarity in every res
 """
 
 
+def build_general_agent():
+    return Agent(
+        model=build_model("general_assistant"),
+        system_prompt=GENERAL_ASSISTANT_SYSTEM_PROMPT,
+        tools=[],  # No specialized tools needed for general knowledge
+    )
+
+
 @tool
 def general_assistant(query: str) -> str:
     """
@@ -46,11 +56,8 @@ def general_assistant(query: str) -> str:
     
     try:
         print("Routed to General Assistant")
-        general_agent = Agent(
-            system_prompt=GENERAL_ASSISTANT_SYSTEM_PROMPT,
-            tools=[],  # No specialized tools needed for general knowledge
-        )
-        agent_response = general_agent(formatted_query)
+        with agent_pool.lease("general_assistant", build_general_agent) as general_agent:
+            agent_response = general_agent(formatted_query)
         text_response = str(agent_response)
 
         if len(text_response) > 0:
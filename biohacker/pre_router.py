@@ -0,0 +1,247 @@
+"""
+Local intent classifier that sends obvious queries straight to a specialist.
+
+Every orchestrator turn spends one LLM call just applying the Decision Protocol in
+BIOHACKER_PROMPT, and a second one relaying the specialist's answer back. For many
+queries the route is not in doubt: "GROMACS tutorial" is always the software agent,
+"clean the missing values in my csv" the data cleaning agent. `classify` scores the
+query against keyword rules (and, optionally, nearest-centroid embeddings of example
+queries); when one route wins clearly the specialist is called directly and the
+orchestrator LLM is skipped. Anything ambiguous, multi-intent or referring back to
+earlier turns falls through to the LLM router unchanged.
+
+Enable with BIOHACKER_PRE_ROUTER:
+
+    off         (default) every query goes through the orchestrator LLM
+    rules       keyword rules only; no model or embedding calls
+    embedding   rules first, then cosine similarity to per-route centroids of
+                ROUTE_EXAMPLES (one Titan embedding per query, cached on disk)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+PRE_ROUTER_MODE = os.environ.get("BIOHACKER_PRE_ROUTER", "off").lower()
+# Rule score the winning route needs, and its lead over the runner-up
+RULE_MIN_SCORE = float(os.environ.get("BIOHACKER_PRE_ROUTER_MIN_SCORE", "2"))
+RULE_MIN_MARGIN = float(os.environ.get("BIOHACKER_PRE_ROUTER_MIN_MARGIN", "2"))
+# Cosine similarity to the nearest centroid, and its lead over the second nearest
+CENTROID_MIN_SIMILARITY = float(os.environ.get("BIOHACKER_PRE_ROUTER_MIN_SIMILARITY", "0.55"))
+CENTROID_MIN_MARGIN = float(os.environ.get("BIOHACKER_PRE_ROUTER_CENTROID_MARGIN", "0.08"))
+
+# (pattern, weight) per route. Weight 3 is a decisive signal on its own (a named program,
+# "missing values"); weight 1 only counts together with something else.
+RULES = {
+    "software_assistant": [
+        (r"\bgromacs\b", 3), (r"\bclustal ?[wo]?\b", 3), (r"\bvolcano plots?\b", 3), (r"\bsamtools\b", 3),
+        (r"\bbcftools\b", 3), (r"\bbwa\b", 3), (r"\bbowtie2?\b", 3), (r"\bblast[npx]?\b", 3),
+        (r"\bbioconductor\b", 3), (r"\bdeseq2\b", 3), (r"\bsnakemake\b", 3), (r"\bnextflow\b", 3),
+        (r"\bpymol\b", 3), (r"\bbiopython\b", 3), (r"\bconda\b", 2), (r"\bdocker\b", 2),
+        (r"\btutorial\b", 2), (r"\binstall(?:ing|ation)?\b", 2), (r"\bset ?up\b", 1),
+        (r"\b(?:python|r|bash|shell) (?:script|code|package)\b", 2), (r"\bscript\b", 1), (r"\bcode\b", 1),
+        (r"\berror\b", 1), (r"\btraceback\b", 2), (r"\bcompile\b", 1), (r"\bcommand line\b", 1),
+    ],
+    "data_cleaning_assistant": [
+        (r"\bmissing values?\b", 3), (r"\bnan\b", 2), (r"\bclean(?:ing|up)?\b", 2), (r"\.(?:csv|tsv|xlsx?)\b", 3),
+        (r"\b(?:csv|tsv|excel|spreadsheet)\b", 2), (r"\bnormali[sz](?:e|ation)\b", 2),
+        (r"\bduplicate (?:rows|entries|records)\b", 3), (r"\boutliers?\b", 2), (r"\bimput(?:e|ation)\b", 3),
+        (r"\b(?:my|the|this) (?:data ?set|table|file|data)\b", 1), (r"\bcolumns?\b", 1), (r"\brows?\b", 1),
+        (r"\bpreprocess(?:ing)?\b", 2), (r"\bbatch effects?\b", 2),
+    ],
+    "literature_assistant": [
+        (r"\bliterature\b", 3), (r"\b(?:papers?|publications?|studies)\b", 2), (r"\breview\b", 2),
+        (r"\b(?:best|which|what) (?:tools?|programs?|software|methods?)\b", 3),
+        (r"\bcompare (?:between )?(?:different )?\w+", 1), (r"\bstate of the art\b", 2),
+        (r"\bsummar(?:y|ise|ize) (?:of )?my research\b", 3), (r"\bcitations?\b", 2), (r"\bpubmed\b", 3),
+        (r"\bevidence\b", 1), (r"\brecent (?:advances|work|findings)\b", 2),
+    ],
+    "general_assistant": [
+        (r"^(?:what|who|why|how) (?:is|are|was|were|does|do) (?:a |an |the )?\w+(?: \w+)?\??$", 2),
+        (r"\bdefin(?:e|ition)\b", 2), (r"\bexplain\b", 1), (r"\bfact[- ]check\b", 3),
+    ],
+}
+
+# Short example queries per route, used for the optional embedding centroids
+ROUTE_EXAMPLES = {
+    "software_assistant": [
+        "GROMACS tutorial", "How do I install ClustalW?", "Volcano plot tutorial in R",
+        "Run a molecular dynamics simulation of a protein in water", "Write a python script to parse a VCF file",
+        "My samtools command fails with an error", "Set up a conda environment for RNA-seq analysis",
+    ],
+    "data_cleaning_assistant": [
+        "Clean my expression data", "Handle missing values in this csv", "Normalize the counts table",
+        "Remove duplicate rows from my dataset", "Impute the missing measurements", "Fix inconsistent column names in my file",
+    ],
+    "literature_assistant": [
+        "Best tools for simulating molecular dynamics?", "How can I compare between different homologs of a protein?",
+        "What visualisation is best used for showing gene expression data?", "Review the literature on CRISPR off-target effects",
+        "Which aligner should I use for long reads?", "Summarise my research on NF1 variants",
+    ],
+    "general_assistant": [
+        "What does a ribosome do?", "What is DNA?", "Who discovered penicillin?", "Explain how vaccines work",
+        "What is the difference between a gene and a protein?", "Is it true that humans share DNA with bananas?",
+    ],
+}
+
+_COMPILED = {route: [(re.compile(p, re.IGNORECASE), w) for p, w in rules] for route, rules in RULES.items()}
+# Follow-ups like "now do it for the second file" depend on the orchestrator's history
+_REFERS_BACK = re.compile(r"\b(?:it|that|this one|those|them|again|above|previous|same|instead)\b", re.IGNORECASE)
+# Requests the orchestrator must split across agents
+_MULTI_STEP = re.compile(r"\b(?:and then|after that|as well as|followed by)\b", re.IGNORECASE)
+
+
+def rule_scores(query):
+    """Summed rule weights per route."""
+    return {route: float(sum(w for pattern, w in rules if pattern.search(query))) for route, rules in _COMPILED.items()}
+
+
+def _decide(scores, min_score, min_margin):
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (best, top), (_, second) = ranked[0], ranked[1]
+    confident = top >= min_score and top - second >= min_margin
+    return best if confident else None, top, top - second
+
+
+def _default_embed_fn(texts):
+    from embeddings import embed_texts
+    from memory_agent import get_bedrock_client
+
+    return embed_texts(get_bedrock_client(), texts)
+
+
+class PreRouter:
+    """Rule (and optional centroid) classifier over the orchestrator's specialist tools.
+
+    Args:
+        mode: "rules" or "embedding"
+        embed_fn: callable mapping a list of texts to a (n, dim) matrix, for "embedding"
+        examples: route -> example queries the centroids are built from
+    """
+
+    def __init__(self, mode="rules", embed_fn=None, examples=None):
+        self.mode = mode
+        self.embed_fn = embed_fn or _default_embed_fn
+        self.examples = examples or ROUTE_EXAMPLES
+        self._centroids = None
+        self._lock = threading.Lock()
+        self._stats = {"decisions": 0, "direct": 0, "fallback": 0, "by_route": {}, "by_method": {},
+                       "classify_seconds": 0.0}
+
+    def _centroid_matrix(self):
+        with self._lock:
+            if self._centroids is None:
+                routes = list(self.examples)
+                texts = [t for r in routes for t in self.examples[r]]
+                vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+                rows, start = [], 0
+                for route in routes:
+                    n = len(self.examples[route])
+                    centroid = vectors[start:start + n].mean(axis=0)
+                    rows.append(centroid / (np.linalg.norm(centroid) + 1e-12))
+                    start += n
+                self._centroids = (routes, np.stack(rows))
+            return self._centroids
+
+    def centroid_scores(self, query):
+        """Cosine similarity of the query to each route centroid."""
+        routes, matrix = self._centroid_matrix()
+        vector = np.asarray(self.embed_fn([query]), dtype=np.float32)[0]
+        vector /= np.linalg.norm(vector) + 1e-12
+        return dict(zip(routes, (matrix @ vector).tolist()))
+
+    def classify(self, query, has_history=False):
+        """Pick a specialist for `query`, or None when the LLM router should decide.
+
+        Args:
+            query: the user's message
+            has_history: whether the conversation already has turns; follow-ups that
+                refer back to them are always left to the LLM
+
+        Returns:
+            dict with "route" (tool name or None), "method", "confidence" and "margin"
+        """
+        start = time.perf_counter()
+        decision = {"route": None, "method": "rules", "confidence": 0.0, "margin": 0.0}
+        with telemetry.span("pre_router.classify", **{"pre_router.mode": self.mode}):
+            if (has_history and _REFERS_BACK.search(query)) or _MULTI_STEP.search(query):
+                decision["method"] = "context"
+            else:
+                route, top, margin = _decide(rule_scores(query), RULE_MIN_SCORE, RULE_MIN_MARGIN)
+                decision.update(route=route, confidence=top, margin=margin)
+                if route is None and self.mode == "embedding":
+                    try:
+                        route, top, margin = _decide(self.centroid_scores(query), CENTROID_MIN_SIMILARITY,
+                                                     CENTROID_MIN_MARGIN)
+                        decision.update(route=route, method="embedding", confidence=top, margin=margin)
+                    except Exception as e:
+                        # The pre-router is an optimisation; the LLM can always route
+                        logger.warning("pre-router embedding failed: %s", e)
+            telemetry.annotate(**{"pre_router.route": decision["route"] or "llm",
+                                  "pre_router.method": decision["method"],
+                                  "pre_router.confidence": decision["confidence"]})
+        self._record(decision, time.perf_counter() - start)
+        return decision
+
+    def _record(self, decision, seconds):
+        with self._lock:
+            self._stats["decisions"] += 1
+            self._stats["classify_seconds"] += seconds
+            self._stats["direct" if decision["route"] else "fallback"] += 1
+            if decision["route"]:
+                by_route = self._stats["by_route"]
+                by_route[decision["route"]] = by_route.get(decision["route"], 0) + 1
+                by_method = self._stats["by_method"]
+                by_method[decision["method"]] = by_method.get(decision["method"], 0) + 1
+
+    def stats(self):
+        with self._lock:
+            out = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()}
+        out["mode"] = self.mode
+        out["direct_rate"] = out["direct"] / out["decisions"] if out["decisions"] else 0.0
+        return out
+
+
+def dispatch(route, query):
+    """Run the specialist tool `route` on `query` and return its answer."""
+    from concurrent_dispatch import SPECIALISTS
+
+    return str(SPECIALISTS[route](query))
+
+
+def answer_directly(agent, route, prompt, agent_prompt=None):
+    """Answer one orchestrator turn with the `route` specialist, recording it in `agent`'s history."""
+    answer = dispatch(route, agent_prompt or prompt)
+    record_turn(agent, prompt, answer)
+    return answer
+
+
+def record_turn(agent, prompt, answer):
+    """Add a turn answered without the orchestrator LLM to `agent`'s history."""
+    # Later turns go through the orchestrator again and may refer back to this one
+    agent.messages.append({"role": "user", "content": [{"text": prompt}]})
+    agent.messages.append({"role": "assistant", "content": [{"text": answer}]})
+
+
+_default_router = None
+_default_router_lock = threading.Lock()
+
+
+def get_pre_router():
+    """Process-wide PreRouter, or None when BIOHACKER_PRE_ROUTER is off."""
+    global _default_router
+    if PRE_ROUTER_MODE not in ("rules", "embedding"):
+        return None
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = PreRouter(PRE_ROUTER_MODE)
+        return _default_router
@@ -0,0 +1,475 @@
+"""
+Per-variable, incremental snapshots of the python_repl namespace.
+
+strands' python_repl persists its whole namespace as one dill pickle
+(repl_state/repl_state.pkl), rewritten in full after every execution. With omics
+DataFrames and arrays in the namespace that is hundreds of MB of pickling per step.
+Here every variable is stored in its own file under repl_state/snapshot/ and a small
+manifest records a fingerprint of each, so a save only rewrites what changed:
+
+    ndarray >= LARGE_VALUE_BYTES     .npy, restored memory-mapped copy-on-write, so
+                                     pages are only read when touched
+    DataFrame >= LARGE_VALUE_BYTES   uncompressed Arrow (Feather v2) when pyarrow is
+                                     installed, read from a memory map before the first
+                                     step whose code names it (SnapshotStore.materialize)
+    anything else                    one dill pickle per variable
+
+Restoring reads the manifest, maps the large arrays and unpickles the small values, so
+it stays flat as state grows. Fingerprints are CRC-32 over the raw buffers (numeric
+arrays and frame columns are never pickled just to be compared), immutable values that
+are still the same object as at the last save are not looked at again, and a frame
+that no step has named since the restore is unchanged by definition. An old
+repl_state.pkl is read once when no snapshot exists yet. Disable with
+BIOHACKER_REPL_SNAPSHOT=off.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import types
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REPL_SNAPSHOT = os.environ.get("BIOHACKER_REPL_SNAPSHOT", "on").lower() not in ("off", "0", "false")
+# Smaller arrays and frames are cheaper to pickle than to give their own mapped file
+LARGE_VALUE_BYTES = int(os.environ.get("BIOHACKER_REPL_LARGE_BYTES", str(1 << 20)))
+MANIFEST = "manifest.json"
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:  # DataFrames are pickled instead
+    pyarrow = None
+
+
+# Values that can't change without the name being rebound, so the same object means the same value
+_IMMUTABLE = (type(None), bool, int, float, complex, str, bytes, range, types.ModuleType)
+
+
+def _digest(*parts):
+    # CRC-32 runs at memory speed, several times faster than a cryptographic hash; it
+    # only has to tell a variable apart from its own previous value
+    crc, size = 0, 0
+    for part in parts:
+        part = part if isinstance(part, (bytes, memoryview)) else str(part).encode()
+        crc = zlib.crc32(part, crc)
+        size += len(part)
+    return f"{crc:08x}-{size}"
+
+
+def _is_dataframe(value):
+    return type(value).__name__ == "DataFrame" and type(value).__module__.startswith("pandas")
+
+
+def _array_fingerprint(array):
+    data = np.ascontiguousarray(array)
+    return _digest("npy", data.dtype.str, data.shape, memoryview(data).cast("B"))
+
+
+def _column_digest_parts(values):
+    import pandas as pd
+
+    if isinstance(values, np.ndarray) and not values.dtype.hasobject:
+        return [values.dtype.str, memoryview(np.ascontiguousarray(values)).cast("B")]
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        # Joining is several times faster than hash_pandas_object on gene-ID style columns
+        return ["str", "\x1f".join(values).encode("utf-8", "surrogatepass")]
+    return ["obj", pd.util.hash_array(np.asarray(values, dtype=object)).tobytes()]
+
+
+def _frame_fingerprint(frame):
+    import pandas as pd
+
+    parts = ["arrow", list(map(str, frame.columns)), list(map(str, frame.dtypes))]
+    if isinstance(frame.index, pd.RangeIndex):
+        parts.append((frame.index.start, frame.index.stop, frame.index.step))
+    else:
+        parts.extend(_column_digest_parts(frame.index.to_numpy()))
+    for i in range(frame.shape[1]):
+        parts.extend(_column_digest_parts(frame.iloc[:, i].to_numpy()))
+    return _digest(*parts)
+
+
+# Builtins that can reach any global by name; code using them gets every deferred frame
+_DYNAMIC_LOOKUP = {"globals", "locals", "vars", "dir", "eval", "exec"}
+
+
+def _code_names(code, names):
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_names(const, names)
+    return names
+
+
+def _main_code(value):
+    """Code objects of a function, class or class instance defined in the REPL itself."""
+    cls = value if isinstance(value, type) else type(value)
+    if isinstance(value, types.FunctionType):
+        return [value.__code__] if value.__module__ == "__main__" else []
+    if cls.__module__ != "__main__":
+        return []
+    codes = []
+    for attr in vars(cls).values():
+        for fn in (getattr(attr, "__func__", attr), getattr(attr, "fget", None), getattr(attr, "fset", None)):
+            if isinstance(fn, types.FunctionType):
+                codes.append(fn.__code__)
+    return codes
+
+
+def _referenced_names(code, namespace):
+    """Global names `code` may look up, directly or through REPL-defined functions and classes it uses."""
+    names = _code_names(code, set())
+    frontier = set(names)
+    while frontier:
+        found = set()
+        for name in frontier:
+            for inner in _main_code(namespace.get(name)):
+                _code_names(inner, found)
+        frontier = found - names
+        names |= found
+    return names
+
+
+def _code_parts(code):
+    parts = [code.co_qualname, code.co_code, code.co_names, code.co_varnames]
+    for const in code.co_consts:
+        parts.extend(_code_parts(const) if isinstance(const, types.CodeType) else [repr(const)])
+    return parts
+
+
+def _function_parts(fn):
+    """Fingerprint parts of a REPL function whose defaults and closure are immutable, else None."""
+    try:
+        captured = [cell.cell_contents for cell in fn.__closure__ or ()]
+    except ValueError:  # an empty cell
+        return None
+    captured += list(fn.__defaults__ or ()) + list((fn.__kwdefaults__ or {}).values())
+    if fn.__dict__ or not all(isinstance(v, _IMMUTABLE) for v in captured):
+        return None
+    return _code_parts(fn.__code__) + [repr(captured)]
+
+
+def _main_fingerprint(value):
+    """Fingerprint of a function, class or instance defined in the REPL, taken from code instead of its pickle.
+
+    dill pickles such functions together with the globals they were defined in, so
+    the pickle is as large as the namespace; it is only worth making when the code
+    changed. None for anything else, or when the value holds state the code doesn't show.
+    """
+    if getattr(value, "__module__", None) != "__main__":
+        return None
+    if isinstance(value, types.FunctionType):
+        parts = _function_parts(value)
+        return None if parts is None else _digest("fn", *parts)
+    if not isinstance(value, type):
+        # An instance: its class's code plus its own attributes
+        cls_fingerprint = _main_fingerprint(type(value))
+        state = getattr(value, "__dict__", None)
+        if cls_fingerprint is None or not isinstance(state, dict) or hasattr(type(value), "__slots__"):
+            return None
+        import dill
+
+        try:
+            return _digest("instance", cls_fingerprint, dill.dumps(state))
+        except BaseException:
+            return None
+    if type(value) is not type:
+        return None
+    parts = ["class", value.__qualname__, [b.__qualname__ for b in value.__bases__]]
+    for name, attr in vars(value).items():
+        if name in ("__dict__", "__weakref__", "__slotnames__"):  # __slotnames__: cached by copyreg
+            continue
+        fns = [getattr(attr, "__func__", attr)] if not isinstance(attr, property) else [attr.fget, attr.fset]
+        for fn in fns:
+            if isinstance(fn, types.FunctionType):
+                fn_parts = _function_parts(fn)
+                if fn_parts is None:
+                    return None
+                parts += [name] + fn_parts
+            elif fn is None or isinstance(fn, _IMMUTABLE):
+                parts += [name, repr(fn)]
+            else:
+                return None
+    return _digest(*parts)
+
+
+class SnapshotStore:
+    """Directory of one file per variable plus a JSON manifest of kinds and fingerprints.
+
+    Args:
+        directory: snapshot directory, created if missing
+        large_bytes: arrays/DataFrames at least this big get mapped files instead of pickles
+    """
+
+    def __init__(self, directory, large_bytes=LARGE_VALUE_BYTES):
+        self.directory = directory
+        self.large_bytes = large_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._manifest = self._read_manifest()
+        # name -> immutable value as of the last save or load
+        self._objects = {}
+        # name -> reader of an Arrow frame restored by load() but not read yet
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def reload(self):
+        """Re-read the manifest, for when another process may have saved since."""
+        with self._lock:
+            self._manifest = self._read_manifest()
+            self._objects = {}
+            self.pending = {}
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, MANIFEST))
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, hashlib.sha1(name.encode()).hexdigest()[:16] + suffix)
+
+    def _write(self, path, write):
+        # Write next to the target and swap it in; a file still mapped by the namespace keeps its old inode
+        tmp = path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+        return os.path.getsize(path)
+
+    def _encode(self, name, value):
+        """(kind, fingerprint, writer) for a value, or None when it can't be stored."""
+        import dill
+
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            if value.nbytes >= self.large_bytes:
+                return "npy", _array_fingerprint(value), lambda f: np.save(f, np.ascontiguousarray(value),
+                                                                           allow_pickle=False)
+            # Small arrays are still pickled, but only once they differ from the saved copy
+            return "dill", _array_fingerprint(value), lambda f: dill.dump(value, f)
+        if _is_dataframe(value):
+            try:
+                large = int(value.memory_usage(index=True).sum()) >= self.large_bytes
+                if large and pyarrow is not None:
+                    # Fails early on columns Arrow can't represent; a RangeIndex is kept as metadata
+                    schema = pyarrow.Schema.from_pandas(value, preserve_index=None)
+                    return "arrow", _frame_fingerprint(value), lambda f: pyarrow.feather.write_feather(
+                        pyarrow.Table.from_pandas(value, schema=schema, preserve_index=None), f,
+                        compression="uncompressed")
+                return "dill", _frame_fingerprint(value), lambda f: dill.dump(value, f)
+            except Exception:
+                pass  # mixed-type or unhashable columns: fingerprint the pickle
+        fingerprint = _main_fingerprint(value)
+        if fingerprint is not None:
+            return "dill", fingerprint, lambda f: dill.dump(value, f)
+        try:
+            data = dill.dumps(value)
+        except BaseException:
+            return None
+        return "dill", _digest("dill", data), lambda f: f.write(data)
+
+    def save(self, namespace):
+        """Persist the public names of `namespace`, rewriting only changed variables.
+
+        Returns:
+            dict with counts of written, unchanged, removed and skipped variables and bytes written
+        """
+        report = {"written": 0, "unchanged": 0, "removed": 0, "skipped": 0, "bytes_written": 0}
+        with self._lock:
+            manifest = {}
+            objects = {}
+            for name, value in list(namespace.items()):
+                if name.startswith("_"):
+                    continue
+                known = self._manifest.get(name)
+                if isinstance(value, _IMMUTABLE):
+                    objects[name] = value
+                    if known and self._objects.get(name, objects) is value:
+                        manifest[name] = known
+                        report["unchanged"] += 1
+                        continue
+                encoded = self._encode(name, value)
+                if encoded is None:
+                    objects.pop(name, None)
+                    report["skipped"] += 1
+                    continue
+                kind, fingerprint, write = encoded
+                suffix = {"npy": ".npy", "arrow": ".arrow", "dill": ".pkl"}[kind]
+                path = self._path(name, suffix)
+                if known and known["fingerprint"] == fingerprint and known["kind"] == kind and os.path.exists(path):
+                    manifest[name] = known
+                    report["unchanged"] += 1
+                    continue
+                try:
+                    report["bytes_written"] += self._write(path, write)
+                except Exception as e:
+                    logger.debug("REPL variable %s not saved: %s", name, e)
+                    objects.pop(name, None)
+                    report["skipped"] += 1
+                    continue
+                report["written"] += 1
+                manifest[name] = {"kind": kind, "fingerprint": fingerprint, "file": os.path.basename(path)}
+            # Deferred frames no step has named are still exactly what is on disk
+            for name in list(self.pending):
+                if name in namespace or name not in self._manifest:
+                    del self.pending[name]
+                else:
+                    manifest[name] = self._manifest[name]
+                    report["unchanged"] += 1
+            for name, entry in self._manifest.items():
+                current = manifest.get(name)
+                if current is None or current["file"] != entry["file"]:
+                    try:
+                        os.remove(os.path.join(self.directory, entry["file"]))
+                    except OSError:
+                        pass
+                    report["removed"] += name not in manifest
+            self._write(os.path.join(self.directory, MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+            self._manifest = manifest
+            self._objects = objects
+        return report
+
+    def load(self):
+        """Variables of the snapshot; large arrays are memory-mapped, not read.
+
+        Arrow frames are left out and kept in `pending` until `materialize` finds a step
+        that names them.
+        """
+        import dill
+
+        namespace = {}
+        with self._lock:
+            self._objects = {}
+            self.pending = {}
+            for name, entry in list(self._manifest.items()):
+                path = os.path.join(self.directory, entry["file"])
+                try:
+                    if entry["kind"] == "npy":
+                        # Copy-on-write: in-place edits stay in memory until the next save
+                        namespace[name] = np.load(path, mmap_mode="c", allow_pickle=False)
+                    elif entry["kind"] == "arrow":
+                        # Mapped now: a later save may replace the file, the open inode stays readable
+                        self.pending[name] = _arrow_reader(path)
+                    else:
+                        with open(path, "rb") as f:
+                            namespace[name] = dill.load(f)
+                        if isinstance(namespace[name], _IMMUTABLE):
+                            self._objects[name] = namespace[name]
+                except Exception as e:
+                    # One unreadable variable must not lose the rest of the session
+                    logger.warning("could not restore REPL variable %s: %s", name, e)
+                    del self._manifest[name]
+        return namespace
+
+    def materialize(self, namespace, code=None):
+        """Read into `namespace` the deferred frames that `code` (source or code object) may look up.
+
+        With no code, every deferred frame is read. Returns the names read.
+        """
+        with self._lock:
+            if not self.pending:
+                return []
+            names = None
+            if code is not None:
+                try:
+                    code = compile(code, "<repl>", "exec") if isinstance(code, str) else code
+                    names = _referenced_names(code, namespace)
+                except (SyntaxError, ValueError):
+                    return []  # exec raises the same error; nothing runs
+            if names is None or names & _DYNAMIC_LOOKUP:
+                wanted = list(self.pending)
+            else:
+                wanted = [name for name in self.pending if name in names]
+            for name in wanted:
+                read = self.pending.pop(name)
+                try:
+                    namespace[name] = read()
+                except Exception as e:
+                    logger.warning("could not restore REPL variable %s: %s", name, e)
+                    self._manifest.pop(name, None)
+            return wanted
+
+    def clear(self):
+        with self._lock:
+            for entry in self._manifest.values():
+                try:
+                    os.remove(os.path.join(self.directory, entry["file"]))
+                except OSError:
+                    pass
+            self._manifest = {}
+            self._objects = {}
+            self.pending = {}
+            try:
+                os.remove(os.path.join(self.directory, MANIFEST))
+            except OSError:
+                pass
+
+
+def _arrow_reader(path):
+    source = pyarrow.memory_map(path)
+    return lambda: pyarrow.feather.read_table(source).to_pandas()
+
+
+def _snapshot_repl_state_class():
+    from strands_tools.python_repl import ReplState
+
+    class SnapshotReplState(ReplState):
+        """python_repl state persisted as incremental per-variable snapshots."""
+
+        def load_state(self):
+            self.snapshot = SnapshotStore(os.path.join(self.persistence_dir, "snapshot"))
+            if not self.snapshot.exists() and os.path.exists(self.state_file):
+                # Sessions saved before snapshots: read the old pickle once
+                super().load_state()
+                return
+            self._namespace.update(self.snapshot.load())
+
+        def get_namespace(self):
+            # Interactive mode runs the code in a forked child that can't hand frames back
+            self.snapshot.materialize(self._namespace)
+            return super().get_namespace()
+
+        def execute(self, code):
+            self.snapshot.materialize(self._namespace, code)
+            super().execute(code)
+
+        def save_state(self, code=None):
+            try:
+                if code:
+                    self.snapshot.materialize(self._namespace, code)
+                    exec(code, self._namespace)
+                report = self.snapshot.save(self._namespace)
+                logger.debug("REPL snapshot saved: %s", report)
+            except Exception as e:
+                logger.error("Error saving state: %s", e)
+
+        def clear_state(self):
+            self.snapshot.clear()
+            super().clear_state()
+
+    return SnapshotReplState
+
+
+def install():
+    """Make python_repl create snapshot-backed state (call before its first use)."""
+    if not REPL_SNAPSHOT:
+        return False
+    from strands_tools import python_repl
+
+    if python_repl._repl_state is not None:
+        logger.warning("python_repl state already created; REPL snapshots not installed")
+        return False
+    if not getattr(python_repl.ReplState, "_biohacker_snapshots", False):
+        python_repl.ReplState = _snapshot_repl_state_class()
+        python_repl.ReplState._biohacker_snapshots = True
+    return True
@@ -0,0 +1,189 @@
+"""
+Semantic answer cache in front of the orchestrator.
+
+Questions that differ only in wording ("GROMACS tutorial" vs "how do I start with
+GROMACS") still cost a full routing turn plus a long sub-agent run. Incoming queries
+are embedded with the same Titan path as the knowledge base and compared against
+previously answered questions; above the similarity threshold the stored answer is
+either returned directly ("answer" mode) or passed to the agent as a head start
+("hint" mode).
+
+Enable with BIOHACKER_SEMANTIC_CACHE=answer|hint (off by default).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from settings import cache_path
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_MODE = os.environ.get("BIOHACKER_SEMANTIC_CACHE", "off").lower()
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("BIOHACKER_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("BIOHACKER_SEMANTIC_CACHE_MAX", "5000"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.environ.get("BIOHACKER_SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Routes whose answers can quote the knowledge index (data cleaning runs similarity_search,
+# consult_specialists may call it); their stored answers go stale when the index changes
+KNOWLEDGE_ROUTES = ("data_cleaning_assistant", "consult_specialists")
+
+HINT_TEMPLATE = """A previous answer to a very similar question is below. Reuse what is still relevant,
+check it against the current question, and only redo the parts that differ.
+
+Previous question: {question}
+Previous answer:
+{answer}
+
+Current question: {prompt}"""
+
+
+def _default_embed_fn(texts):
+    # Same Titan embedding path (and on-disk embedding cache) as the knowledge base
+    from embeddings import embed_texts
+    from memory_agent import get_bedrock_client
+
+    return embed_texts(get_bedrock_client(), texts)
+
+
+class SemanticCache:
+    """Vector index of previous question/answer pairs.
+
+    Args:
+        path: SQLite file, created if missing
+        embed_fn: callable mapping a list of texts to a (n, dim) matrix
+        threshold: minimum cosine similarity for a hit
+        max_entries: size cap; least recently used pairs are evicted past it
+        ttl_seconds: pairs older than this are never returned
+    """
+
+    def __init__(self, path=None, embed_fn=None, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS):
+        self.path = path or cache_path("semantic_cache.sqlite3")
+        self.embed_fn = embed_fn or _default_embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._stats = {"lookups": 0, "hits": 0, "by_route": {}}
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, route TEXT,"
+            " question TEXT, answer TEXT, vector BLOB, created REAL, last_used REAL)"
+        )
+        self._conn.commit()
+        # (ids, created, matrix) loaded on first lookup, dropped whenever the table changes
+        self._loaded = None
+
+    def _load(self):
+        if self._loaded is None:
+            rows = self._conn.execute("SELECT id, created, vector FROM answers").fetchall()
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            created = np.array([r[1] for r in rows], dtype=np.float64)
+            matrix = np.vstack([np.frombuffer(r[2], dtype=np.float32) for r in rows]) if rows else None
+            self._loaded = (ids, created, matrix)
+        return self._loaded
+
+    def embed(self, text):
+        vector = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question, vector=None):
+        """Best stored pair for `question` above the threshold.
+
+        Returns:
+            dict with question, answer, route and similarity, or None on a miss
+        """
+        vector = self.embed(question) if vector is None else vector
+        with self._lock:
+            self._stats["lookups"] += 1
+            ids, created, matrix = self._load()
+            if matrix is None:
+                return None
+            scores = matrix @ vector
+            scores[created < time.time() - self.ttl_seconds] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT question, answer, route FROM answers WHERE id = ?", (int(ids[best]),)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), int(ids[best])))
+            self._conn.commit()
+            self._stats["hits"] += 1
+            per_route = self._stats["by_route"].setdefault(row[2], {"hits": 0})
+            per_route["hits"] += 1
+        return {"question": row[0], "answer": row[1], "route": row[2], "similarity": float(scores[best])}
+
+    def put(self, question, answer, route, vector=None):
+        """Store an answered question under `route` (the specialist that produced it)."""
+        vector = self.embed(question) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (route, question, answer, vector, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (route, question, answer, vector.astype(np.float32).tobytes(), now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+            self._loaded = None
+
+    def invalidate(self, route=None):
+        """Drop every stored answer for `route`, or everything when route is None; returns the count dropped."""
+        with self._lock:
+            if route is None:
+                dropped = self._conn.execute("DELETE FROM answers").rowcount
+            else:
+                dropped = self._conn.execute("DELETE FROM answers WHERE route = ?", (route,)).rowcount
+            self._conn.commit()
+            self._loaded = None
+        return dropped
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            stats = {**self._stats, "by_route": {k: dict(v) for k, v in self._stats["by_route"].items()}}
+        stats["entries"] = entries
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """Process-wide cache, or None when BIOHACKER_SEMANTIC_CACHE is off."""
+    global _cache
+    if SEMANTIC_CACHE_MODE not in ("answer", "hint"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
+
+
+def knowledge_changed():
+    """Forget answers from KNOWLEDGE_ROUTES; called after the knowledge index gains or loses chunks."""
+    cache = get_semantic_cache()
+    if cache is None:
+        return 0
+    dropped = sum(cache.invalidate(route) for route in KNOWLEDGE_ROUTES)
+    if dropped:
+        logger.info("knowledge index changed: dropped %d cached answers", dropped)
+    return dropped
@@ -0,0 +1,673 @@
+"""
+Indexed random access to FASTA/FASTQ uploads.
+
+file_read loads whole files, which is useless for a 10 GB FASTQ and floods the model
+context with a genome. `SequenceFile` builds a samtools-compatible `.fai` index once
+and then reads only the bytes it needs from a memory map:
+
+    FASTA   NAME LENGTH OFFSET LINEBASES LINEWIDTH             (region access by name:start-end)
+    FASTQ   NAME LENGTH OFFSET LINEBASES LINEWIDTH QUALOFFSET  (one line of sequence per record)
+
+The index is written next to the file (or under BIOHACKER_CACHE_DIR if that directory
+is read-only) and rebuilt when the file is newer than it. It is built with vectorized
+newline scans over the memory map, so indexing runs at disk speed.
+
+Indexes of up to BIOHACKER_SEQ_INDEX_IN_MEMORY records (2M) are loaded with a name lookup
+table. Bigger ones (tens of millions of reads) stay memory-mapped: every
+CHECKPOINT_EVERY-th line's offset is kept, so record i is one seek plus at most that
+many short lines away. Their names go to a sorted table of (name hash, record number)
+pairs in <index>.names, built once with the index and memory-mapped, so a name lookup
+is a binary search plus reading the one or two records whose name hash matches.
+
+Gzipped files can't be indexed; `reservoir_sample` and `iter_records` stream them.
+"""
+
+import gzip
+import hashlib
+import io
+import mmap
+import os
+import random
+import threading
+from typing import Optional
+
+import numpy as np
+from strands import tool
+
+import telemetry
+from settings import cache_path
+from uploads_ingest import upload_dir
+
+FASTA_SUFFIXES = (".fa", ".fasta", ".fna", ".ffn", ".faa", ".frn", ".fas")
+FASTQ_SUFFIXES = (".fq", ".fastq")
+IN_MEMORY_RECORDS = int(os.environ.get("BIOHACKER_SEQ_INDEX_IN_MEMORY", "2000000"))
+CHECKPOINT_EVERY = 1024
+# Index lines parsed at a time by lengths() and stats(); a multiple of CHECKPOINT_EVERY
+INDEX_BLOCK_LINES = CHECKPOINT_EVERY * 256
+# Bytes scanned per numpy pass while indexing or computing stats
+SCAN_BLOCK = 64 << 20
+# Bases shown per sequence in tool output
+MAX_TOOL_BASES = 2000
+
+_NEWLINE = ord("\n")
+_CR = ord("\r")
+_GC_BYTES = list(b"GCSgcs")
+_N_BYTES = list(b"Nn")
+
+
+def sequence_format(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(FASTQ_SUFFIXES):
+        return "fastq"
+    if name.endswith(FASTA_SUFFIXES):
+        return "fasta"
+    raise ValueError(f"{path!r} is not a FASTA ({', '.join(FASTA_SUFFIXES)}) or FASTQ "
+                     f"({', '.join(FASTQ_SUFFIXES)}) file")
+
+
+def parse_region(region):
+    """("chr1", 0, 2000) from "chr1:1-2000" (1-based, inclusive) or ("chr1", 0, None) from "chr1"."""
+    name, _, span = region.rpartition(":")
+    if not name or not span or "-" not in span.replace(",", ""):
+        return region, 0, None
+    start, _, end = span.replace(",", "").partition("-")
+    try:
+        start, end = int(start), int(end)
+    except ValueError:
+        return region, 0, None
+    if start < 1 or end < start:
+        raise ValueError(f"bad region {region!r}; use name:start-end, 1-based and inclusive")
+    return name, start - 1, end
+
+
+# Record names are hashed as sum(byte[j] * NAME_HASH_PRIME ** j) mod 2**64, top 32 bits kept
+NAME_HASH_PRIME = 0x100000001B3
+_NAME_HASH_INVERSE = pow(NAME_HASH_PRIME, -1, 1 << 64)
+# Index lines hashed per numpy pass while building a name table
+NAME_TABLE_LINES = 1 << 16
+
+
+def _name_hash(name):
+    """Hash of one record name (bytes); matches _name_hashes."""
+    value, power = 0, 1
+    for byte in name:
+        value = (value + byte * power) & 0xFFFFFFFFFFFFFFFF
+        power = (power * NAME_HASH_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return value >> 32
+
+
+def _name_hashes(view, starts, stops):
+    """_name_hash of view[starts[i]:stops[i]] for every i, from prefix sums over the span they cover."""
+    lo, hi = int(starts[0]), int(stops[-1])
+    powers = np.full(hi - lo, NAME_HASH_PRIME, dtype=np.uint64)
+    powers[0] = 1
+    inverses = np.full(hi - lo, _NAME_HASH_INVERSE, dtype=np.uint64)
+    inverses[0] = 1
+    # uint64 arithmetic wraps, which is the mod 2**64 the hash is defined with
+    np.cumprod(powers, out=powers)
+    np.cumprod(inverses, out=inverses)
+    prefix = np.zeros(hi - lo + 1, dtype=np.uint64)
+    np.cumsum(view[lo:hi].astype(np.uint64) * powers, out=prefix[1:])
+    starts, stops = starts - lo, stops - lo
+    return ((prefix[stops] - prefix[starts]) * inverses[starts]) >> np.uint64(32)
+
+
+def _newlines(view, start, end):
+    """Absolute positions of newlines in view[start:end], scanned SCAN_BLOCK bytes at a time."""
+    parts = []
+    for block in range(start, end, SCAN_BLOCK):
+        stop = min(block + SCAN_BLOCK, end)
+        parts.append(np.flatnonzero(view[block:stop] == _NEWLINE) + block)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def _index_fasta(mm, out):
+    view = np.frombuffer(mm, dtype=np.uint8)
+    size = len(mm)
+    headers = []
+    position = 0 if mm[:1] == b">" else mm.find(b"\n>")
+    if position == -1:
+        raise ValueError("no FASTA header ('>') found")
+    if position:
+        position += 1
+    while position != -1 and position < size:
+        headers.append(position)
+        position = mm.find(b"\n>", position)
+        position = position + 1 if position != -1 else -1
+    count = 0
+    for number, header in enumerate(headers):
+        end = headers[number + 1] if number + 1 < len(headers) else size
+        header_end = mm.find(b"\n", header, end)
+        if header_end == -1:
+            header_end = end
+        name = mm[header + 1:header_end].split(None, 1)
+        name = name[0].decode() if name else ""
+        offset = header_end + 1
+        if offset >= end:
+            out.write(f"{name}\t0\t{min(offset, size)}\t0\t0\n")
+            count += 1
+            continue
+        lines = _newlines(view, offset, end)
+        if len(lines) == 0 or lines[-1] != end - 1:
+            lines = np.append(lines, end)  # last line without a trailing newline
+        widths = lines - np.concatenate(([offset], lines[:-1] + 1))
+        bases = widths - ((widths > 0) & (view[lines - 1] == _CR))
+        filled = np.flatnonzero(bases)
+        bases = bases[:filled[-1] + 1] if len(filled) else bases[:0]  # trailing blank lines are fine
+        line_bases = int(bases[0]) if len(bases) else 0
+        line_width = int(widths[0]) + 1 if len(bases) else 0
+        if len(bases) > 1 and (np.any(bases[:-1] != line_bases) or bases[-1] > line_bases):
+            raise ValueError(f"record {name!r} has lines of different widths; random access needs a fixed "
+                             f"line width (reformat with e.g. `seqkit seq -w 60`)")
+        out.write(f"{name}\t{int(bases.sum())}\t{offset}\t{line_bases}\t{line_width}\n")
+        count += 1
+    return count
+
+
+def _index_fastq(mm, out):
+    view = np.frombuffer(mm, dtype=np.uint8)
+    size = len(mm)
+    if size and mm[:1] != b"@":
+        raise ValueError("FASTQ file doesn't start with '@'")
+    count = 0
+    carry = np.empty(0, dtype=np.int64)
+    previous_end = -1  # newline before the next record
+    for block in range(0, size, SCAN_BLOCK):
+        stop = min(block + SCAN_BLOCK, size)
+        ends = np.concatenate((carry, np.flatnonzero(view[block:stop] == _NEWLINE) + block))
+        if stop == size and (len(ends) == 0 or ends[-1] != size - 1):
+            ends = np.append(ends, size)  # last line without a trailing newline
+        whole = len(ends) // 4 * 4
+        records, carry = ends[:whole].reshape(-1, 4), ends[whole:]
+        if not len(records):
+            continue
+        starts = np.concatenate(([previous_end + 1], records[:-1, 3] + 1))
+        previous_end = int(records[-1, 3])
+        plus_lines = records[:, 1] + 1
+        if np.any(view[starts] != ord("@")) or np.any(view[np.minimum(plus_lines, size - 1)] != ord("+")):
+            raise ValueError("FASTQ records must be 4 lines each (multi-line FASTQ isn't supported)")
+        offsets = records[:, 0] + 1
+        lengths = records[:, 1] - offsets
+        lengths -= (view[np.maximum(records[:, 1] - 1, 0)] == _CR)
+        qual_offsets = records[:, 2] + 1
+        lines = []
+        for start, header_end, offset, length, qual_offset in zip(
+                starts.tolist(), records[:, 0].tolist(), offsets.tolist(), lengths.tolist(), qual_offsets.tolist()):
+            name = mm[start + 1:header_end].split(None, 1)
+            name = name[0].decode() if name else ""
+            lines.append(f"{name}\t{length}\t{offset}\t{length}\t{length + 1}\t{qual_offset}\n")
+        out.write("".join(lines))
+        count += len(lines)
+    if len(carry):
+        raise ValueError("FASTQ file ends in the middle of a record")
+    return count
+
+
+class SequenceFile:
+    """Random access to an uncompressed FASTA/FASTQ file through its `.fai` index.
+
+    Args:
+        path: FASTA or FASTQ file
+        index_path: where to keep the index; defaults to <path>.fai, or the cache
+            directory when the file's directory isn't writable
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = os.path.abspath(path)
+        self.format = sequence_format(path)
+        if self.path.lower().endswith(".gz"):
+            raise ValueError("gzipped files can't be indexed for random access; decompress it first "
+                             "(or use reservoir sampling, which streams)")
+        self.index_path = index_path or self._default_index_path()
+        self.built = False
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.path) else b""
+        self._ensure_index()
+        self._load_index()
+
+    def _default_index_path(self):
+        beside = self.path + ".fai"
+        if os.access(os.path.dirname(self.path), os.W_OK) or os.path.exists(beside):
+            return beside
+        return cache_path("seq_index", hashlib.sha1(self.path.encode()).hexdigest()[:16] + ".fai")
+
+    def _ensure_index(self):
+        # samtools' rule: an index older than its file is stale
+        if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) >= os.path.getmtime(self.path):
+            return
+        with telemetry.span("seq_index.build", **{"seq.path": self.path, "seq.bytes": len(self._mm)}):
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", buffering=1 << 20) as out:
+                count = _index_fastq(self._mm, out) if self.format == "fastq" else _index_fasta(self._mm, out)
+            os.replace(tmp, self.index_path)
+            telemetry.annotate(**{"seq.records": count})
+        self.built = True
+
+    def _load_index(self):
+        self._index_file = open(self.index_path, "rb")
+        size = os.path.getsize(self.index_path)
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        view = np.frombuffer(self._index, dtype=np.uint8) if size else np.empty(0, dtype=np.uint8)
+        # Line starts are kept only while the index is small; the checkpoints always are
+        self.count, next_start = 0, 0
+        checkpoints, starts = [], []
+        for block in range(0, len(view), SCAN_BLOCK):
+            ends = np.flatnonzero(view[block:block + SCAN_BLOCK] == _NEWLINE) + block
+            if not len(ends):
+                continue
+            line_starts = np.concatenate(([next_start], ends[:-1] + 1))
+            checkpoints.append(line_starts[-self.count % CHECKPOINT_EVERY::CHECKPOINT_EVERY])
+            self.count += len(ends)
+            if self.count <= IN_MEMORY_RECORDS:
+                starts.append(line_starts)
+            next_start = int(ends[-1]) + 1
+        del view
+        self._checkpoints = np.concatenate(checkpoints) if checkpoints else np.zeros(1, dtype=np.int64)
+        self._line_starts = None
+        self._names = None
+        self._name_table = None
+        if self.count <= IN_MEMORY_RECORDS:
+            self._line_starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+            names = self._index[:].split(b"\n")[:self.count]
+            self._names = {line[:line.index(b"\t")].decode(): number for number, line in enumerate(names)}
+        elif self.count < 1 << 32:
+            self._name_table = self._load_name_table()
+
+    def _load_name_table(self):
+        """Sorted (name hash << 32 | record number) array for the index, rebuilt when older than it."""
+        path = self.index_path + ".names"
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self.index_path):
+            table = np.load(path, mmap_mode="r")
+            if len(table) == self.count:
+                return table
+        with telemetry.span("seq_index.name_table", **{"seq.path": self.path, "seq.records": self.count}):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            table = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint64, shape=(self.count,))
+            view = np.frombuffer(self._index, dtype=np.uint8)
+            number, next_start = 0, 0
+            for block in range(0, len(view), SCAN_BLOCK):
+                ends = np.flatnonzero(view[block:block + SCAN_BLOCK] == _NEWLINE) + block
+                if not len(ends):
+                    continue
+                line_starts = np.concatenate(([next_start], ends[:-1] + 1))
+                next_start = int(ends[-1]) + 1
+                for i in range(0, len(line_starts), NAME_TABLE_LINES):
+                    starts = line_starts[i:i + NAME_TABLE_LINES]
+                    lo, hi = int(starts[0]), int(ends[i:i + NAME_TABLE_LINES][-1])
+                    tabs = np.flatnonzero(view[lo:hi] == ord("\t")) + lo
+                    hashes = _name_hashes(view, starts, tabs[np.searchsorted(tabs, starts)])
+                    numbers = np.arange(number, number + len(starts), dtype=np.uint64)
+                    table[number:number + len(starts)] = (hashes << np.uint64(32)) | numbers
+                    number += len(starts)
+            del view
+            # Sorted in place in the mapped file: no second copy of the table in memory
+            table.sort()
+            table.flush()
+            del table
+            os.replace(tmp, path)
+        return np.load(path, mmap_mode="r")
+
+    def close(self):
+        for handle in (self._mm, self._index):
+            if isinstance(handle, mmap.mmap):
+                handle.close()
+        self._file.close()
+        self._index_file.close()
+        self._name_table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    # --- index entries -------------------------------------------------------------
+
+    def _line_start(self, number):
+        if self._line_starts is not None:
+            return int(self._line_starts[number])
+        position = int(self._checkpoints[number // CHECKPOINT_EVERY])
+        for _ in range(number % CHECKPOINT_EVERY):
+            position = self._index.find(b"\n", position) + 1
+        return position
+
+    def _parse(self, number):
+        start = self._line_start(number)
+        fields = self._index[start:self._index.find(b"\n", start)].split(b"\t")
+        return (fields[0].decode(),) + tuple(int(f) for f in fields[1:])
+
+    def _number(self, name):
+        if self._names is not None:
+            if name not in self._names:
+                raise KeyError(name)
+            return self._names[name]
+        if self._name_table is not None:
+            prefix = np.uint64(_name_hash(name.encode()) << 32)
+            lo = np.searchsorted(self._name_table, prefix)
+            hi = np.searchsorted(self._name_table, prefix | np.uint64(0xFFFFFFFF), side="right")
+            # Same hash, different name is possible; lowest record number first, like a scan would find
+            for packed in self._name_table[lo:hi]:
+                number = int(packed) & 0xFFFFFFFF
+                if self._parse(number)[0] == name:
+                    return number
+            raise KeyError(name)
+        # Over 4G records: no name table, search the index itself
+        key = name.encode() + b"\t"
+        position = 0 if self._index[:len(key)] == key else self._index.find(b"\n" + key)
+        if position == -1:
+            raise KeyError(name)
+        position += 0 if position == 0 else 1
+        # Line number of that offset: nearest checkpoint, then count the lines in between
+        checkpoint = int(np.searchsorted(self._checkpoints, position, side="right")) - 1
+        base = int(self._checkpoints[checkpoint])
+        return checkpoint * CHECKPOINT_EVERY + self._index[base:position].count(b"\n")
+
+    def entry(self, key):
+        """Index entry (name, length, offset, line bases, line width[, quality offset]) by name or number."""
+        number = key if isinstance(key, int) else self._number(key)
+        if not 0 <= number < self.count:
+            raise IndexError(f"record {number} out of range (file has {self.count})")
+        return self._parse(number)
+
+    def names(self, limit=None):
+        for number in range(self.count if limit is None else min(limit, self.count)):
+            yield self._parse(number)[0]
+
+    def lengths(self):
+        """Record lengths straight from the index, without touching the sequence file."""
+        blocks = [columns[:, 0] for columns in self._iter_columns(usecols=[1])]
+        return np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+
+    # --- sequence access -----------------------------------------------------------
+
+    def _bases(self, offset, line_bases, line_width, start, end):
+        if line_bases == 0 or end <= start:
+            return ""
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases + 1
+        chunk = self._mm[first:last]
+        if line_width != line_bases:
+            chunk = chunk.replace(b"\r", b"").replace(b"\n", b"")
+        return chunk.decode("ascii", "replace")
+
+    def fetch(self, name, start=0, end=None):
+        """Bases [start, end) (0-based, half-open) of record `name`."""
+        fields = self.entry(name)
+        length, offset, line_bases, line_width = fields[1:5]
+        end = length if end is None else min(end, length)
+        return self._bases(offset, line_bases, line_width, max(0, start), end)
+
+    def region(self, region):
+        """Sequence of a samtools-style region: "chr1", "chr1:1000-2000" (1-based, inclusive)."""
+        name, start, end = parse_region(region)
+        return self.fetch(name, start, end)
+
+    def record(self, key):
+        """Full record by name or number: {"name", "sequence"[, "quality"]}."""
+        fields = self.entry(key)
+        out = {"name": fields[0], "sequence": self._bases(fields[2], fields[3], fields[4], 0, fields[1])}
+        if self.format == "fastq":
+            out["quality"] = self._mm[fields[5]:fields[5] + fields[1]].decode("ascii", "replace")
+        return out
+
+    def sample(self, k, seed=None):
+        """k records drawn uniformly without replacement, in file order; O(k) with the index."""
+        numbers = sorted(random.Random(seed).sample(range(self.count), min(k, self.count)))
+        return [self.record(number) for number in numbers]
+
+    def iter_records(self, limit=None):
+        for number in range(self.count if limit is None else min(limit, self.count)):
+            yield self.record(number)
+
+    # --- statistics ----------------------------------------------------------------
+
+    def record_stats(self, limit=None):
+        """Yield {name, length, gc, n[, mean_quality]} per record, streaming."""
+        for record in self.iter_records(limit):
+            yield _record_stats(record)
+
+    def stats(self, max_records=None):
+        """Length distribution (from the index alone) and GC / N / quality over up to `max_records` records.
+
+        The index is parsed INDEX_BLOCK_LINES lines at a time and the length distribution is
+        kept as (length, count) pairs, so memory doesn't grow with the number of records.
+        """
+        with telemetry.span("seq_index.stats", **{"seq.path": self.path}):
+            scanned = self.count if max_records is None else min(max_records, self.count)
+            values, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            gc = n = quality_sum = bases = 0
+            first = 0
+            for columns in self._iter_columns():
+                lengths = columns[:, 0]
+                values, inverse = np.unique(np.concatenate((values, lengths)), return_inverse=True)
+                counts = np.bincount(inverse, weights=np.concatenate((counts, np.ones(len(lengths)))),
+                                     minlength=len(values)).astype(np.int64)
+                take = columns[:max(0, scanned - first)]
+                first += len(columns)
+                if not len(take):
+                    continue
+                lengths, offsets, line_bases, line_widths = (take[:, i] for i in range(4))
+                full_lines = np.divmod(lengths, np.maximum(line_bases, 1))
+                # Line breaks inside a sequence's byte range are neither GC nor N, so they can stay in
+                block_gc, block_n, _ = self._scan(offsets, offsets + full_lines[0] * line_widths + full_lines[1])
+                gc, n, bases = gc + block_gc, n + block_n, bases + int(lengths.sum())
+                if self.format == "fastq":
+                    quality_sum += self._scan(take[:, 4], take[:, 4] + lengths)[2]
+            out = {"format": self.format, "records": self.count, **_length_stats(values, counts)}
+            out["records_scanned"] = scanned
+            out["gc_fraction"] = round(gc / max(bases - n, 1), 4)
+            out["n_fraction"] = round(n / max(bases, 1), 6)
+            if self.format == "fastq":
+                out["mean_quality"] = round(quality_sum / max(bases, 1) - 33, 2)
+        return out
+
+    def _iter_columns(self, usecols=None):
+        """Numeric index columns (all of them by default) as int64 arrays of up to INDEX_BLOCK_LINES rows.
+
+        Block boundaries come from the checkpoints, so only one block of the memory-mapped
+        index is copied and parsed at a time.
+        """
+        usecols = usecols or range(1, 6 if self.format == "fastq" else 5)
+        step = INDEX_BLOCK_LINES // CHECKPOINT_EVERY
+        for first in range(0, self.count, INDEX_BLOCK_LINES):
+            checkpoint = first // CHECKPOINT_EVERY
+            start = int(self._checkpoints[checkpoint])
+            end = int(self._checkpoints[checkpoint + step]) if checkpoint + step < len(self._checkpoints) \
+                else len(self._index)
+            yield np.loadtxt(io.BytesIO(self._index[start:end]), dtype=np.int64, delimiter="\t", usecols=usecols,
+                             max_rows=min(INDEX_BLOCK_LINES, self.count - first), ndmin=2, comments=None)
+
+    def _scan(self, starts, ends):
+        """(GC count, N count, byte sum) over the byte ranges [starts, ends), in file order."""
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        view = np.frombuffer(self._mm, dtype=np.uint8) if len(self._mm) else np.empty(0, dtype=np.uint8)
+        gc = n = total = 0
+        for block in range(int(starts[0]) if len(starts) else 0, int(ends[-1]) if len(ends) else 0, SCAN_BLOCK):
+            stop = min(block + SCAN_BLOCK, len(view))
+            first = np.searchsorted(ends, block, side="right")
+            last = np.searchsorted(starts, stop, side="left")
+            # +1 where a range opens, -1 where it closes; the running sum masks the bytes inside ranges
+            marks = np.zeros(stop - block + 1, dtype=np.int8)
+            marks[np.clip(starts[first:last], block, stop) - block] += 1
+            marks[np.clip(ends[first:last], block, stop) - block] -= 1
+            selected = view[block:stop][np.cumsum(marks[:-1], dtype=np.int8).astype(bool)]
+            counts = np.bincount(selected, minlength=256)
+            gc += int(counts[_GC_BYTES].sum())
+            n += int(counts[_N_BYTES].sum())
+            total += int(counts @ np.arange(256))
+        del view
+        return gc, n, total
+
+
+def _record_stats(record):
+    seq = record["sequence"].upper()
+    n = seq.count("N")
+    stats = {"name": record["name"], "length": len(seq), "n": n,
+             "gc": round((seq.count("G") + seq.count("C") + seq.count("S")) / max(len(seq) - n, 1), 4)}
+    if "quality" in record and record["quality"]:
+        stats["mean_quality"] = round(sum(record["quality"].encode()) / len(record["quality"]) - 33, 2)
+    return stats
+
+
+def _length_stats(values, counts):
+    """Length summary from the distinct lengths (ascending) and how many records have each."""
+    if not len(values):
+        return {"total_bases": 0}
+    ordered, times = values[::-1], counts[::-1]
+    cumulative = np.cumsum(ordered * times)
+    n50 = int(ordered[np.searchsorted(cumulative, cumulative[-1] / 2)])
+    return {"total_bases": int(cumulative[-1]), "min_length": int(values[0]), "max_length": int(values[-1]),
+            "mean_length": round(float(cumulative[-1] / counts.sum()), 1), "n50": n50}
+
+
+def _open_text(path):
+    return gzip.open(path, "rt") if path.lower().endswith(".gz") else open(path)
+
+
+def iter_records(path):
+    """Stream records of a FASTA/FASTQ file (gzipped or not) without an index."""
+    fmt = sequence_format(path)
+    with _open_text(path) as f:
+        if fmt == "fastq":
+            while True:
+                header = f.readline()
+                if not header:
+                    return
+                seq, _, qual = f.readline().rstrip(), f.readline(), f.readline().rstrip()
+                yield {"name": header[1:].split(None, 1)[0] if header[1:].strip() else "", "sequence": seq,
+                       "quality": qual}
+            return
+        name, parts = None, []
+        for line in f:
+            if line.startswith(">"):
+                if name is not None:
+                    yield {"name": name, "sequence": "".join(parts)}
+                name, parts = (line[1:].split(None, 1) or [""])[0], []
+            else:
+                parts.append(line.strip())
+        if name is not None:
+            yield {"name": name, "sequence": "".join(parts)}
+
+
+def reservoir_sample(path, k, seed=None):
+    """k records sampled uniformly in one streaming pass (Algorithm R); works on gzipped files."""
+    rng = random.Random(seed)
+    reservoir = []
+    for seen, record in enumerate(iter_records(path)):
+        if seen < k:
+            reservoir.append(record)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < k:
+                reservoir[slot] = record
+    return reservoir
+
+
+_open_files = {}
+_open_lock = threading.Lock()
+
+
+def open_sequence_file(path):
+    """Shared SequenceFile for `path`, reopened when the file changes."""
+    path = os.path.abspath(path)
+    with _open_lock:
+        cached = _open_files.get(path)
+        mtime = os.path.getmtime(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        handle = SequenceFile(path)
+        _open_files[path] = (mtime, handle)
+        return handle
+
+
+def _resolve(path):
+    if os.path.exists(path):
+        return path
+    candidate = os.path.join(upload_dir(), path)
+    if os.path.exists(candidate):
+        return candidate
+    raise ValueError(f"{path!r} not found (looked in the working directory and {upload_dir()})")
+
+
+def _format_record(record):
+    seq = record["sequence"]
+    shown = seq if len(seq) <= MAX_TOOL_BASES else seq[:MAX_TOOL_BASES] + f"... ({len(seq)} bases in total)"
+    if "quality" in record:
+        return f"@{record['name']}\n{shown}\n+\n{record['quality'][:MAX_TOOL_BASES]}"
+    wrapped = "\n".join(shown[i:i + 80] for i in range(0, len(shown), 80))
+    return f">{record['name']}\n{wrapped}"
+
+
+@tool
+def sequence_file(path: str, action: str = "stats", name: Optional[str] = None, region: Optional[str] = None,
+                  n: int = 5, seed: Optional[int] = None) -> str:
+    """
+    Inspect a large FASTA/FASTQ file (genome, reads) without reading it into context.
+    The first call builds a .fai index next to the file; after that every action reads
+    only the records it needs.
+
+    Args:
+        path: FASTA/FASTQ file, absolute or relative to the uploads folder
+        action: one of
+            stats    record count, length distribution (N50), GC and N content, mean quality
+            list     first n record names and lengths
+            head     first n records
+            get      one record by name (or by 0-based number)
+            region   bases of a region, e.g. "chr1:10000-10500" (1-based, inclusive)
+            sample   n records drawn at random (seed for repeatability)
+        name: record name for "get"
+        region: region for "region"
+        n: number of records for list/head/sample
+        seed: random seed for "sample"
+
+    Returns:
+        The requested records or statistics; long sequences are truncated
+    """
+    try:
+        path = _resolve(path)
+        if path.lower().endswith(".gz"):
+            if action == "sample":
+                return "\n".join(_format_record(r) for r in reservoir_sample(path, n, seed))
+            return ("Error: gzipped files can only be sampled (action='sample'); decompress the file for "
+                    "indexed access")
+        handle = open_sequence_file(path)
+        if action == "stats":
+            import json
+
+            # Reads are summarised from the first million records; the length stats cover all of them
+            limit = None if handle.format == "fasta" else 1_000_000
+            return json.dumps(handle.stats(max_records=limit), indent=2)
+        if action == "list":
+            return "\n".join(f"{fields[0]}\t{fields[1]}" for fields in map(handle.entry, range(min(n, len(handle))))) \
+                + f"\n({len(handle)} records)"
+        if action == "head":
+            return "\n".join(_format_record(r) for r in handle.iter_records(n))
+        if action == "get":
+            if name is None:
+                return "Error: 'get' needs a name"
+            try:
+                return _format_record(handle.record(name))
+            except KeyError:
+                if not name.isdigit():
+                    raise
+                return _format_record(handle.record(int(name)))
+        if action == "region":
+            if not region:
+                return "Error: 'region' needs a region like chr1:1000-2000"
+            seq = handle.region(region)
+            return _format_record({"name": region, "sequence": seq})
+        if action == "sample":
+            return "\n".join(_format_record(r) for r in handle.sample(n, seed))
+        return f"Error: unknown action {action!r}"
+    except (KeyError, IndexError) as e:
+        return f"Error: no record {e}"
+    except (OSError, ValueError) as e:
+        return f"Error: {e}"
@@ -0,0 +1,61 @@
+"""
+Per-session orchestrator agents for the AgentCore app.
+
+Every session gets its own `biohacker_agent` (and, through the sub-agent pool, its own
+specialists), so concurrent requests from different sessions never share or contend on
+one conversation. Sessions are bounded by an LRU cap and an idle TTL, and each agent
+keeps only a sliding window of recent messages so history can't grow without bound.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager, contextmanager
+
+from strands.agent.conversation_manager import SlidingWindowConversationManager
+
+import worker_pool
+from agent_pool import AgentPool, agent_pool, session_scope
+from biohacker_agent import build_biohacker_agent
+
+MAX_SESSIONS = int(os.environ.get("BIOHACKER_MAX_SESSIONS", "64"))
+SESSION_TTL_SECONDS = float(os.environ.get("BIOHACKER_SESSION_TTL", "3600"))
+# Messages kept per session; older turns are trimmed by the conversation manager
+SESSION_HISTORY_MESSAGES = int(os.environ.get("BIOHACKER_SESSION_HISTORY", "40"))
+
+
+def build_session_agent():
+    return build_biohacker_agent(
+        conversation_manager=SlidingWindowConversationManager(window_size=SESSION_HISTORY_MESSAGES)
+    )
+
+
+def _drop_sub_agents(session_id, name):
+    # When a session's orchestrator goes, its specialists (and its REPL's worker affinity) go with it
+    agent_pool.drop_session(session_id)
+    worker_pool.drop_session(session_id)
+
+
+session_agents = AgentPool(ttl_seconds=SESSION_TTL_SECONDS, max_agents=MAX_SESSIONS, on_evict=_drop_sub_agents)
+
+
+@contextmanager
+def session_agent(session_id):
+    """Orchestrator agent for `session_id`, locked to the caller for the block."""
+    with session_scope(session_id):
+        with session_agents.lease("orchestrator", build_session_agent) as agent:
+            yield agent
+
+
+@asynccontextmanager
+async def async_session_agent(session_id):
+    """Async form of session_agent; waits for a busy session off the event loop."""
+    with session_scope(session_id):
+        entry = await asyncio.to_thread(session_agents.acquire, "orchestrator", build_session_agent, session_id)
+        try:
+            yield entry.agent
+        finally:
+            session_agents.release(entry)
+
+
+def stats():
+    return {"sessions": session_agents.stats(), "sub_agents": agent_pool.stats()}
@@ -0,0 +1,18 @@
+"""
+Shared locations for on-disk state (embedding cache, vector index, tool caches).
+
+Everything lives under BIOHACKER_CACHE_DIR, defaulting to ~/.cache/biohacker.
+"""
+
+import os
+
+CACHE_DIR = os.environ.get(
+    "BIOHACKER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "biohacker")
+)
+
+
+def cache_path(*parts):
+    """Path under CACHE_DIR; the parent directory is created if missing."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
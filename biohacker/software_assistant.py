@@ -2,10 +2,27 @@
 
 import json
 from strands import Agent, tool
-from strands_tools import python_repl, shell, file_read, file_write, editor, http_request
+from strands_tools import shell, file_read, file_write, editor, http_request
 #from strands_tools.browser import LocalChromiumBrowser
 from code_researcher_assistant import code_researcher_assistant
 from strands.agent.conversation_manager import SummarizingConversationManager
+from agent_pool import agent_pool, run_agent
+from bedrock_models import build_model
+import repl_snapshot
+import telemetry
+import worker_pool
+from worker_pool import run_python_jobs
+from artifact_cache import fetch_artifact
+from volcano import volcano_plot
+
+if worker_pool.REPL_WORKERS:
+    # python_repl steps run in the warm, sandboxed workers, with a per-session namespace
+    from worker_pool import python_repl
+else:
+    from strands_tools import python_repl
+
+    # python_repl keeps its namespace as per-variable snapshots instead of one pickle
+    repl_snapshot.install()
 
 
 # Define a focused system prompt for file operations
@@ -20,7 +37,9 @@ Your capabilities include:
    - Programming language syntax guidance
 
 2. Technical Assistance:
-   - Real-time code execution and testing
+   - Real-time code execution and testing with python_repl (variables persist between calls)
+   - Independent analyses (e.g. one per sample) run in parallel with run_python_jobs, in sandboxed workers with numpy, pandas and scipy preloaded
+   - Volcano plots of differential-expression tables (DESeq2, edgeR, limma) with volcano_plot, instead of volcano_plot.R
    - Dependency management, environment setup and configuration
    - Shell command guidance and execution
    - File system operations and management
@@ -36,13 +55,13 @@ Your capabilities include:
 4. Decision Protocol:
     - Skip this instruction if already done: To initialise, break down the problem into chunks, show the full plan (numbered steps and tools) first to confirm your understanding, Do not ask to run anything until this is done
     - Search through user's system with tools to get information you need, only prompt user if necessary
-    - Keep the user updated about the current step and where it is in the process, never run code tools (code_interpreter, python_repl, shell, file_read, file_write, editor) consecutively, always interject with an update of your plan and code
+    - Keep the user updated about the current step and where it is in the process, never run code tools (code_interpreter, python_repl, run_python_jobs, shell, file_read, file_write, editor) consecutively, always interject with an update of your plan and code
     - Throughout the conversation, ask user if they are already familiar with the topic and adjust your chunking according to user feedback and understanding
     
     - If at any point you are not fully confident in your understanding, run the Code Researcher Agent to retrieve dependencies, software and relevant code snippets from the web, remember context
-    - ONLY CONTINUE if you have checked, searched for and downloaded necessary dependencies and software with http_request and shell tools
+    - ONLY CONTINUE if you have checked, searched for and downloaded necessary dependencies and software with fetch_artifact (cached; use it instead of http_request, wget or curl for anything you install or unpack) and shell tools
     - If you are unable to complete the task or do not have the tools required, printout a message indicating the limitation.
-    - DO NOT EXECUTE code_interpreter, python_repl, shell, file_read, file_write, editor. First give a separate output containing ONLY the exact code/commands in fenced code blocks, and a short summary of what it does
+    - DO NOT EXECUTE code_interpreter, python_repl, run_python_jobs, shell, file_read, file_write, editor. First give a separate output containing ONLY the exact code/commands in fenced code blocks, and a short summary of what it does
     - If the user does not give you answers to the questions you need before proceeding, directly print out the defaults you will be using to address your questions before continuing
     - If and only if user inputs "I am explicitly giving you permission to proceed with first suggestion, or to execute your code", you may give a code preview
     - Before executing code line by line, print the code snippet and explanation for every line of code before invoking tools related to code, tools and environment, capture logs and handle errors
@@ -74,27 +93,37 @@ You are summarizing a technical conversation. Create a concise bullet-point summ
 Format as bullet points without conversational language.
 """
 
-# Create a file-focused agent with selected tools
-@tool
-def software_assistant(user_input):
-
+def build_software_agent():
     # Conversation manager uses the module-level summary prompt
     conversation_manager = SummarizingConversationManager(
         summarization_system_prompt=CUSTOM_SUMMARY_PROMPT
     )
+    # Summarization is a hidden model call; give it its own span in the trace
+    telemetry.instrument_method(conversation_manager, "reduce_context", "conversation.summarize")
+    # Start the code workers while the agent plans, so its first python_repl / run_python_jobs call doesn't wait for imports
+    worker_pool.get_worker_pool(warm=True)
 
-    software_agent = Agent(
+    return Agent(
+        model=build_model("software_assistant"),
         system_prompt=SOFTWARE_ASSISTANT_SYSTEM_PROMPT,
         callback_handler=None,
-        tools=[code_researcher_assistant, python_repl, shell, file_read, file_write, editor, http_request],
+        tools=[code_researcher_assistant, python_repl, run_python_jobs, fetch_artifact, volcano_plot, shell, file_read,
+               file_write, editor, http_request],
         conversation_manager=conversation_manager,
     )
 
-    # Run the agent once for the provided user_input and return the stringified response
-    try:
-        response = software_agent(user_input)
-    except Exception:
-        # Fallback to string input if the agent expects a different shape
-        response = software_agent(str(user_input))
+
+# Create a file-focused agent with selected tools
+@tool
+def software_assistant(user_input):
+
+    # Reuse this session's software agent (and its conversation) if one is already warm
+    with agent_pool.lease("software_assistant", build_software_agent) as software_agent:
+        # Run the agent once for the provided user_input and return the stringified response
+        try:
+            response = run_agent(software_agent, user_input)
+        except Exception:
+            # Fallback to string input if the agent expects a different shape
+            response = run_agent(software_agent, str(user_input))
 
     return str(response)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Token-level streaming of an orchestrator turn.
+
+`stream_agent` turns strands' `stream_async` events into a small, JSON-friendly event
+vocabulary shared by the CLI and the AgentCore entrypoint; `stream_turn` adds the
+optional semantic answer cache in front of it, and `run_turn` is its blocking form:
+
+    {"type": "text", "data": "..."}                       incremental model text
+    {"type": "tool_start", "tool": name, "id": tool_use_id}
+    {"type": "tool_end", "tool": name, "id": ..., "status": "success"|"error", "seconds": ...}
+    {"type": "done", "ttfb_ms": ..., "total_ms": ..., "text": full answer, "cache": None|"answer"|"hint",
+     "pre_routed": None|specialist name}
+
+Time-to-first-byte is the delay until the first text or tool event of the turn. When the
+pre-router (see pre_router.py) is confident, the specialist is called directly and the
+orchestrator LLM is skipped for that turn.
+
+The answer cache is only used for the first turn of a conversation. A follow-up ("yes,
+go ahead") means whatever the earlier turns say, so it is neither looked up nor stored,
+and a cached answer is recorded in the agent's history like any other turn.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+
+import pre_router
+import semantic_cache
+import telemetry
+from agent_pool import run_in_session
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_agent(agent, prompt):
+    """Run one turn of `agent` on `prompt`, yielding events as they happen."""
+    start = time.perf_counter()
+    first_event_at = None
+    started_tools = {}
+    text_parts = []
+
+    def mark_first():
+        nonlocal first_event_at
+        if first_event_at is None:
+            first_event_at = time.perf_counter()
+
+    async for event in agent.stream_async(prompt):
+        if "data" in event and isinstance(event["data"], str):
+            mark_first()
+            text_parts.append(event["data"])
+            yield {"type": "text", "data": event["data"]}
+
+        tool_use = event.get("current_tool_use")
+        if tool_use and tool_use.get("toolUseId") and tool_use["toolUseId"] not in started_tools:
+            mark_first()
+            started_tools[tool_use["toolUseId"]] = (tool_use.get("name"), time.perf_counter())
+            yield {"type": "tool_start", "tool": tool_use.get("name"), "id": tool_use["toolUseId"]}
+
+        # Tool results come back as a user message holding toolResult blocks
+        message = event.get("message")
+        if message and message.get("role") == "user":
+            for block in message.get("content", []):
+                result = block.get("toolResult")
+                if not result:
+                    continue
+                name, started = started_tools.get(result.get("toolUseId"), (None, time.perf_counter()))
+                yield {"type": "tool_end", "tool": name, "id": result.get("toolUseId"),
+                       "status": result.get("status", "success"), "seconds": time.perf_counter() - started}
+
+    end = time.perf_counter()
+    yield {
+        "type": "done",
+        "ttfb_ms": ((first_event_at or end) - start) * 1000,
+        "total_ms": (end - start) * 1000,
+        "text": "".join(text_parts),
+        "cache": None,
+        "pre_routed": None,
+    }
+
+
+async def _direct_turn(agent, route, prompt, agent_prompt, start):
+    # Same events as an LLM-routed turn that made a single tool call
+    tool_id = f"pre_router_{int(start * 1e6)}"
+    first_event_at = time.perf_counter()
+    yield {"type": "tool_start", "tool": route, "id": tool_id}
+    status = "success"
+    try:
+        answer = await asyncio.to_thread(pre_router.answer_directly, agent, route, prompt, agent_prompt)
+    except Exception as e:
+        status, answer = "error", f"Error from {route}: {e}"
+    yield {"type": "tool_end", "tool": route, "id": tool_id, "status": status,
+           "seconds": time.perf_counter() - first_event_at}
+    yield {"type": "text", "data": answer}
+    end = time.perf_counter()
+    yield {"type": "done", "ttfb_ms": (first_event_at - start) * 1000, "total_ms": (end - start) * 1000,
+           "text": answer, "cache": None, "pre_routed": route}
+
+
+async def _routed_turn(agent, prompt, agent_prompt):
+    """Dispatch straight to a specialist when the pre-router is sure, else run the orchestrator."""
+    start = time.perf_counter()
+    router = pre_router.get_pre_router()
+    decision = None
+    if router is not None:
+        decision = await asyncio.to_thread(router.classify, prompt, bool(agent.messages))
+    if decision and decision["route"]:
+        async for event in _direct_turn(agent, decision["route"], prompt, agent_prompt, start):
+            yield event
+    else:
+        async for event in stream_agent(agent, agent_prompt):
+            yield event
+
+
+async def stream_turn(agent, prompt):
+    """One orchestrator turn, answered from the semantic cache when a close enough question was seen."""
+    cache = semantic_cache.get_semantic_cache()
+    if cache is None or agent.messages:
+        async for event in _routed_turn(agent, prompt, prompt):
+            yield event
+        return
+
+    start = time.perf_counter()
+    vector = hit = None
+    with telemetry.span("semantic_cache.lookup", **{"semantic_cache.mode": semantic_cache.SEMANTIC_CACHE_MODE}):
+        try:
+            vector = await asyncio.to_thread(cache.embed, prompt)
+            hit = await asyncio.to_thread(cache.lookup, prompt, vector)
+        except Exception as e:
+            # The cache is an optimisation; never fail a turn because embedding is unavailable
+            logger.warning("semantic cache lookup failed: %s", e)
+        telemetry.annotate(**{"semantic_cache.hit": hit is not None})
+
+    if hit and semantic_cache.SEMANTIC_CACHE_MODE == "answer":
+        pre_router.record_turn(agent, prompt, hit["answer"])
+        yield {"type": "text", "data": hit["answer"]}
+        elapsed = (time.perf_counter() - start) * 1000
+        yield {"type": "done", "ttfb_ms": elapsed, "total_ms": elapsed, "text": hit["answer"], "cache": "answer",
+               "pre_routed": None}
+        return
+
+    agent_prompt = prompt
+    if hit:
+        agent_prompt = semantic_cache.HINT_TEMPLATE.format(question=hit["question"], answer=hit["answer"], prompt=prompt)
+
+    route = None
+    async for event in _routed_turn(agent, prompt, agent_prompt):
+        if event["type"] == "tool_start" and route is None:
+            route = event["tool"]
+        if event["type"] == "done":
+            event["cache"] = "hint" if hit else None
+            if vector is not None and event["text"].strip():
+                try:
+                    await asyncio.to_thread(cache.put, prompt, event["text"], route or "orchestrator", vector)
+                except Exception as e:
+                    logger.warning("semantic cache store failed: %s", e)
+        yield event
+
+
+def run_turn(agent, prompt):
+    """Blocking form of stream_turn (same cache and pre-routing); returns the final `done` event."""
+
+    async def collect():
+        done = None
+        async for event in stream_turn(agent, prompt):
+            if event["type"] == "done":
+                done = event
+        return done
+
+    return run_in_session(collect)
+
+
+async def _render(agent, prompt, out):
+    done = None
+    async for event in stream_turn(agent, prompt):
+        if event["type"] == "text":
+            out.write(event["data"])
+        elif event["type"] == "tool_start":
+            out.write(f"\n[→ {event['tool']}]\n")
+        elif event["type"] == "tool_end":
+            mark = "✓" if event["status"] == "success" else "✗"
+            out.write(f"\n[{mark} {event['tool']} {event['seconds']:.1f}s]\n")
+        elif event["type"] == "done":
+            done = event
+        out.flush()
+    return done
+
+
+def render_turn(agent, prompt, out=sys.stdout):
+    """Stream one turn to a terminal and return the final `done` event."""
+    done = asyncio.run(_render(agent, prompt, out))
+    cached = f", {done['cache']} from semantic cache" if done.get("cache") else ""
+    routed = f", sent straight to {done['pre_routed']}" if done.get("pre_routed") else ""
+    out.write(f"\n\n(first output after {done['ttfb_ms'] / 1000:.1f}s, turn took {done['total_ms'] / 1000:.1f}s"
+              f"{cached}{routed})\n")
+    out.flush()
+    return done
@@ -0,0 +1,227 @@
+"""
+Shared, persistent TTL cache for the Tavily research tools.
+
+The literature, code researcher and web scraper agents keep asking Tavily the same
+GROMACS / Bioconductor questions. Responses are stored in SQLite keyed by the tool
+name and its normalized parameters, so a repeated lookup within the TTL is answered
+locally. The store is capped at BIOHACKER_TAVILY_CACHE_MAX responses and
+BIOHACKER_TAVILY_CACHE_MB megabytes (oldest responses go first), and expired rows are
+purged on open and then at most once per PURGE_INTERVAL_SECONDS. Import the cached
+tools from here instead of `strands_tools.tavily`:
+
+    from tavily_cache import tavily_search, tavily_extract, tavily_crawl, tavily_map
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from strands import tool
+from strands_tools import tavily
+
+import telemetry
+from settings import cache_path
+
+TAVILY_CACHE_TTL_SECONDS = float(os.environ.get("BIOHACKER_TAVILY_CACHE_TTL", str(24 * 3600)))
+TAVILY_CACHE_MAX_ENTRIES = int(os.environ.get("BIOHACKER_TAVILY_CACHE_MAX", "5000"))
+TAVILY_CACHE_MAX_BYTES = int(float(os.environ.get("BIOHACKER_TAVILY_CACHE_MB", "256")) * (1 << 20))
+PURGE_INTERVAL_SECONDS = 3600
+
+# Free-text parameters where case and spacing don't change the answer
+_TEXT_PARAMS = {"query", "instructions"}
+# Injected by strands, never part of the request
+_IGNORED_PARAMS = {"agent", "tool_context"}
+
+
+def _normalize(name, value):
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.lower() if name in _TEXT_PARAMS else value
+    if isinstance(value, (list, tuple)):
+        return [_normalize(name, v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(k, v) for k, v in value.items()}
+    return value
+
+
+def request_key(tool_name, params):
+    """Cache key for a tool call: tool name plus its normalized parameters (defaults filled in)."""
+    normalized = {
+        k: _normalize(k, v) for k, v in params.items() if k not in _IGNORED_PARAMS and v is not None
+    }
+    payload = json.dumps([tool_name, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ToolResponseCache:
+    """SQLite store of tool responses that expire after `ttl_seconds`.
+
+    Args:
+        path: database file, created if missing
+        ttl_seconds: how long a response stays fresh
+        max_entries: row cap; the oldest responses are deleted past it
+        max_bytes: cap on the total size of stored responses, enforced the same way
+    """
+
+    def __init__(self, path=None, ttl_seconds=TAVILY_CACHE_TTL_SECONDS, max_entries=TAVILY_CACHE_MAX_ENTRIES,
+                 max_bytes=TAVILY_CACHE_MAX_BYTES):
+        self.path = path or cache_path("tavily_cache.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._stats = {}
+        self._last_purge = 0.0
+        self._connect()
+        # SQLite connections must not cross fork(); forked runner sessions reopen their own
+        os.register_at_fork(after_in_child=self._connect)
+        self.purge_expired()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, tool TEXT, response TEXT, created REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        self._conn.commit()
+
+    def _count(self, tool_name, outcome):
+        counts = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+    def get(self, tool_name, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl_seconds:
+                self._count(tool_name, "misses")
+                return None
+            self._count(tool_name, "hits")
+        return json.loads(row[0])
+
+    def put(self, tool_name, key, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, tool_name, json.dumps(response, default=str), now),
+            )
+            if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._purge_expired(now)
+            self._trim()
+            self._conn.commit()
+
+    def _purge_expired(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        self._last_purge = now
+
+    def _trim(self):
+        count, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM responses"
+        ).fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        # Trim to 90% of the caps so we don't trim again on the very next insert
+        excess_rows = max(0, count - int(self.max_entries * 0.9))
+        excess_bytes = max(0, size - int(self.max_bytes * 0.9))
+        doomed, freed = [], 0
+        for key, length in self._conn.execute("SELECT key, LENGTH(response) FROM responses ORDER BY created"):
+            if len(doomed) >= excess_rows and freed >= excess_bytes:
+                break
+            doomed.append(key)
+            freed += length or 0
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in doomed])
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_expired(time.time())
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM responses"
+            ).fetchone()
+            per_tool = {name: dict(counts) for name, counts in self._stats.items()}
+        hits = sum(c["hits"] for c in per_tool.values())
+        lookups = hits + sum(c["misses"] for c in per_tool.values())
+        return {"entries": entries, "bytes": size, "hits": hits, "lookups": lookups,
+                "hit_rate": hits / lookups if lookups else 0.0, "by_tool": per_tool}
+
+
+def _cacheable(response):
+    # strands tools report failures in-band; don't pin an error for the whole TTL
+    return not (isinstance(response, dict) and response.get("status") == "error")
+
+
+def cached(fn, cache, tool_name=None):
+    """Wrap a (sync or async) function so calls are served from `cache` when fresh.
+
+    The wrapper keeps fn's signature and docstring, so it can be turned into a strands
+    tool with the same spec. `fn` can be any callable, e.g. a local fake Tavily backend.
+    """
+    name = tool_name or fn.__name__
+    signature = inspect.signature(fn)
+
+    def key_for(args, kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        return request_key(name, dict(bound.arguments))
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            with telemetry.span(name):
+                response = cache.get(name, key)
+                telemetry.annotate(**{"cache.hit": response is not None})
+                if response is None:
+                    response = await fn(*args, **kwargs)
+                    if _cacheable(response):
+                        cache.put(name, key, response)
+            return response
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            with telemetry.span(name):
+                response = cache.get(name, key)
+                telemetry.annotate(**{"cache.hit": response is not None})
+                if response is None:
+                    response = fn(*args, **kwargs)
+                    if _cacheable(response):
+                        cache.put(name, key, response)
+            return response
+
+    return wrapper
+
+
+def cached_tool(tavily_tool, cache):
+    """Cached copy of a strands @tool, with the same name and tool spec."""
+    fn = getattr(tavily_tool, "original_function", None) or getattr(tavily_tool, "_tool_func", tavily_tool)
+    return tool(cached(fn, cache))
+
+
+# One cache shared by every research agent in the process
+response_cache = ToolResponseCache()
+
+tavily_search = cached_tool(tavily.tavily_search, response_cache)
+tavily_extract = cached_tool(tavily.tavily_extract, response_cache)
+tavily_crawl = cached_tool(tavily.tavily_crawl, response_cache)
+tavily_map = cached_tool(tavily.tavily_map, response_cache)
+
+
+def stats():
+    return response_cache.stats()
@@ -0,0 +1,270 @@
+"""
+OpenTelemetry spans for orchestrator turns, sub-agents and tools.
+
+strands already emits spans for every agent invocation, model call and tool call
+(with gen_ai.* token and model attributes) to the global tracer provider. This module
+installs that provider, adds spans of our own around the pieces strands can't see
+(pooled sub-agent leases, Tavily cache hits, the semantic answer cache, embedding
+batches, conversation summarization) and keeps the spans of recent turns in memory so
+the CLI can print a latency waterfall after each answer.
+
+Export is configured with BIOHACKER_TRACE_EXPORTER:
+
+    off       (default) spans are only kept in memory for the waterfall
+    file      JSON lines appended to BIOHACKER_TRACE_FILE (default <cache dir>/traces.jsonl)
+    otlp      OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318)
+    console   pretty-printed to stderr
+
+Everything degrades to no-ops when the OpenTelemetry SDK is not installed.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from settings import cache_path
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+except ImportError:  # pragma: no cover - the SDK ships with strands-agents
+    trace = None
+    SpanProcessor = SpanExporter = object
+
+TRACE_EXPORTER = os.environ.get("BIOHACKER_TRACE_EXPORTER", "off").lower()
+TRACE_FILE = os.environ.get("BIOHACKER_TRACE_FILE") or cache_path("traces.jsonl")
+# Turns whose spans are kept in memory for waterfalls
+RECENT_TRACES = 20
+
+# Token usage keys in strands' accumulated usage, and the span attributes they map to
+USAGE_ATTRIBUTES = {
+    "inputTokens": "gen_ai.usage.input_tokens",
+    "outputTokens": "gen_ai.usage.output_tokens",
+    "cacheReadInputTokens": "gen_ai.usage.cache_read_input_tokens",
+    "cacheWriteInputTokens": "gen_ai.usage.cache_write_input_tokens",
+}
+
+
+def _span_record(span):
+    context = span.get_span_context()
+    return {
+        "name": span.name,
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+        "start_ns": span.start_time,
+        "end_ns": span.end_time,
+        "duration_ms": (span.end_time - span.start_time) / 1e6,
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+    }
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(_span_record(s), default=str) + "\n" for s in spans)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class RecentTraces(SpanProcessor):
+    """Keeps the finished spans of the last RECENT_TRACES traces, for waterfalls."""
+
+    def __init__(self, max_traces=RECENT_TRACES):
+        self.max_traces = max_traces
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span):
+        record = _span_record(span)
+        with self._lock:
+            self._traces.setdefault(record["trace_id"], []).append(record)
+            self._traces.move_to_end(record["trace_id"])
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def spans(self, trace_id):
+        with self._lock:
+            return list(self._traces.get(trace_id, ()))
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+
+_recent = None
+_setup_lock = threading.Lock()
+
+
+def setup():
+    """Install the tracer provider and exporters once per process. Safe to call repeatedly."""
+    global _recent
+    if trace is None:
+        return None
+    with _setup_lock:
+        if _recent is not None:
+            return _recent
+        provider = trace.get_tracer_provider()
+        if not hasattr(provider, "add_span_processor"):
+            # Nothing configured yet (e.g. not started under opentelemetry-instrument)
+            provider = TracerProvider(resource=Resource.create({"service.name": "biohacker"}))
+            trace.set_tracer_provider(provider)
+        _recent = RecentTraces()
+        provider.add_span_processor(_recent)
+        exporter = _make_exporter(TRACE_EXPORTER)
+        if exporter is not None:
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+        return _recent
+
+
+def _make_exporter(kind):
+    if kind == "file":
+        return JsonLinesSpanExporter(TRACE_FILE)
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("BIOHACKER_TRACE_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http")
+            return None
+        return OTLPSpanExporter()
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    return None
+
+
+def _clean(attributes):
+    # OTel attributes must be primitives (or lists of them) and never None
+    return {k: v if isinstance(v, (bool, int, float, str)) else str(v) for k, v in attributes.items() if v is not None}
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Current-context span; exceptions are recorded and mark it as an error."""
+    if trace is None:
+        yield None
+        return
+    setup()
+    with trace.get_tracer("biohacker").start_as_current_span(name, attributes=_clean(attributes)) as current:
+        yield current
+
+
+def annotate(**attributes):
+    """Set attributes on whatever span is current (e.g. the strands span of a tool call)."""
+    if trace is not None:
+        current = trace.get_current_span()
+        if current.is_recording():
+            current.set_attributes(_clean(attributes))
+
+
+def trace_id(current):
+    return format(current.get_span_context().trace_id, "032x") if current is not None else None
+
+
+def _usage(agent):
+    metrics = getattr(agent, "event_loop_metrics", None)
+    return dict(getattr(metrics, "accumulated_usage", None) or {})
+
+
+def _model_id(agent):
+    config = getattr(getattr(agent, "model", None), "config", None) or {}
+    return config.get("model_id")
+
+
+@contextlib.contextmanager
+def agent_span(name, agent, **attributes):
+    """Span around one use of a (possibly pooled) agent, with the tokens that use consumed."""
+    before = _usage(agent)
+    with span(name, **{"gen_ai.agent.name": name, "gen_ai.request.model": _model_id(agent)}, **attributes) as current:
+        try:
+            yield current
+        finally:
+            if current is not None:
+                after = _usage(agent)
+                current.set_attributes({attr: after.get(key, 0) - before.get(key, 0)
+                                        for key, attr in USAGE_ATTRIBUTES.items() if key in after})
+
+
+def instrument_method(obj, method_name, span_name):
+    """Wrap obj.method_name in a span, e.g. a conversation manager's reduce_context."""
+    original = getattr(obj, method_name)
+
+    def wrapper(*args, **kwargs):
+        with span(span_name):
+            return original(*args, **kwargs)
+
+    setattr(obj, method_name, wrapper)
+    return obj
+
+
+# -- waterfall ---------------------------------------------------------------
+
+def _label(record):
+    attrs = record["attributes"]
+    parts = []
+    model = attrs.get("gen_ai.request.model")
+    if model:
+        parts.append(str(model).split(".")[-1].split(":")[0])
+    tokens_in, tokens_out = attrs.get("gen_ai.usage.input_tokens"), attrs.get("gen_ai.usage.output_tokens")
+    if tokens_in or tokens_out:
+        parts.append(f"{tokens_in or 0}→{tokens_out or 0} tok")
+    if attrs.get("gen_ai.usage.cache_read_input_tokens"):
+        parts.append(f"{attrs['gen_ai.usage.cache_read_input_tokens']} cached tok")
+    for key in ("cache.hit", "semantic_cache.hit"):
+        if key in attrs:
+            parts.append("cache hit" if attrs[key] else "cache miss")
+    if record["status"] == "ERROR":
+        parts.append("ERROR")
+    return f"  [{', '.join(parts)}]" if parts else ""
+
+
+def waterfall(trace_id_hex, width=30):
+    """Text waterfall of one trace: offset, duration, a bar, and the span tree."""
+    records = _recent.spans(trace_id_hex) if _recent is not None and trace_id_hex else []
+    if not records:
+        return "(no spans recorded for this turn)"
+    start = min(r["start_ns"] for r in records)
+    total = max(max(r["end_ns"] for r in records) - start, 1)
+    children = {}
+    for r in sorted(records, key=lambda r: r["start_ns"]):
+        children.setdefault(r["parent_id"], []).append(r)
+    known = {r["span_id"] for r in records}
+    roots = [r for r in records if r["parent_id"] not in known]
+
+    lines = [f"{'start':>8} {'took':>8}  {'':{width}}  span"]
+
+    def walk(record, depth):
+        offset = (record["start_ns"] - start) / total
+        length = max((record["end_ns"] - record["start_ns"]) / total, 1 / width)
+        bar = " " * int(offset * width) + "█" * max(1, round(length * width))
+        lines.append(f"{(record['start_ns'] - start) / 1e9:>7.2f}s {record['duration_ms'] / 1000:>7.2f}s  "
+                     f"{bar[:width]:{width}}  {'  ' * depth}{record['name']}{_label(record)}")
+        for child in children.get(record["span_id"], []):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda r: r["start_ns"]):
+        walk(root, 0)
+    return "\n".join(lines)
@@ -0,0 +1,273 @@
+"""
+Incremental, streaming ingestion of the uploads directory into the knowledge index.
+
+Users drop papers and notes into UPLOAD_DIR (./uploads when unset). `ingest_uploads`
+walks it and only touches what changed since the last run:
+
+    unchanged   same size and mtime as the manifest says -> skipped without reading
+    touched     mtime moved but the content hash matches -> manifest updated only
+    changed     old chunks for the file are deleted, the new ones streamed in
+    removed     file gone from disk -> its chunks are deleted
+
+Files are read page by page (PDF) or block by block (text) and chunks are embedded in
+bounded batches, so memory stays flat however large a single file is.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from strands import tool
+
+import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+PDF_SUFFIXES = {".pdf"}
+TEXT_SUFFIXES = {".txt", ".md", ".markdown", ".rst", ".tex"}
+# Chunks embedded and written per batch, and text read per block from plain-text files
+INGEST_BATCH = int(os.environ.get("BIOHACKER_INGEST_BATCH", "64"))
+TEXT_BLOCK_CHARS = 64 * 1024
+# pypdf caches every object it resolves; a fresh reader every N pages caps that
+PDF_PAGES_PER_READER = 50
+
+
+def upload_dir():
+    # Read per call: the fork server hands each session its own UPLOAD_DIR
+    return os.path.abspath(os.environ.get("UPLOAD_DIR") or "./uploads")
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pdf_pages(path):
+    """Yield (page number, text) one page at a time."""
+    from pypdf import PdfReader
+
+    start = 0
+    while True:
+        with open(path, "rb") as f:
+            reader = PdfReader(f)
+            total = len(reader.pages)
+            end = min(start + PDF_PAGES_PER_READER, total)
+            for number in range(start, end):
+                yield number + 1, reader.pages[number].extract_text() or ""
+        if end >= total:
+            return
+        start = end
+
+
+def iter_text_blocks(path):
+    """Yield (block number, text) in blocks of at most TEXT_BLOCK_CHARS, ending at a line end where possible."""
+    rest, number = "", 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        # Fixed-size reads: a file without newlines must not be read whole
+        for data in iter(lambda: f.read(TEXT_BLOCK_CHARS - len(rest)), ""):
+            block = rest + data
+            cut = block.rfind("\n") + 1 or len(block)
+            block, rest = block[:cut], block[cut:]
+            number += 1
+            yield number, block
+    if rest:
+        yield number + 1, rest
+
+
+def iter_file_chunks(path, source, split_text, overlap):
+    """Stream Documents for one file; each page/block is prefixed with the tail of the previous one."""
+    from langchain_core.documents import Document
+
+    pages = iter_pdf_pages(path) if os.path.splitext(path)[1].lower() in PDF_SUFFIXES else iter_text_blocks(path)
+    carry = ""
+    for number, text in pages:
+        if not text.strip():
+            continue
+        for chunk in split_text(carry + text):
+            yield Document(page_content=chunk, metadata={"source": source, "title": os.path.basename(path), "page": number})
+        carry = text[-overlap:] if overlap else ""
+
+
+class UploadsManifest:
+    """Size/mtime/hash of every ingested upload, so unchanged files are never reopened."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " content_hash TEXT, chunks INTEGER, ingested REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, source):
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, content_hash FROM files WHERE source = ?", (source,)).fetchone()
+        return row
+
+    def put(self, source, size, mtime_ns, content_hash, chunks=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(source) DO UPDATE SET size = excluded.size,"
+                " mtime_ns = excluded.mtime_ns, content_hash = excluded.content_hash,"
+                " chunks = COALESCE(excluded.chunks, files.chunks), ingested = excluded.ingested",
+                (source, size, mtime_ns, content_hash, chunks, time.time()),
+            )
+            self._conn.commit()
+
+    def remove(self, source):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def sources(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT source FROM files")]
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(index):
+    """The uploads manifest kept next to `index`, opened once per index path."""
+    path = os.path.join(index.path, "uploads.sqlite3")
+    with _manifests_lock:
+        if path not in _manifests:
+            _manifests[path] = UploadsManifest(path)
+        return _manifests[path]
+
+
+def _ingest_file(path, source, index, deduplicator, report):
+    from langchain_text_splitters import CharacterTextSplitter
+
+    import memory_agent
+
+    splitter = CharacterTextSplitter(chunk_size=memory_agent.CHUNK_SIZE, chunk_overlap=memory_agent.CHUNK_OVERLAP,
+                                     separator="\n")
+    chunks = 0
+    batch = []
+
+    def flush():
+        kept, dedup_report = deduplicator.deduplicate(batch, index)
+        index.add_documents(kept)
+        for key in ("chunks", "exact_duplicates", "near_duplicates", "embeddings_avoided"):
+            report[key] += dedup_report[key]
+        report["added"] += len(kept)
+        batch.clear()
+
+    for doc in iter_file_chunks(path, source, splitter.split_text, memory_agent.CHUNK_OVERLAP):
+        batch.append(doc)
+        chunks += 1
+        if len(batch) >= INGEST_BATCH:
+            flush()
+    if batch:
+        flush()
+    return chunks
+
+
+def ingest_uploads(directory=None, index=None):
+    """Bring the knowledge index in line with the uploads directory.
+
+    Args:
+        directory: folder to scan, defaults to UPLOAD_DIR
+        index: KnowledgeIndex to write to, defaults to memory_agent.load()
+
+    Returns:
+        dict summarising what was scanned, re-indexed, removed and embedded
+    """
+    import memory_agent
+
+    directory = directory or upload_dir()
+    index = memory_agent.load() if index is None else index
+    deduplicator = memory_agent.get_deduplicator(index)
+    manifest = get_manifest(index)
+    report = {"scanned": 0, "unchanged": 0, "touched": 0, "ingested": 0, "removed": 0, "skipped": 0, "failed": 0,
+              "chunks": 0, "exact_duplicates": 0, "near_duplicates": 0, "embeddings_avoided": 0, "added": 0}
+    on_disk = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in PDF_SUFFIXES | TEXT_SUFFIXES:
+                report["skipped"] += 1
+                continue
+            on_disk["upload:" + os.path.relpath(path, directory)] = path
+
+    def drop(source):
+        # Chunks of `source` may have absorbed duplicates from other uploads; once they are
+        # gone those uploads have to be read again or their copies would be lost
+        merged = deduplicator.merged_sources(index.ids_for_source(source))
+        index.delete_source(source)
+        for other in merged & set(on_disk):
+            if other != source and manifest.get(other):
+                manifest.remove(other)
+                if other not in queue:
+                    queue.append(other)
+
+    queue = list(on_disk)
+    for source in set(manifest.sources()) - set(on_disk):
+        drop(source)
+        manifest.remove(source)
+        report["removed"] += 1
+
+    while queue:
+        source = queue.pop(0)
+        path = on_disk[source]
+        report["scanned"] += 1
+        try:
+            st = os.stat(path)
+            known = manifest.get(source)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                report["unchanged"] += 1
+                continue
+            digest = file_hash(path)
+            if known and known[2] == digest and index.has_source(source, digest):
+                manifest.put(source, st.st_size, st.st_mtime_ns, digest)
+                report["touched"] += 1
+                continue
+            drop(source)
+            chunks = _ingest_file(path, source, index, deduplicator, report)
+            index.mark_source(source, digest)
+            manifest.put(source, st.st_size, st.st_mtime_ns, digest, chunks)
+            report["ingested"] += 1
+        except Exception as e:
+            # One unreadable file must not stop the rest; it is retried on the next run
+            logger.warning("could not ingest %s: %s", path, e)
+            manifest.remove(source)
+            report["failed"] += 1
+
+    report["index_size"] = len(index)
+    if report["ingested"] or report["removed"]:
+        report["answers_invalidated"] = semantic_cache.knowledge_changed()
+    logger.info("uploads ingest of %s: %s", directory, report)
+    return report
+
+
+@tool
+def index_uploads() -> str:
+    """
+    Index new or changed files (PDF, txt, md) from the uploads folder into the knowledge base so they
+    can be searched with similarity_search. Unchanged files are skipped, deleted files are removed.
+
+    Returns:
+        str: a summary of what was indexed
+    """
+    try:
+        report = ingest_uploads()
+        return (f"Indexed {report['ingested']} new or changed file(s) ({report['added']} chunks), "
+                f"removed {report['removed']}, {report['unchanged'] + report['touched']} unchanged, "
+                f"{report['failed']} failed. Knowledge base now holds {report['index_size']} chunks.")
+    except Exception as e:
+        return f"Error indexing uploads: {str(e)}"
@@ -0,0 +1,564 @@
+"""
+Disk-backed, incrementally updatable vector index for the knowledge base.
+
+Layout of an index directory:
+    vectors.f32   append-only float32 matrix (one L2-normalized row per chunk), memory-mapped
+    docs.sqlite3  chunk text/metadata, the row ("slot") each chunk's vector lives in, and
+                  the source documents the index already holds
+
+    ivf.npz       coarse k-means partition of the slots (inverted lists), once the index
+    ivf.f32       holds IVF_MIN_VECTORS chunks, and a copy of the vectors in list order
+
+Adding chunks appends to both files, so the cost is proportional to the new chunks
+rather than the corpus. Deleting a chunk drops its row and leaves a dead slot behind;
+dead slots are reclaimed by `compact()` once they make up a large share of the file.
+
+`nearest` scores every vector while the index (or the filtered subset) is small. Past
+IVF_MIN_VECTORS it scores only the IVF_NPROBE inverted lists whose centroids are closest
+to the query, plus the slots appended since the lists were built, so its cost grows
+with about the square root of the corpus. The lists are rebuilt when appended slots
+reach IVF_REBUILD_RATIO of them, and after a compaction renumbers the slots.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from settings import cache_path
+
+# Rewrite vectors.f32 once this share of its rows belong to deleted chunks
+COMPACT_DEAD_RATIO = 0.3
+# Approximate (IVF) search from this many chunks on; below it every vector is scored
+IVF_MIN_VECTORS = int(os.environ.get("BIOHACKER_KB_IVF_MIN", "50000"))
+# Inverted lists scored per query
+IVF_NPROBE = int(os.environ.get("BIOHACKER_KB_IVF_NPROBE", "32"))
+# Rebuild the lists once slots appended after the build reach this share of them
+IVF_REBUILD_RATIO = 0.2
+IVF_TRAIN_ITERATIONS = 8
+# Metadata updates remembered for derived indexes; one that falls further behind rebuilds
+METADATA_LOG_ENTRIES = 256
+
+
+def chunk_id(source, text):
+    """Content-addressed chunk ID, so re-adding an identical chunk is a no-op."""
+    return hashlib.sha1(f"{source}\0{text}".encode("utf-8")).hexdigest()[:20]
+
+
+def _nearest_centroid(vectors, centroids, batch=16384):
+    return np.concatenate([np.argmax(vectors[i:i + batch] @ centroids.T, axis=1)
+                           for i in range(0, len(vectors), batch)] or [np.empty(0, dtype=np.int64)])
+
+
+class _InvertedLists:
+    """Spherical k-means partition of the slots: `slots[offsets[i]:offsets[i + 1]]` is list i.
+
+    Each list's vectors are copied next to each other in `<path>.f32`, so probing a list
+    reads one contiguous block instead of gathering rows from all over vectors.f32.
+    """
+
+    def __init__(self, centroids, offsets, slots, built_slots, generation, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.slots = slots
+        self.built_slots = int(built_slots)
+        self.generation = int(generation)
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, path, vectors, live, built_slots, generation, seed=0):
+        rng = np.random.default_rng(seed)
+        n_lists = int(np.clip(np.sqrt(len(live)), 16, 4096))
+        # Trained on a sample; 64 points a list is plenty for centroids
+        sample = np.sort(rng.choice(live, size=min(len(live), 64 * n_lists), replace=False))
+        train = np.asarray(vectors[sample])
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assign = _nearest_centroid(train, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)))[filled]
+            centroids[filled] = np.add.reduceat(train[order], starts, axis=0)
+            # An empty list restarts from a random training point
+            empty = np.flatnonzero(counts == 0)
+            centroids[empty] = train[rng.choice(len(train), len(empty))]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assign = np.concatenate([_nearest_centroid(np.asarray(vectors[live[i:i + 65536]]), centroids)
+                                 for i in range(0, len(live), 65536)])
+        slots = live[np.argsort(assign, kind="stable")]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists))))
+
+        tmp = path + ".f32.tmp"
+        copy = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(slots), vectors.shape[1]))
+        for i in range(0, len(slots), 65536):
+            copy[i:i + 65536] = vectors[slots[i:i + 65536]]
+        copy.flush()
+        del copy
+        os.replace(tmp, path + ".f32")
+        tmp = path + ".npz.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=centroids, offsets=offsets, slots=slots,
+                     built_slots=built_slots, generation=generation)
+        os.replace(tmp, path + ".npz")
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        """Lists saved at `path`; ValueError if the two files don't belong together."""
+        with np.load(path + ".npz") as data:
+            arrays = [data[name] for name in ("centroids", "offsets", "slots", "built_slots", "generation")]
+        vectors = np.load(path + ".f32", mmap_mode="r")
+        if len(vectors) != len(arrays[2]):
+            raise ValueError(f"{path}: list vectors don't match the list slots")
+        return cls(*arrays, vectors)
+
+    def probe(self, query, n_probe):
+        """(slots, scores) for every vector in the `n_probe` lists whose centroids are closest to `query`."""
+        n_probe = min(n_probe, len(self.centroids))
+        probe = np.sort(np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe])
+        ranges = [(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        slots = np.concatenate([self.slots[a:b] for a, b in ranges])
+        scores = np.concatenate([self.vectors[a:b] @ query for a, b in ranges])
+        return slots, scores
+
+
+class KnowledgeIndex:
+    """Persistent vector index with add/delete/upsert by chunk ID.
+
+    Nothing is read from disk until the first search or write.
+
+    Args:
+        path: index directory, created if missing
+        embed_fn: callable mapping a list of texts to a (n, dim) float matrix
+    """
+
+    def __init__(self, path=None, embed_fn=None):
+        self.path = path or os.path.dirname(cache_path("knowledge_index", "docs.sqlite3"))
+        os.makedirs(self.path, exist_ok=True)
+        self.embed_fn = embed_fn
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._ivf_path = os.path.join(self.path, "ivf")
+        self._ivf = None
+        self._live_mask_array = None
+        self._lock = threading.RLock()
+        self._conn = None
+        self._dim = None
+        self._matrix = None
+        self._live = None
+        # Bumped on every write / every compaction, so derived indexes (e.g. BM25) know to refresh
+        self.version = 0
+        self.layout_version = 0
+        # (version, slots) of recent metadata updates, which leave the set of slots unchanged
+        self._metadata_log = []
+        self._metadata_log_floor = 0
+        # SQLite connections must not cross fork(); reopen lazily in the child
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.RLock()
+        self._conn = None
+        self._invalidate()
+
+    # -- storage ---------------------------------------------------------
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "docs.sqlite3"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    doc_id TEXT PRIMARY KEY, slot INTEGER UNIQUE, source TEXT, text TEXT, metadata TEXT);
+                CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+                CREATE TABLE IF NOT EXISTS sources (
+                    source TEXT PRIMARY KEY, content_hash TEXT, chunks INTEGER, updated REAL);
+                """
+            )
+            row = conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            self._dim = int(row[0]) if row else None
+            self._conn = conn
+        return self._conn
+
+    def _slots_used(self):
+        if self._dim is None or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (4 * self._dim)
+
+    def _vectors(self):
+        """Memory-mapped view of every slot (live or dead), reopened after writes."""
+        if self._matrix is None:
+            n = self._slots_used()
+            if n == 0:
+                return np.empty((0, self._dim or 0), dtype=np.float32)
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n, self._dim))
+        return self._matrix
+
+    def _live_slots(self):
+        if self._live is None:
+            rows = self._db().execute("SELECT slot FROM chunks ORDER BY slot").fetchall()
+            self._live = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        return self._live
+
+    def _live_mask(self):
+        """Boolean array over every slot, True where the slot holds a live chunk."""
+        if self._live_mask_array is None:
+            mask = np.zeros(self._slots_used(), dtype=bool)
+            mask[self._live_slots()] = True
+            self._live_mask_array = mask
+        return self._live_mask_array
+
+    def _generation(self):
+        """Number of compactions the index has had; inverted lists from another generation are stale."""
+        row = self._db().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _inverted_lists(self):
+        """Current IVF lists, loaded or (re)built as needed; None below IVF_MIN_VECTORS live chunks."""
+        live = self._live_slots()
+        if len(live) < IVF_MIN_VECTORS:
+            return None
+        used, generation = self._slots_used(), self._generation()
+        ivf = self._ivf
+        if ivf is None and os.path.exists(self._ivf_path + ".npz"):
+            try:
+                ivf = _InvertedLists.load(self._ivf_path)
+            except (OSError, ValueError, KeyError):
+                ivf = None
+        if ivf is not None and (ivf.generation != generation or ivf.built_slots > used
+                                or used - ivf.built_slots > IVF_REBUILD_RATIO * ivf.built_slots):
+            ivf = None
+        if ivf is None:
+            # Built under the index lock: writers wait for it, about a second per 100k chunks
+            ivf = _InvertedLists.build(self._ivf_path, self._vectors(), live, used, generation)
+        self._ivf = ivf
+        return ivf
+
+    def _invalidate(self):
+        self._matrix = None
+        self._live = None
+        self._live_mask_array = None
+        self.version += 1
+
+    # -- writes ----------------------------------------------------------
+
+    def _embed(self, texts):
+        if self.embed_fn is None:
+            raise ValueError("KnowledgeIndex needs an embed_fn to add or search")
+        matrix = np.asarray(self.embed_fn(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _append(self, ids, texts, metadatas, matrix):
+        conn = self._db()
+        if self._dim is None:
+            self._dim = matrix.shape[1]
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self._dim),))
+        elif matrix.shape[1] != self._dim:
+            raise ValueError(f"embedding dim {matrix.shape[1]} does not match index dim {self._dim}")
+        first_slot = self._slots_used()
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(matrix).tobytes())
+        conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+            [
+                (doc_id, first_slot + i, meta.get("source"), text, json.dumps(meta, default=str))
+                for i, (doc_id, text, meta) in enumerate(zip(ids, texts, metadatas))
+            ],
+        )
+
+    def _touch_sources(self, sources):
+        conn = self._db()
+        now = time.time()
+        for source in set(sources):
+            if source is None:
+                continue
+            (count,) = conn.execute("SELECT COUNT(*) FROM chunks WHERE source = ?", (source,)).fetchone()
+            conn.execute(
+                "INSERT INTO sources VALUES (?, NULL, ?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET chunks = excluded.chunks, updated = excluded.updated",
+                (source, count, now),
+            )
+
+    def add_texts(self, texts, metadatas=None, ids=None, replace=False):
+        """Embed and store texts.
+
+        Args:
+            texts: chunk texts
+            metadatas: one dict per text; "source" is used to track source documents
+            ids: chunk IDs, defaults to a hash of source + text
+            replace: overwrite chunks whose ID already exists (upsert) instead of skipping them
+
+        Returns:
+            IDs of the chunks that were embedded and written
+        """
+        texts = list(texts)
+        metadatas = [dict(m or {}) for m in (metadatas or [{}] * len(texts))]
+        ids = list(ids) if ids is not None else [chunk_id(m.get("source"), t) for t, m in zip(texts, metadatas)]
+        with self._lock:
+            conn = self._db()
+            existing = set()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                existing.update(
+                    r[0] for r in conn.execute(
+                        f"SELECT doc_id FROM chunks WHERE doc_id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+            if replace and existing:
+                self._delete_rows(existing)
+                existing = set()
+
+            # Drop chunks already in the index and duplicates within this batch
+            seen = set(existing)
+            todo = []
+            for i, doc_id in enumerate(ids):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    todo.append(i)
+            if todo:
+                new_texts = [texts[i] for i in todo]
+                self._append([ids[i] for i in todo], new_texts, [metadatas[i] for i in todo], self._embed(new_texts))
+            self._touch_sources(metadatas[i].get("source") for i in todo)
+            conn.commit()
+            self._invalidate()
+            return [ids[i] for i in todo]
+
+    def add_documents(self, documents, ids=None):
+        """Add LangChain Documents, skipping chunks the index already holds."""
+        documents = list(documents)
+        return self.add_texts([d.page_content for d in documents], [d.metadata for d in documents], ids)
+
+    def upsert_documents(self, documents, ids=None):
+        """Add LangChain Documents, replacing chunks with the same ID."""
+        documents = list(documents)
+        return self.add_texts([d.page_content for d in documents], [d.metadata for d in documents], ids, replace=True)
+
+    def existing_ids(self, ids):
+        """Subset of `ids` currently stored in the index."""
+        ids = list(ids)
+        found = set()
+        with self._lock:
+            conn = self._db()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                found.update(
+                    r[0] for r in conn.execute(
+                        f"SELECT doc_id FROM chunks WHERE doc_id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+        return found
+
+    def ids_for_source(self, source):
+        """IDs of every chunk stored for `source`."""
+        with self._lock:
+            return [r[0] for r in self._db().execute("SELECT doc_id FROM chunks WHERE source = ?", (source,))]
+
+    def update_metadata(self, updates):
+        """Merge metadata into stored chunks without re-embedding them.
+
+        Args:
+            updates: {doc_id: dict of metadata keys to set}
+        """
+        with self._lock:
+            conn = self._db()
+            slots = set()
+            for doc_id, changes in updates.items():
+                row = conn.execute("SELECT slot, metadata FROM chunks WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is not None:
+                    meta = {**json.loads(row[1]), **changes}
+                    conn.execute("UPDATE chunks SET metadata = ? WHERE doc_id = ?", (json.dumps(meta, default=str), doc_id))
+                    slots.add(row[0])
+            conn.commit()
+            self._invalidate()
+            self._metadata_log.append((self.version, slots))
+            if len(self._metadata_log) > METADATA_LOG_ENTRIES:
+                self._metadata_log_floor = self._metadata_log.pop(0)[0]
+
+    def metadata_changes(self, since):
+        """Slots whose metadata was updated after `since` (a `version`); None if that is too far back."""
+        with self._lock:
+            if since < self._metadata_log_floor:
+                return None
+            return set().union(*(slots for version, slots in self._metadata_log if version > since))
+
+    def _delete_rows(self, ids):
+        conn = self._db()
+        ids = list(ids)
+        sources = set()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            sources.update(r[0] for r in conn.execute(f"SELECT DISTINCT source FROM chunks WHERE doc_id IN ({marks})", batch))
+            conn.execute(f"DELETE FROM chunks WHERE doc_id IN ({marks})", batch)
+        self._touch_sources(sources)
+
+    def delete(self, ids):
+        """Remove chunks by ID."""
+        with self._lock:
+            self._delete_rows(ids)
+            self._db().commit()
+            self._invalidate()
+            self._maybe_compact()
+
+    def delete_source(self, source):
+        """Remove every chunk that came from `source` and forget the source."""
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+            conn.commit()
+            self._invalidate()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        total = self._slots_used()
+        if total and 1 - len(self._live_slots()) / total > COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite vectors.f32 without dead slots."""
+        with self._lock:
+            conn = self._db()
+            live = self._live_slots()
+            if len(live) == self._slots_used():
+                return
+            vectors = self._vectors()
+            tmp = self._vectors_path + ".tmp"
+            with open(tmp, "wb") as f:
+                for start in range(0, len(live), 4096):
+                    f.write(np.ascontiguousarray(vectors[live[start:start + 4096]]).tobytes())
+            # Slot order is preserved, so a chunk's new slot is its rank among live slots
+            conn.executemany("UPDATE chunks SET slot = ? WHERE slot = ?", [(-1 - i, int(s)) for i, s in enumerate(live)])
+            conn.execute("UPDATE chunks SET slot = -1 - slot")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(self._generation() + 1),))
+            self._matrix = None
+            self._ivf = None
+            os.replace(tmp, self._vectors_path)
+            conn.commit()
+            self.layout_version += 1
+            self._invalidate()
+
+    # -- sources ---------------------------------------------------------
+
+    def mark_source(self, source, content_hash):
+        """Record the content hash a source was ingested at."""
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT INTO sources VALUES (?, ?, 0, ?) "
+                "ON CONFLICT(source) DO UPDATE SET content_hash = excluded.content_hash, updated = excluded.updated",
+                (source, content_hash, time.time()),
+            )
+            self._touch_sources([source])
+            conn.commit()
+
+    def has_source(self, source, content_hash=None):
+        """Whether `source` is already indexed (at `content_hash`, if given)."""
+        with self._lock:
+            row = self._db().execute("SELECT content_hash FROM sources WHERE source = ?", (source,)).fetchone()
+        return row is not None and (content_hash is None or row[0] == content_hash)
+
+    def sources(self):
+        with self._lock:
+            rows = self._db().execute("SELECT source, content_hash, chunks, updated FROM sources").fetchall()
+        return [dict(zip(("source", "content_hash", "chunks", "updated"), r)) for r in rows]
+
+    # -- reads -----------------------------------------------------------
+
+    def __len__(self):
+        with self._lock:
+            return len(self._live_slots())
+
+    def live_slots(self):
+        """Slots of every chunk currently in the index."""
+        with self._lock:
+            return self._live_slots()
+
+    def get_documents(self, slots):
+        """Documents stored in the given vector slots, in the same order."""
+        slots = [int(s) for s in slots]
+        if not slots:
+            return []
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT slot, doc_id, text, metadata FROM chunks WHERE slot IN ({','.join('?' * len(slots))})", slots
+            ).fetchall()
+        by_slot = {slot: Document(page_content=text, metadata={**json.loads(meta), "id": doc_id})
+                   for slot, doc_id, text, meta in rows}
+        return [by_slot[s] for s in slots if s in by_slot]
+
+    def vector_scores(self, query_vector, slots=None):
+        """Cosine similarity of `query_vector` against live slots (or the given subset).
+
+        Returns:
+            (slots, scores) arrays
+        """
+        with self._lock:
+            live = self._live_slots() if slots is None else np.asarray(slots, dtype=np.int64)
+            vectors = self._vectors()
+            if len(live) == 0:
+                return live, np.empty(0, dtype=np.float32)
+            q = np.asarray(query_vector, dtype=np.float32)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            # With no dead slots the whole memmap can be scored without a gather copy
+            if slots is None and len(live) == len(vectors):
+                return live, np.asarray(vectors @ q)
+            return live, vectors[live] @ q
+
+    def nearest(self, query_vector, k, slots=None, n_probe=IVF_NPROBE):
+        """The k live slots (within `slots`, if given) most similar to `query_vector`.
+
+        Exact while fewer than IVF_MIN_VECTORS slots are searched; approximate (IVF) beyond.
+
+        Args:
+            query_vector: query embedding
+            k: number of slots wanted
+            slots: sorted array of permitted slots, or None for all
+            n_probe: inverted lists scored in the approximate case
+
+        Returns:
+            slot-sorted (slots, scores) arrays of at most k entries
+        """
+        with self._lock:
+            size = len(self._live_slots()) if slots is None else len(slots)
+            ivf = self._inverted_lists() if size >= IVF_MIN_VECTORS else None
+            if ivf is None:
+                candidates, scores = self.vector_scores(query_vector, slots)
+            else:
+                q = np.asarray(query_vector, dtype=np.float32)
+                q = q / max(float(np.linalg.norm(q)), 1e-12)
+                # Probed lists plus everything appended since they were built
+                candidates, scores = ivf.probe(q, n_probe)
+                tail = np.arange(ivf.built_slots, self._slots_used(), dtype=np.int64)
+                candidates = np.concatenate((candidates, tail))
+                scores = np.concatenate((scores, self._vectors()[tail] @ q))
+                keep = self._live_mask()[candidates]
+                if slots is not None:
+                    pos = np.clip(np.searchsorted(slots, candidates), 0, len(slots) - 1)
+                    keep &= slots[pos] == candidates
+                candidates, scores = candidates[keep], scores[keep]
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(candidates[top])]
+        return candidates[top], scores[top]
+
+    def embed_query(self, query):
+        return self._embed([query])[0]
+
+    def similarity_search_with_score(self, query, k=4):
+        slots, scores = self.nearest(self.embed_query(query), k)
+        if len(scores) == 0:
+            return []
+        top = np.argsort(-scores)
+        docs = self.get_documents(slots[top])
+        return list(zip(docs, scores[top].tolist()))
+
+    def similarity_search(self, query, k=4):
+        """Drop-in for `FAISS.similarity_search`."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
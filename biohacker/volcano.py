@@ -0,0 +1,229 @@
+"""
+Volcano plots of differential-expression results, without R.
+
+volcano_plot.R starts R, loads the whole table and hands every point to ggplot2, so a
+genome-wide result (or a million-row transcript / peak / CpG table) takes tens of
+seconds and its memory grows with the input. `volcano()` streams the table instead:
+
+    read        cleaning_engine.read_chunks, only the fold-change / p-value / label
+                columns, BIOHACKER_VOLCANO_CHUNK_ROWS rows at a time (CSV/TSV/Parquet)
+    compute     -log10 p and the up / down / not-significant split, vectorized per chunk
+    downsample  significant points are all kept; the non-significant bulk keeps one
+                point per grid cell (CELLS_PER_THRESHOLD cells per fold-change and
+                per -log10 p threshold), which is below what a point can show at
+                plot resolution, so memory is bounded by the plot, not the table
+    render      one rasterized matplotlib scatter per class, styled like the R script
+
+Counts in the legend and the report are always the full counts.
+"""
+
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+from strands import tool
+
+import telemetry
+from cleaning_engine import read_chunks
+
+CHUNK_ROWS = int(os.environ.get("BIOHACKER_VOLCANO_CHUNK_ROWS", "250000"))
+CELLS_PER_THRESHOLD = int(os.environ.get("BIOHACKER_VOLCANO_CELLS", "50"))
+
+# Recognised column names, most specific first (DESeq2, edgeR, limma, Seurat, generic)
+FC_COLUMNS = ("log2FoldChange", "log2FC", "logFC", "avg_log2FC", "avg_logFC", "log2_fold_change", "lfc")
+P_COLUMNS = ("padj", "p_val_adj", "adj.P.Val", "FDR", "qvalue", "q_value", "pvalue", "PValue", "P.Value",
+             "p_val", "pval", "p_value")
+LABEL_COLUMNS = ("gene_name", "gene_symbol", "symbol", "SYMBOL", "gene", "Gene", "gene_id", "feature", "name")
+COLORS = {"Down-regulated": "blue", "Not Significant": "grey", "Up-regulated": "red"}
+
+
+def _header(path):
+    for chunk in read_chunks(path, chunk_rows=1):
+        return list(chunk.columns)
+    return []
+
+
+def _pick(columns, requested, candidates, what):
+    if requested:
+        if requested not in columns:
+            raise ValueError(f"column {requested!r} not in the table (columns: {', '.join(columns[:20])})")
+        return requested
+    lowered = {c.lower(): c for c in columns}
+    for candidate in candidates:
+        if candidate.lower() in lowered:
+            return lowered[candidate.lower()]
+    if what is None:
+        return None
+    raise ValueError(f"no {what} column found; pass it explicitly (columns: {', '.join(columns[:20])})")
+
+
+class _Points:
+    """Points to draw: every significant one, and one per grid cell of the non-significant bulk."""
+
+    def __init__(self, cell_x, cell_y, label_top):
+        self.cell_x, self.cell_y = cell_x, cell_y
+        self.label_top = label_top
+        self.up, self.down = [], []
+        self.bulk_ids = np.empty(0, dtype=np.int64)
+        self.bulk = np.empty((0, 2), dtype=np.float32)
+        self.labels = []  # (y, x, label) of the most significant points
+        self.capped = []  # (fold change, up, down) of points with p = 0
+        self.max_y = 0.0
+        self.counts = {"rows": 0, "up": 0, "down": 0, "not_significant": 0, "missing": 0, "p_zero": 0}
+
+    def add(self, fc, p, labels, fc_threshold, p_threshold):
+        valid = np.isfinite(fc) & np.isfinite(p)
+        self.counts["rows"] += len(fc)
+        self.counts["missing"] += int((~valid).sum())
+        fc, p = fc[valid], np.clip(p[valid], 0, 1)
+        zero = p == 0
+        self.counts["p_zero"] += int(zero.sum())
+        # p = 0 (underflow in the DE tool) would sit at infinity; it is drawn just above the top point instead
+        y = np.full(len(p), np.inf)
+        y[~zero] = -np.log10(p[~zero])
+        if (~zero).any():
+            self.max_y = max(self.max_y, float(y[~zero].max()))
+        significant = p < p_threshold
+        up = significant & (fc > fc_threshold)
+        down = significant & (fc < -fc_threshold)
+        rest = ~(up | down)
+        self.counts["up"] += int(up.sum())
+        self.counts["down"] += int(down.sum())
+        self.counts["not_significant"] += int(rest.sum())
+        if zero.any():
+            self.capped.append((fc[zero], up[zero], down[zero]))
+            up, down, rest = up & ~zero, down & ~zero, rest & ~zero
+        self.up.append(np.column_stack((fc[up], y[up])).astype(np.float32))
+        self.down.append(np.column_stack((fc[down], y[down])).astype(np.float32))
+        self._add_bulk(fc[rest], y[rest])
+        if self.label_top and labels is not None:
+            self._add_labels(fc, y, up | down, labels[valid])
+
+    def _add_bulk(self, x, y):
+        if not len(x):
+            return
+        ix = np.floor(x / self.cell_x).astype(np.int64) + (1 << 31)
+        iy = np.floor(y / self.cell_y).astype(np.int64)
+        ids, first = np.unique((ix << 32) | iy, return_index=True)
+        # Cells already seen keep their point: earlier entries win in np.unique's return_index
+        ids = np.concatenate((self.bulk_ids, ids))
+        points = np.concatenate((self.bulk, np.column_stack((x[first], y[first])).astype(np.float32)))
+        self.bulk_ids, keep = np.unique(ids, return_index=True)
+        self.bulk = points[keep]
+
+    def _add_labels(self, x, y, significant, labels):
+        candidates = np.flatnonzero(significant)
+        if len(candidates) > self.label_top:
+            candidates = candidates[np.argpartition(-y[candidates], self.label_top)[:self.label_top]]
+        self.labels.extend((float(y[i]), float(x[i]), str(labels[i])) for i in candidates)
+        self.labels = sorted(self.labels, reverse=True)[:self.label_top]
+
+    @property
+    def cap(self):
+        return self.max_y * 1.05 if self.max_y else 1.0
+
+    def series(self, name):
+        """(x, y) points of one class: "up", "down" or "rest"."""
+        parts = {"up": self.up, "down": self.down, "rest": [self.bulk]}[name]
+        for fc, up, down in self.capped:
+            mask = {"up": up, "down": down, "rest": ~(up | down)}[name]
+            parts = parts + [np.column_stack((fc[mask], np.full(int(mask.sum()), self.cap))).astype(np.float32)]
+        return np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.float32)
+
+
+def _render(points, output, fc_threshold, p_threshold, title, dpi):
+    # matplotlib is imported on first use; it adds a third of a second to agent start-up otherwise
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    try:
+        series = (("Down-regulated", points.series("down"), points.counts["down"]),
+                  ("Not Significant", points.series("rest"), points.counts["not_significant"]),
+                  ("Up-regulated", points.series("up"), points.counts["up"]))
+        for name, xy, count in series:
+            ax.scatter(xy[:, 0], xy[:, 1], s=6, c=COLORS[name], alpha=0.6, linewidths=0, rasterized=True,
+                       label=f"{name} ({count:,})")
+        for x in (-fc_threshold, fc_threshold):
+            ax.axvline(x, linestyle="--", color="black", alpha=0.5, linewidth=0.8)
+        ax.axhline(-np.log10(p_threshold), linestyle="--", color="black", alpha=0.5, linewidth=0.8)
+        for y, x, label in points.labels:
+            ax.annotate(label, (x, min(y, points.cap)), xytext=(3, 3), textcoords="offset points", fontsize=7)
+        ax.set_title(title)
+        ax.set_xlabel("Log2 Fold Change")
+        ax.set_ylabel("-Log10 P-value")
+        ax.grid(True, color="#ebebeb")
+        ax.set_axisbelow(True)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        ax.legend(title="Regulation", loc="upper center", bbox_to_anchor=(0.5, -0.08), ncol=3, frameon=False)
+        fig.tight_layout()
+        fig.savefig(output, dpi=dpi)
+    finally:
+        plt.close(fig)
+
+
+def volcano(path, output=None, fc_threshold=1.0, p_threshold=0.05, fc_column=None, p_column=None,
+            label_column=None, label_top=10, title="Volcano Plot", dpi=150, chunk_rows=None):
+    """Stream a differential-expression table into a volcano plot; returns a report dict."""
+    output = output or os.path.splitext(path)[0] + "_volcano.png"
+    if fc_threshold < 0 or not 0 < p_threshold <= 1:
+        raise ValueError("fc_threshold must be >= 0 and p_threshold in (0, 1]")
+    start = time.perf_counter()
+    with telemetry.span("volcano.plot", **{"volcano.input": path}):
+        columns = _header(path)
+        fc_column = _pick(columns, fc_column, FC_COLUMNS, "log2 fold-change")
+        p_column = _pick(columns, p_column, P_COLUMNS, "p-value")
+        label_column = _pick(columns, label_column, LABEL_COLUMNS, None) if label_top else None
+        wanted = [fc_column, p_column] + ([label_column] if label_column else [])
+        # Cells scale with the thresholds, which is where the plot's detail is
+        points = _Points(max(fc_threshold, 0.5) / CELLS_PER_THRESHOLD,
+                         -np.log10(p_threshold) / CELLS_PER_THRESHOLD if p_threshold < 1 else 0.02, label_top)
+        for chunk in read_chunks(path, chunk_rows=chunk_rows or CHUNK_ROWS, columns=wanted):
+            fc = chunk[fc_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            p = chunk[p_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            labels = chunk[label_column].to_numpy() if label_column else None
+            points.add(fc, p, labels, fc_threshold, p_threshold)
+        drawn = len(points.bulk) + points.counts["up"] + points.counts["down"] + \
+            sum(int((~(up | down)).sum()) for _, up, down in points.capped)
+        _render(points, output, fc_threshold, p_threshold, title, dpi)
+        telemetry.annotate(**{"volcano.rows": points.counts["rows"], "volcano.drawn": drawn})
+    return {"output": os.path.abspath(output), "fc_column": fc_column, "p_column": p_column, **points.counts,
+            "points_drawn": drawn, "top_labels": [label for _, _, label in points.labels],
+            "seconds": round(time.perf_counter() - start, 3)}
+
+
+@tool
+def volcano_plot(path: str, output: Optional[str] = None, fc_threshold: float = 1.0, p_threshold: float = 0.05,
+                 fc_column: Optional[str] = None, p_column: Optional[str] = None,
+                 label_column: Optional[str] = None, label_top: int = 10, title: str = "Volcano Plot") -> str:
+    """
+    Draw a volcano plot (log2 fold change vs -log10 p) from a differential-expression
+    results table (DESeq2, edgeR, limma, Seurat markers; CSV/TSV/Parquet, any size).
+    Use this instead of volcano_plot.R or plotting code of your own.
+
+    Args:
+        path: results table
+        output: image file (.png, .pdf, .svg); defaults to <table>_volcano.png
+        fc_threshold: |log2 fold change| above which a significant gene is up/down-regulated
+        p_threshold: p-value cut-off
+        fc_column: fold-change column; detected if not given (log2FoldChange, logFC, ...)
+        p_column: p-value column; detected if not given, preferring adjusted p-values (padj, FDR, ...)
+        label_column: gene name column for labels; detected if not given
+        label_top: number of most significant genes to label (0 for none)
+        title: plot title
+
+    Returns:
+        JSON report: output path, columns used, up/down/not significant counts, top genes
+    """
+    try:
+        report = volcano(path, output=output, fc_threshold=fc_threshold, p_threshold=p_threshold,
+                         fc_column=fc_column, p_column=p_column, label_column=label_column, label_top=label_top,
+                         title=title)
+    except (OSError, ValueError, KeyError) as e:
+        return f"Error: {e}"
+    return json.dumps(report, indent=2)
@@ -0,0 +1,708 @@
+"""
+Pool of warm, sandboxed worker processes for running generated Python code.
+
+strands' python_repl executes code inside the agent process: a segfault, runaway loop
+or OOM takes the whole agent down, and only one snippet runs at a time. Here code is
+sent over a pipe to one of WORKER_POOL_SIZE worker processes instead:
+
+    warm start      each worker imports WORKER_PRELOAD once when it starts and then
+                    serves jobs; a killed worker is replaced in the background
+    limits          each job gets a wall-clock timeout (the worker's process group,
+                    including anything the job started, is killed and the worker
+                    replaced), a CPU-seconds limit (RLIMIT_CPU) and a memory limit
+                    on top of the warm worker's footprint (RLIMIT_AS)
+    streaming       stdout/stderr are sent back line by line while the job runs
+    parallelism     `run_many` spreads independent snippets (e.g. one per sample)
+                    over all workers
+    sessions        `run_session` keeps a REPL namespace per agent session: it is saved
+                    as a repl_snapshot after every step, the worker that ran the step
+                    keeps it in memory and gets the session's next step if it is idle,
+                    and any other worker (or the replacement of a killed one) restores
+                    it from the snapshot
+
+The `python_repl` tool here runs on `run_session`, so ordinary agent code gets the
+warm imports and the limits too; BIOHACKER_REPL_WORKERS=off runs strands' in-process
+python_repl instead. Jobs from `run`/`run_many` get a fresh namespace; a variable
+named `result` is sent back if it can be pickled. Workers need a POSIX system; CPU and
+memory limits rely on `resource` (RLIMIT_AS is not enforced on macOS).
+"""
+
+import atexit
+import hashlib
+import io
+import logging
+import os
+import pickle
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from strands import tool
+
+try:
+    import resource
+except ImportError:  # Windows: no limits, and no workers either (see _Worker)
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+WORKER_POOL_SIZE = int(os.environ.get("BIOHACKER_WORKERS", str(min(4, os.cpu_count() or 1))))
+WORKER_PRELOAD = [m.strip() for m in os.environ.get("BIOHACKER_WORKER_PRELOAD", "numpy,pandas,scipy").split(",")
+                  if m.strip()]
+JOB_TIMEOUT_SECONDS = float(os.environ.get("BIOHACKER_JOB_TIMEOUT", "300"))
+JOB_CPU_SECONDS = float(os.environ.get("BIOHACKER_JOB_CPU_SECONDS", "600"))
+JOB_MEMORY_MB = int(os.environ.get("BIOHACKER_JOB_MEMORY_MB", "4096"))
+# Workers are recycled after this many jobs so leaked memory and module state don't pile up
+MAX_JOBS_PER_WORKER = int(os.environ.get("BIOHACKER_WORKER_MAX_JOBS", "100"))
+# Output kept per job in the returned result (streamed output is not truncated)
+MAX_OUTPUT_CHARS = 20000
+# python_repl runs in the workers; off (or a non-POSIX system) uses strands' in-process REPL
+REPL_WORKERS = os.environ.get("BIOHACKER_REPL_WORKERS", "on").lower() not in ("off", "0", "false") and \
+    os.name == "posix"
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+class _StreamWriter(io.TextIOBase):
+    """File object that forwards complete lines to the parent as they are written."""
+
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+        self._buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer += text
+        if "\n" in self._buffer or len(self._buffer) > 4096:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self._conn.send(("output", self._name, self._buffer))
+            self._buffer = ""
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def _address_space_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _apply_limits(cpu_seconds, memory_mb):
+    """Set per-job soft limits; returns the previous ones for `_restore_limits`."""
+    if resource is None:
+        return {}
+    previous = {}
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        previous[resource.RLIMIT_CPU] = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        hard = previous[resource.RLIMIT_CPU][1]
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    if memory_mb:
+        try:
+            # On top of what the warm worker has already mapped
+            soft = _address_space_bytes() + memory_mb * (1 << 20)
+        except (OSError, ValueError):
+            soft = None  # no /proc (macOS), where RLIMIT_AS isn't enforced anyway
+        if soft is not None:
+            previous[resource.RLIMIT_AS] = resource.getrlimit(resource.RLIMIT_AS)
+            hard = previous[resource.RLIMIT_AS][1]
+            resource.setrlimit(resource.RLIMIT_AS, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    return previous
+
+
+def _restore_limits(previous):
+    for limit, values in previous.items():
+        resource.setrlimit(limit, values)
+
+
+# The REPL session this worker served last: its namespace stays valid while the
+# session's snapshot is still the version this worker saved
+_session = {"key": None, "version": None, "namespace": None, "store": None}
+
+
+def _session_namespace(spec):
+    import repl_snapshot
+
+    if _session["store"] is None or _session["store"].directory != spec["directory"]:
+        _session.update(key=None, store=repl_snapshot.SnapshotStore(spec["directory"]))
+    store = _session["store"]
+    if spec.get("reset"):
+        store.clear()
+        _session["key"] = None
+    if _session["key"] != spec["key"] or _session["version"] != spec["version"]:
+        # Another worker (or a killed one) ran the last step: start from the saved snapshot
+        store.reload()
+        namespace = {"__name__": "__main__"}
+        if not spec.get("reset"):
+            namespace.update(store.load())
+        _session.update(key=spec["key"], version=None, namespace=namespace)
+    return _session["namespace"]
+
+
+def _save_session(spec, reply):
+    try:
+        reply["snapshot"] = _session["store"].save(_session["namespace"])
+        _session["version"] = spec["next_version"]
+        reply["session_version"] = spec["next_version"]
+    except Exception as e:
+        # The in-memory namespace is no longer what the snapshot holds; don't reuse it
+        _session["key"] = None
+        reply["error"] = (reply["error"] or "") + f"\nREPL state could not be saved: {e}"
+
+
+def _run_job(conn, job):
+    stdout, stderr = _StreamWriter(conn, "stdout"), _StreamWriter(conn, "stderr")
+    session = job.get("session")
+    reply = {"status": "ok", "error": None, "result": None}
+    try:
+        namespace = _session_namespace(session) if session else {"__name__": "__main__", **job.get("inputs", {})}
+    except Exception:
+        _session["key"] = None
+        reply.update(status="error", error="REPL state could not be restored:\n" + traceback.format_exc())
+        return reply
+    start_cpu = time.process_time()
+    previous = {}
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        previous = _apply_limits(job["cpu_seconds"], job["memory_mb"])
+        code = compile(job["code"], "<job>", "exec")
+        if session:
+            # Restored frames are read only if this step (or a function it calls) names them
+            _session["store"].materialize(namespace, code)
+        exec(code, namespace)
+    except CpuLimitExceeded as e:
+        reply.update(status="cpu_limit", error=str(e))
+    except MemoryError:
+        reply.update(status="memory_limit", error=f"memory limit of {job['memory_mb']} MB exceeded")
+    except BaseException as e:
+        # Drop this frame: the traceback starts at the job's own code
+        reply.update(status="error", error="".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+    finally:
+        _restore_limits(previous)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        stdout.flush()
+        stderr.flush()
+    if session:
+        # Saved after a failed step too: whatever ran before the exception stays defined, as in a REPL
+        _save_session(session, reply)
+    elif "result" in namespace:
+        try:
+            reply["result"] = pickle.dumps(namespace["result"])
+        except Exception as e:
+            reply["error"] = reply["error"] or f"result could not be pickled: {e}"
+    reply["cpu_seconds"] = time.process_time() - start_cpu
+    if resource is not None:
+        # ru_maxrss is in KB on Linux
+        reply["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return reply
+
+
+def _serve(fd):
+    """Worker process entry point: import the scientific stack once, then run jobs until told to stop."""
+    from multiprocessing.connection import Connection
+
+    conn = Connection(fd)
+    for module in WORKER_PRELOAD:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    try:
+        conn.send(("ready",))
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                return
+            if job is None:
+                return
+            conn.send(("done", _run_job(conn, job)))
+    except OSError:
+        # The pool closed or replaced this worker while it was starting or replying
+        return
+
+
+class _Worker:
+    """One worker process and the socket to it.
+
+    Workers are plain subprocesses rather than multiprocessing children, which would
+    re-import the caller's __main__ (the agent CLI or Streamlit app) in every worker.
+    """
+
+    def __init__(self, startup_timeout=60):
+        from multiprocessing.connection import Connection
+
+        parent, child = socket.socketpair()
+        code = f"import sys; sys.path.insert(0, {_HERE!r}); import worker_pool; worker_pool._serve({child.fileno()})"
+        # Own session: Ctrl-C in the terminal is for the agent, not for running jobs
+        self.process = subprocess.Popen([sys.executable, "-c", code], pass_fds=(child.fileno(),),
+                                        stdin=subprocess.DEVNULL, start_new_session=True)
+        child.close()
+        self.conn = Connection(parent.detach())
+        self.jobs = 0
+        if not self.conn.poll(startup_timeout) or self._recv() != ("ready",):
+            self.stop(kill=True)
+            raise RuntimeError(f"worker did not start (exit code {self.process.poll()})")
+
+    def _recv(self):
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def run(self, job, timeout, on_output):
+        """Send `job` and wait for its reply; None if the worker had to be killed or died."""
+        self.jobs += 1
+        self.conn.send(job)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.conn.poll(remaining):
+                return None
+            message = self._recv()
+            if message is None:
+                return None
+            if message[0] == "done":
+                return message[1]
+            if on_output is not None:
+                on_output(message[1], message[2])
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def exit_code(self):
+        return self.process.poll()
+
+    def stop(self, kill=False):
+        if kill:
+            self._kill_group()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._kill_group()
+            self.process.wait()
+        # Processes a job started (and left running) share the worker's session; they go with it.
+        # The group id can't be reused while any of them is alive, so this is safe after the wait.
+        self._kill_group()
+        self.conn.close()
+
+    def _kill_group(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class WorkerPool:
+    """Fixed-size pool of warm worker processes; workers are started on first use.
+
+    Args:
+        size: number of worker processes (and jobs running at once)
+    """
+
+    def __init__(self, size=WORKER_POOL_SIZE):
+        self.size = max(1, size)
+        # Idle workers, most recently used last
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._started = 0
+        self._closed = False
+        # REPL session -> {"lock", "version" of its snapshot, "worker" holding it in memory}
+        self._sessions = {}
+        self.stats_counters = {"jobs": 0, "ok": 0, "errors": 0, "timeouts": 0, "cpu_limits": 0,
+                               "memory_limits": 0, "crashes": 0, "workers_started": 0,
+                               "queue_wait_seconds": 0.0, "job_seconds": 0.0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats_counters[key] += delta
+
+    def _new_worker(self):
+        worker = _Worker()
+        self._count(workers_started=1)
+        return worker
+
+    def _put_idle(self, worker):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(worker)
+                self._available.notify()
+                return
+        # Started in the background while the pool was closing
+        worker.stop()
+
+    def _acquire(self, prefer=None):
+        """An idle worker (`prefer` if it is idle), a new one while below size, or the next one released."""
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("worker pool is closed")
+                if prefer is not None and prefer in self._idle:
+                    self._idle.remove(prefer)
+                    return prefer
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                # Re-check now and then in case a dead worker could not be replaced
+                self._available.wait(timeout=1.0)
+        try:
+            return self._new_worker()
+        except BaseException:
+            with self._lock:
+                self._started -= 1
+            raise
+
+    def _release(self, worker, healthy):
+        if healthy and worker.jobs < MAX_JOBS_PER_WORKER and worker.alive() and not self._closed:
+            self._put_idle(worker)
+            return
+        worker.stop(kill=not healthy)
+        if not self._closed:
+            # Start the replacement off the caller's critical path
+            threading.Thread(target=self._replace, daemon=True, name="worker-replace").start()
+
+    def _replace(self):
+        try:
+            self._put_idle(self._new_worker())
+        except Exception:
+            # Next _acquire starts one instead
+            logger.exception("could not replace worker")
+            with self._lock:
+                self._started -= 1
+
+    def run(self, code, inputs=None, timeout=None, cpu_seconds=None, memory_mb=None, on_output=None):
+        """Run `code` in a worker and wait for it.
+
+        Args:
+            code: Python source; a variable named `result` is returned if picklable
+            inputs: optional dict of picklable values preset in the job's namespace
+            timeout: wall-clock seconds before the worker is killed (BIOHACKER_JOB_TIMEOUT)
+            cpu_seconds: CPU time limit, 0 for none (BIOHACKER_JOB_CPU_SECONDS)
+            memory_mb: extra memory the job may allocate, 0 for none (BIOHACKER_JOB_MEMORY_MB)
+            on_output: optional callback(stream, text) called as stdout/stderr lines arrive
+
+        Returns:
+            dict with status (ok, error, timeout, cpu_limit, memory_limit, crashed), stdout,
+            stderr, error, result, seconds, cpu_seconds and queue_wait_seconds
+        """
+        job = {"code": code, "inputs": inputs or {}}
+        return self._run(job, timeout, cpu_seconds, memory_mb, on_output)[0]
+
+    def _run(self, job, timeout, cpu_seconds, memory_mb, on_output, prefer=None):
+        """Run a job dict on a worker; returns (reply, worker that ran it)."""
+        timeout = JOB_TIMEOUT_SECONDS if timeout is None else timeout
+        job.update(cpu_seconds=JOB_CPU_SECONDS if cpu_seconds is None else cpu_seconds,
+                   memory_mb=JOB_MEMORY_MB if memory_mb is None else memory_mb)
+        output = {"stdout": [], "stderr": []}
+
+        def collect(stream, text):
+            output[stream].append(text)
+            if on_output is not None:
+                on_output(stream, text)
+
+        queued = time.perf_counter()
+        worker = self._acquire(prefer)
+        start = time.perf_counter()
+        reply = None
+        try:
+            reply = worker.run(job, timeout, collect)
+        finally:
+            seconds = time.perf_counter() - start
+            self._release(worker, healthy=reply is not None)
+        if reply is None:
+            # A worker that died before the deadline crashed (segfault, OOM killer), whatever the signal
+            crashed = seconds < timeout
+            status = "crashed" if crashed else "timeout"
+            reply = {"status": status, "result": None, "cpu_seconds": None,
+                     "error": f"worker exited with code {worker.exit_code()}" if crashed
+                     else f"wall-clock limit of {timeout:g}s exceeded; worker killed"}
+        if reply.get("result") is not None:
+            try:
+                reply["result"] = pickle.loads(reply["result"])
+            except Exception as e:
+                reply.update(result=None, error=reply["error"] or f"result could not be unpickled: {e}")
+        counter = {"ok": "ok", "error": "errors", "timeout": "timeouts", "cpu_limit": "cpu_limits",
+                   "memory_limit": "memory_limits", "crashed": "crashes"}[reply["status"]]
+        self._count(**{"jobs": 1, counter: 1, "queue_wait_seconds": start - queued, "job_seconds": seconds})
+        reply.update(stdout="".join(output["stdout"]), stderr="".join(output["stderr"]),
+                     seconds=seconds, queue_wait_seconds=start - queued)
+        return reply, worker
+
+    def run_session(self, session_id, code, directory, reset=False, timeout=None, cpu_seconds=None,
+                    memory_mb=None, on_output=None):
+        """Run `code` in `session_id`'s persistent REPL namespace; steps of one session run one at a time.
+
+        Args:
+            session_id: agent session the namespace belongs to
+            code: Python source
+            directory: the session's snapshot directory (repl_snapshot.SnapshotStore)
+            reset: start from an empty namespace and drop the saved one
+            timeout, cpu_seconds, memory_mb, on_output: as for `run`
+
+        Returns:
+            the `run` dict, plus `restored` when the step's worker had to load the namespace
+            from the snapshot instead of having it in memory
+        """
+        with self._lock:
+            state = self._sessions.setdefault(session_id, {"lock": threading.Lock(), "version": None,
+                                                           "worker": None})
+        with state["lock"]:
+            job = {"code": code, "session": {"key": session_id, "directory": directory, "reset": reset,
+                                             "version": state["version"], "next_version": uuid.uuid4().hex}}
+            reply, worker = self._run(job, timeout, cpu_seconds, memory_mb, on_output, prefer=state["worker"])
+            reply["restored"] = worker is not state["worker"] and state["version"] is not None and not reset
+            if reply.get("session_version"):
+                state.update(version=reply["session_version"], worker=worker)
+            else:
+                # Killed or crashed: the snapshot of the last finished step is what's left
+                state["worker"] = None
+            return reply
+
+    def drop_session(self, session_id):
+        """Forget which worker holds `session_id`'s namespace; its snapshot stays on disk."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def run_many(self, snippets, **limits):
+        """Run independent snippets in parallel across the pool; results in input order.
+
+        Args:
+            snippets: list of Python sources (or dicts of `run` keyword arguments)
+            **limits: timeout / cpu_seconds / memory_mb / on_output applied to every snippet
+        """
+        jobs = [s if isinstance(s, dict) else {"code": s} for s in snippets]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.size, len(jobs))), thread_name_prefix="job") as pool:
+            futures = [pool.submit(self.run, **{**limits, **job}) for job in jobs]
+            return [f.result() for f in futures]
+
+    def warm(self):
+        """Start every worker now instead of on first use."""
+        with self._lock:
+            missing = self.size - self._started
+            self._started += missing
+        for _ in range(missing):
+            try:
+                self._put_idle(self._new_worker())
+            except Exception:
+                logger.exception("could not start worker")
+                with self._lock:
+                    self._started -= 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.stats_counters)
+            out["size"] = self.size
+            out["workers"] = self._started
+            out["idle"] = len(self._idle)
+            out["sessions"] = len(self._sessions)
+        out["avg_job_seconds"] = out["job_seconds"] / out["jobs"] if out["jobs"] else 0.0
+        return out
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for worker in idle:
+            worker.stop()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The child doesn't own the parent's worker processes
+    global _default_pool, _default_lock
+    _default_pool, _default_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_worker_pool(warm=False):
+    """Process-wide worker pool, created on first use.
+
+    Args:
+        warm: start all workers in the background now, so the first job doesn't wait
+            for numpy/pandas/scipy to import
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = WorkerPool()
+            atexit.register(_default_pool.close)
+            if warm:
+                threading.Thread(target=_default_pool.warm, daemon=True, name="worker-warm").start()
+        return _default_pool
+
+
+def stats():
+    return _default_pool.stats() if _default_pool is not None else {}
+
+
+def drop_session(session_id):
+    if _default_pool is not None:
+        _default_pool.drop_session(session_id)
+
+
+def format_results(results):
+    sections = []
+    for i, r in enumerate(results, 1):
+        header = f"## Job {i}: {r['status']} in {r['seconds']:.1f}s"
+        if r.get("cpu_seconds") is not None:
+            header += f" (CPU {r['cpu_seconds']:.1f}s)"
+        parts = [header]
+        if r["stdout"]:
+            parts.append("```\n" + r["stdout"][-MAX_OUTPUT_CHARS:] + "\n```")
+        if r["stderr"]:
+            parts.append("stderr:\n```\n" + r["stderr"][-MAX_OUTPUT_CHARS:] + "\n```")
+        if r["error"]:
+            parts.append("error:\n```\n" + r["error"][-MAX_OUTPUT_CHARS:] + "\n```")
+        if r.get("result") is not None:
+            parts.append(f"result: {r['result']!r}"[:MAX_OUTPUT_CHARS])
+        sections.append("\n".join(parts))
+    return "\n\n".join(sections)
+
+
+@tool
+def run_python_jobs(snippets: List[str], timeout_seconds: Optional[float] = None,
+                    memory_mb: Optional[int] = None) -> str:
+    """
+    Run Python snippets in warm, sandboxed worker processes, in parallel.
+
+    numpy, pandas and scipy are already imported in the workers, a crash or endless
+    loop only loses that worker, and output is streamed while the code runs. Each
+    snippet runs in its own fresh namespace, so use this for independent analyses
+    (e.g. one snippet per sample) that read their inputs from and write their outputs
+    to files; use python_repl for interactive, stateful work.
+
+    Args:
+        snippets: Python sources, one per independent job
+        timeout_seconds: wall-clock limit per job (default 300)
+        memory_mb: memory each job may allocate (default 4096)
+
+    Returns:
+        Status, run time, stdout/stderr and any traceback of each job, in input order
+    """
+    if not snippets:
+        return "Error: no snippets given"
+    pool = get_worker_pool(warm=True)
+    lock = threading.Lock()
+
+    def echo(stream, text):
+        # Live progress in the terminal, like the other tools print
+        with lock:
+            print(text, end="", file=sys.stderr if stream == "stderr" else sys.stdout, flush=True)
+
+    try:
+        results = pool.run_many(snippets, timeout=timeout_seconds, memory_mb=memory_mb, on_output=echo)
+    except (OSError, RuntimeError, ValueError) as e:
+        return f"Error: could not run jobs in worker processes: {e}"
+    return format_results(results)
+
+
+def repl_directory(session_id):
+    """Snapshot directory of a session's REPL namespace, under python_repl's repl_state/."""
+    from agent_pool import DEFAULT_SESSION
+
+    base = os.path.join(os.environ.get("PYTHON_REPL_PERSISTENCE_DIR") or os.getcwd(), "repl_state")
+    if session_id == DEFAULT_SESSION:
+        # Where the in-process python_repl kept its snapshot, so a single-user session carries over
+        return os.path.join(base, "snapshot")
+    return os.path.join(base, "sessions", hashlib.sha256(session_id.encode()).hexdigest()[:16], "snapshot")
+
+
+def _consent(code):
+    """strands' python_repl confirmation prompt, unless BYPASS_TOOL_CONSENT or STRANDS_NON_INTERACTIVE is set."""
+    if os.environ.get("BYPASS_TOOL_CONSENT", "").lower() == "true" or \
+            os.environ.get("STRANDS_NON_INTERACTIVE", "").lower() == "true":
+        return None
+    from strands_tools.utils.user_input import get_user_input
+
+    print(f"```python\n{code}\n```")
+    answer = get_user_input("<yellow><bold>Do you want to proceed with Python code execution?</bold> [y/*]</yellow>")
+    if answer.lower().strip() == "y":
+        return None
+    reason = answer if answer.strip() != "n" else get_user_input("Please provide a reason for cancellation:")
+    return f"Python code execution cancelled by the user. Reason: {reason}"
+
+
+@tool
+def python_repl(code: str, reset_state: bool = False, timeout_seconds: Optional[float] = None) -> str:
+    """
+    Execute Python code in a persistent REPL. Variables, imports and functions defined in
+    one call are available in the next.
+
+    The code runs in a warm worker process with numpy, pandas and scipy already imported;
+    a crash, endless loop or out-of-memory error only loses that step, and the namespace
+    is restored from the last finished step. Output is streamed while the code runs.
+    Input from the user (input()) is not available.
+
+    Args:
+        code: Python source to execute
+        reset_state: clear all variables before running
+        timeout_seconds: wall-clock limit for this step (default 300)
+
+    Returns:
+        The step's stdout/stderr, or the traceback if it raised
+    """
+    from agent_pool import current_session
+
+    cancelled = _consent(code)
+    if cancelled:
+        return f"Error: {cancelled}"
+    session_id = current_session()
+
+    def echo(stream, text):
+        print(text, end="", file=sys.stderr if stream == "stderr" else sys.stdout, flush=True)
+
+    try:
+        r = get_worker_pool(warm=True).run_session(session_id, code, repl_directory(session_id), reset=reset_state,
+                                                   timeout=timeout_seconds, on_output=echo)
+    except (OSError, RuntimeError) as e:
+        return f"Error: could not run code in a worker process: {e}"
+    parts = []
+    if r["restored"]:
+        parts.append("(namespace restored from the last saved step)")
+    output = (r["stdout"] + r["stderr"])[-MAX_OUTPUT_CHARS:]
+    if output:
+        parts.append(output)
+    if r["status"] != "ok":
+        parts.append(f"Error ({r['status']}): " + (r["error"] or "")[-MAX_OUTPUT_CHARS:])
+        if r["status"] in ("timeout", "crashed"):
+            parts.append("The worker was replaced; variables are as they were after the last finished step.")
+    elif r["error"]:
+        parts.append(r["error"])
+    return "\n".join(parts) or "Code executed successfully"
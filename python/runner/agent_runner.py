@@ -1,41 +1,344 @@
 #!/usr/bin/env python3
-"""Thin runner that replaces the current process with the project's CLI agent.
+"""Thin runner that starts the project's CLI agent for a terminal session.
 
 This keeps interactive behaviour and uses unbuffered IO (-u) from the node pty spawn.
+
+Modes:
+    agent_runner.py                      cold start: import the agent and run its CLI in this process
+    agent_runner.py --serve SOCK [--spares N]
+                                         fork server: preload strands/boto3/sub-agents once, keep N
+                                         warm children ready, and fork one per session
+    agent_runner.py --connect SOCK       session client for the fork server: hands this process's
+                                         stdin/stdout/stderr (the pty) to a warm child and waits for it
+
+In both modes the session reports connect-to-prompt latency and RSS as a JSON line,
+appended to $BIOHACKER_RUNNER_METRICS if set (and to the fork server's log).
 """
 import os
 import sys
-import runpy
-import builtins
+import json
+import time
+import select
+import signal
+import socket
+import struct
+import argparse
+
+# Taken before anything heavy is imported: the start of "connect" for latency metrics
+T0 = time.time()
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 AGENT = os.path.join(ROOT, 'biohacker', 'biohacker_agent.py')
-
-if not os.path.exists(AGENT):
-    print('error: agent entry not found at', AGENT, file=sys.stderr)
-    sys.exit(2)
-
-# Sandbox: ensure agent runs with its CWD set to UPLOAD_DIR (provided by the
-# backend) and make a naive guard around some file operations to avoid accidental
-# access outside the uploads directory in dev. This is not a security boundary
-# for untrusted code, but it stops the normal agent from touching other files.
-# For the POC/hackathon we don't restrict file I/O. Run the agent from the
-# repository root so relative imports and file access behave as they would in
-# normal development.
-try:
-    os.chdir(ROOT)
-except Exception:
-    pass
-
-# run the agent in-process so it inherits our cwd/env restrictions
-# Ensure the repository root is on sys.path so `from biohacker import ...` works
-# even when we chdir into the uploads directory above.
-if ROOT not in sys.path:
-    sys.path.insert(0, ROOT)
-# Also add the inner `biohacker` package directory so modules imported as
-# top-level names (e.g. `import code_researcher_assistant`) can be found.
 BIOHACKER_PKG_DIR = os.path.join(ROOT, 'biohacker')
-if BIOHACKER_PKG_DIR not in sys.path:
-    sys.path.insert(0, BIOHACKER_PKG_DIR)
 
-runpy.run_path(AGENT, run_name='__main__')
+
+def prepare_environment():
+    if not os.path.exists(AGENT):
+        print('error: agent entry not found at', AGENT, file=sys.stderr)
+        sys.exit(2)
+
+    # For the POC/hackathon we don't restrict file I/O. Run the agent from the
+    # repository root so relative imports and file access behave as they would in
+    # normal development.
+    try:
+        os.chdir(ROOT)
+    except Exception:
+        pass
+
+    # Ensure the repository root is on sys.path so `from biohacker import ...` works
+    # even when we chdir into the uploads directory above.
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    # Also add the inner `biohacker` package directory so modules imported as
+    # top-level names (e.g. `import code_researcher_assistant`) can be found.
+    if BIOHACKER_PKG_DIR not in sys.path:
+        sys.path.insert(0, BIOHACKER_PKG_DIR)
+
+
+# -- metrics -----------------------------------------------------------------
+
+def _memory_kb():
+    """RSS and PSS of this process in kB. PSS splits pages shared with the fork server."""
+    usage = {}
+    for path, keys in (('/proc/self/status', ('VmRSS',)), ('/proc/self/smaps_rollup', ('Pss', 'Private_Dirty'))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, rest = line.partition(':')
+                    if name in keys:
+                        usage[name] = int(rest.split()[0])
+        except OSError:
+            pass
+    return {'rss_kb': usage.get('VmRSS'), 'pss_kb': usage.get('Pss'), 'private_dirty_kb': usage.get('Private_Dirty')}
+
+
+def report_ready(mode, t0, log_fd=None):
+    metrics = {'mode': mode, 'pid': os.getpid(), 'connect_to_prompt_ms': round((time.time() - t0) * 1000, 1)}
+    metrics.update(_memory_kb())
+    line = json.dumps(metrics) + '\n'
+    path = os.environ.get('BIOHACKER_RUNNER_METRICS')
+    if path:
+        with open(path, 'a') as f:
+            f.write(line)
+    if log_fd is not None:
+        os.write(log_fd, line.encode())
+
+
+# -- framing for the fork server's unix socket ---------------------------------
+
+def _send_msg(sock, obj, fds=()):
+    data = json.dumps(obj).encode()
+    payload = struct.pack('!I', len(data)) + data
+    if fds:
+        socket.send_fds(sock, [payload], list(fds))
+    else:
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, n):
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+
+def _recv_msg(sock, max_fds=0):
+    """Read one framed message (and any fds passed with it); returns (obj, fds) or (None, [])."""
+    fds = []
+    if max_fds:
+        data, fds, _, _ = socket.recv_fds(sock, 4, max_fds)
+        if len(data) < 4:
+            rest = _recv_exact(sock, 4 - len(data))
+            data = data + (rest or b'')
+    else:
+        data = _recv_exact(sock, 4)
+    if not data or len(data) < 4:
+        return None, fds
+    body = _recv_exact(sock, struct.unpack('!I', data)[0])
+    return (json.loads(body) if body is not None else None), fds
+
+
+def _peer_uid(sock):
+    """uid of the process at the other end of a unix socket, or None where the platform can't say."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+# -- cold start ----------------------------------------------------------------
+
+def run_cold():
+    prepare_environment()
+    import biohacker_agent
+    biohacker_agent.main(on_ready=lambda: report_ready('cold', T0))
+
+
+# -- fork server -----------------------------------------------------------------
+
+def _run_session(header, fds, log_fd):
+    """Body of a forked session: adopt the client's pty and run the CLI, then exit."""
+    stdin_fd, stdout_fd, stderr_fd, conn_fd = fds
+    os.setsid()
+    for src, dst in ((stdin_fd, 0), (stdout_fd, 1), (stderr_fd, 2)):
+        os.dup2(src, dst)
+        os.close(src)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, closefd=False)
+
+    # Session environment (UPLOAD_DIR etc.) comes from the client. Modules that read
+    # env vars at import time already did so in the server.
+    os.environ.clear()
+    os.environ.update(header.get('env', {}))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    conn = socket.socket(fileno=conn_fd)
+    _send_msg(conn, {'pid': os.getpid()})
+
+    code = 0
+    try:
+        import biohacker_agent
+        biohacker_agent.main(on_ready=lambda: report_ready('fork', header.get('t0', T0), log_fd))
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 0
+    except BaseException:
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            _send_msg(conn, {'exit': code})
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def _spare_main(ctrl, log_fd):
+    # Warm child: everything is imported, just wait to be handed a session
+    header, fds = _recv_msg(ctrl, max_fds=4)
+    if header is None or len(fds) != 4:
+        os._exit(0)
+    ctrl.close()
+    _run_session(header, fds, log_fd)
+
+
+def serve(sock_path, spares):
+    prepare_environment()
+    started = time.time()
+    import biohacker_agent  # noqa: F401  preload strands, strands_tools, boto3 and every sub-agent
+    log_fd = os.dup(2)
+    print(f'[runner] fork server preloaded in {time.time() - started:.2f}s, listening on {sock_path}', file=sys.stderr)
+
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # A session gets this user's environment and shell: the socket is created owner-only
+    # (mode 0600), and peers running as another user are turned away below
+    umask = os.umask(0o177)
+    try:
+        listener.bind(sock_path)
+    finally:
+        os.umask(umask)
+    listener.listen(64)
+
+    warm = []  # (pid, control socket) of children waiting for a session
+
+    # SIGCHLD only wakes the loop (through the wake-up pipe); exited children are reaped
+    # by the loop itself, so `warm` is never changed under the code popping from it
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    def reap():
+        try:
+            while os.read(wake_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for p, s in [(p, s) for p, s in warm if p == pid]:
+                warm.remove((p, s))
+                s.close()
+
+    def in_child():
+        # A forked child keeps none of the server's sockets or its wake-up pipe
+        signal.set_wakeup_fd(-1)
+        os.close(wake_r)
+        os.close(wake_w)
+        listener.close()
+        for _, s in warm:
+            s.close()
+
+    def fork_spare():
+        parent_end, child_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            in_child()
+            parent_end.close()
+            _spare_main(child_end, log_fd)
+        child_end.close()
+        warm.append((pid, parent_end))
+
+    while True:
+        reap()
+        while len(warm) < spares:
+            fork_spare()
+        # select() is retried after a signal (PEP 475); a SIGCHLD shows up as wake_r ready
+        ready, _, _ = select.select([listener, wake_r], [], [])
+        if listener not in ready:
+            continue
+        conn, _ = listener.accept()
+        try:
+            uid = _peer_uid(conn)
+            if uid is not None and uid != os.getuid():
+                print(f'[runner] refused a session for uid {uid}', file=sys.stderr)
+                continue
+            header, fds = _recv_msg(conn, max_fds=3)
+            if header is None or len(fds) != 3:
+                for fd in fds:
+                    os.close(fd)
+                continue
+            handed_off = False
+            while warm and not handed_off:
+                pid, ctrl = warm.pop(0)
+                try:
+                    _send_msg(ctrl, header, fds + [conn.fileno()])
+                    handed_off = True
+                except OSError:
+                    pass  # that spare died; try the next one
+                ctrl.close()
+            if not handed_off:
+                # No spare ready: fork straight into the session
+                if os.fork() == 0:
+                    in_child()
+                    _run_session(header, fds + [os.dup(conn.fileno())], log_fd)
+            for fd in fds:
+                os.close(fd)
+        finally:
+            conn.close()
+
+
+# -- fork server client ------------------------------------------------------------
+
+def connect(sock_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(sock_path)
+    except OSError as e:
+        # Fork server not running: behave exactly like the cold runner
+        print(f'[runner] fork server unavailable ({e}); cold starting', file=sys.stderr)
+        return run_cold()
+
+    _send_msg(sock, {'env': dict(os.environ), 't0': T0}, [0, 1, 2])
+    hello, _ = _recv_msg(sock)
+    if not hello:
+        sys.exit(1)
+    child = hello['pid']
+
+    # The pty delivers Ctrl-C etc. to us; pass them on to the session process
+    def forward(signum, _frame):
+        try:
+            os.kill(child, signum)
+        except ProcessLookupError:
+            pass
+
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGWINCH):
+        signal.signal(signum, forward)
+
+    while True:
+        try:
+            msg, _ = _recv_msg(sock)
+            break
+        except InterruptedError:
+            continue
+    sys.exit(msg.get('exit', 1) if msg else 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Start the Biohacker CLI for a terminal session')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--serve', metavar='SOCK', help='run the pre-forking server on this unix socket')
+    group.add_argument('--connect', metavar='SOCK', help='attach this terminal to a fork server session')
+    parser.add_argument('--spares', type=int, default=int(os.environ.get('BIOHACKER_RUNNER_SPARES', '2')),
+                        help='warm children the fork server keeps ready (default 2)')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.spares)
+    elif args.connect:
+        connect(args.connect)
+    else:
+        run_cold()